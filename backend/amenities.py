@@ -0,0 +1,93 @@
+import json
+from sqlalchemy import func, inspect, insert, select, text
+from models import db, Amenity, Property, property_amenities
+
+
+def normalize_names(names):
+    """Validate a list of amenity names and return them trimmed, lowercased and deduplicated"""
+    if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+        raise ValueError('amenities must be a list of strings')
+    normalized = []
+    for name in names:
+        name = name.strip().lower()
+        if name and name not in normalized:
+            normalized.append(name)
+    return normalized
+
+
+def resolve_amenities(names):
+    """Return Amenity rows for names, creating any that don't exist yet"""
+    names = normalize_names(names)
+    if not names:
+        return []
+    existing = {amenity.name: amenity
+                for amenity in Amenity.query.filter(Amenity.name.in_(names))}
+    for name in names:
+        if name not in existing:
+            existing[name] = Amenity(name=name)
+            db.session.add(existing[name])
+    return [existing[name] for name in names]
+
+
+def amenity_ids(names):
+    """Map normalized amenity names to ids with set-based queries, inserting any missing"""
+    names = sorted(set(names))
+    if not names:
+        return {}
+    ids = dict(db.session.execute(
+        select(Amenity.name, Amenity.id).where(Amenity.name.in_(names))).all())
+    missing = [name for name in names if name not in ids]
+    if missing:
+        db.session.execute(insert(Amenity), [{'name': name} for name in missing])
+        ids.update(db.session.execute(
+            select(Amenity.name, Amenity.id).where(Amenity.name.in_(missing))).all())
+    return ids
+
+
+def parse_amenity_filter(args):
+    """Read amenities=a,b (or repeated amenities=) from request args"""
+    names = []
+    for value in args.getlist('amenities'):
+        names.extend(value.split(','))
+    return normalize_names(names)
+
+
+def filter_by_amenities(query, names, match='all'):
+    """Restrict a Property query to properties offering all (or any) of names"""
+    if not names:
+        return query
+    matching = (select(property_amenities.c.property_id)
+                .join(Amenity, Amenity.id == property_amenities.c.amenity_id)
+                .where(Amenity.name.in_(names)))
+    if match == 'all':
+        matching = (matching.group_by(property_amenities.c.property_id)
+                    .having(func.count() == len(names)))
+    return query.filter(Property.id.in_(matching))
+
+
+def migrate_legacy_amenities():
+    """Move amenities from the old properties.amenities JSON column into property_amenities
+
+    Safe to run repeatedly: migrated rows have the legacy column cleared.
+    """
+    columns = {col['name'] for col in inspect(db.engine).get_columns('properties')}
+    if 'amenities' not in columns:
+        return 0
+
+    rows = db.session.execute(text(
+        'SELECT id, amenities FROM properties WHERE amenities IS NOT NULL'
+    )).all()
+    links = []
+    for property_id, raw in rows:
+        try:
+            amenities = resolve_amenities(json.loads(raw) or [])
+        except ValueError:
+            continue
+        db.session.flush()
+        links.extend({'property_id': property_id, 'amenity_id': amenity.id}
+                     for amenity in amenities)
+    if links:
+        db.session.execute(insert(property_amenities).prefix_with('OR IGNORE', dialect='sqlite'), links)
+    db.session.execute(text('UPDATE properties SET amenities = NULL WHERE amenities IS NOT NULL'))
+    db.session.commit()
+    return len(rows)
@@ -0,0 +1,277 @@
+import calendar
+from collections import Counter, defaultdict
+from datetime import date
+from sqlalchemy import delete, event, insert, select, update
+from sqlalchemy.orm import Session
+from models import db, Booking, Property, PropertyBookingStats, PropertyMonthlyStats
+from versions import committed_values
+
+BOOKING_STATUSES = ('pending', 'approved', 'rejected', 'cancelled')
+BOOKING_FIELDS = ('property_id', 'status', 'start_date', 'end_date', 'total_price')
+# Longest window the analytics endpoint reports on, in months
+MAX_ANALYTICS_MONTHS = 36
+# Rows per INSERT when rebuilding the stats tables
+REBUILD_BATCH_SIZE = 5000
+
+
+def month_key(day):
+    return f'{day.year:04d}-{day.month:02d}'
+
+
+def nights_by_month(start_date, end_date):
+    """Split the nights of [start_date, end_date) by calendar month"""
+    nights = {}
+    cursor = start_date
+    while cursor < end_date:
+        if cursor.month == 12:
+            month_end = date(cursor.year + 1, 1, 1)
+        else:
+            month_end = date(cursor.year, cursor.month + 1, 1)
+        stop = min(end_date, month_end)
+        nights[month_key(cursor)] = (stop - cursor).days
+        cursor = stop
+    return nights
+
+
+class StatsDelta:
+    """Pending changes to the booking stats tables, keyed by property"""
+
+    def __init__(self):
+        self.totals = defaultdict(Counter)
+        self.months = defaultdict(Counter)
+
+    def add(self, values, sign=1):
+        """Count (sign=1) or uncount (sign=-1) a booking with values"""
+        status = values['status']
+        if status not in BOOKING_STATUSES:
+            return
+        property_id = values['property_id']
+        self.totals[property_id][status] += sign
+        if status != 'approved':
+            return
+        self.totals[property_id]['approved_revenue'] += sign * values['total_price']
+        nights = nights_by_month(values['start_date'], values['end_date'])
+        total_nights = sum(nights.values())
+        for month, count in nights.items():
+            self.months[(property_id, month)]['occupied_nights'] += sign * count
+            self.months[(property_id, month)]['revenue'] += (
+                sign * values['total_price'] * count / total_nights)
+
+    def discard(self, property_ids):
+        for property_id in property_ids:
+            self.totals.pop(property_id, None)
+        for key in [key for key in self.months if key[0] in property_ids]:
+            del self.months[key]
+
+    def apply(self, connection):
+        """Write the changes with set-based UPDATEs, inserting rows seen for the first time"""
+        owners = {}
+
+        def owner_of(property_id):
+            if property_id not in owners:
+                owners[property_id] = connection.execute(
+                    select(Property.owner_id).where(Property.id == property_id)).scalar_one()
+            return owners[property_id]
+
+        for property_id, changes in sorted(self.totals.items()):
+            changes = {column: delta for column, delta in changes.items() if delta}
+            if not changes:
+                continue
+            result = connection.execute(
+                update(PropertyBookingStats)
+                .where(PropertyBookingStats.property_id == property_id)
+                .values({column: getattr(PropertyBookingStats, column) + delta
+                         for column, delta in changes.items()}))
+            if result.rowcount == 0:
+                connection.execute(insert(PropertyBookingStats).values(
+                    property_id=property_id, owner_id=owner_of(property_id), **changes))
+
+        for (property_id, month), changes in sorted(self.months.items()):
+            if not changes['occupied_nights'] and not changes['revenue']:
+                continue
+            match = (PropertyMonthlyStats.property_id == property_id,
+                     PropertyMonthlyStats.month == month)
+            result = connection.execute(
+                update(PropertyMonthlyStats).where(*match).values(
+                    occupied_nights=PropertyMonthlyStats.occupied_nights + changes['occupied_nights'],
+                    revenue=PropertyMonthlyStats.revenue + changes['revenue']))
+            if result.rowcount == 0:
+                connection.execute(insert(PropertyMonthlyStats).values(
+                    property_id=property_id, month=month, owner_id=owner_of(property_id),
+                    occupied_nights=changes['occupied_nights'], revenue=changes['revenue']))
+            elif changes['occupied_nights'] < 0:
+                connection.execute(delete(PropertyMonthlyStats).where(
+                    *match, PropertyMonthlyStats.occupied_nights <= 0))
+
+    def insert(self, connection):
+        """Write the changes as new rows with bulk INSERTs, for empty stats tables"""
+        owners = dict(connection.execute(select(Property.id, Property.owner_id)).all())
+        empty = dict({status: 0 for status in BOOKING_STATUSES}, approved_revenue=0.0)
+        totals = [dict(empty, **changes, property_id=property_id, owner_id=owners[property_id])
+                  for property_id, changes in sorted(self.totals.items()) if any(changes.values())]
+        months = [{'property_id': property_id, 'month': month, 'owner_id': owners[property_id],
+                   'occupied_nights': changes['occupied_nights'], 'revenue': changes['revenue']}
+                  for (property_id, month), changes in sorted(self.months.items())
+                  if changes['occupied_nights'] > 0]
+        for model, rows in ((PropertyBookingStats, totals), (PropertyMonthlyStats, months)):
+            for start in range(0, len(rows), REBUILD_BATCH_SIZE):
+                connection.execute(insert(model), rows[start:start + REBUILD_BATCH_SIZE])
+
+
+def _current_values(booking):
+    values = {name: getattr(booking, name) for name in BOOKING_FIELDS}
+    # status is only defaulted to pending on insert
+    if values['status'] is None:
+        values['status'] = 'pending'
+    return values
+
+
+@event.listens_for(Session, 'before_flush')
+def track_booking_stats(session, flush_context, instances):
+    """Apply the booking stats changes of the pending flush in the same transaction"""
+    delta = StatsDelta()
+    deleted_properties = set()
+    for obj in session.new:
+        if isinstance(obj, Booking):
+            delta.add(_current_values(obj))
+    for obj in session.deleted:
+        if isinstance(obj, Booking):
+            delta.add(committed_values(session, obj, BOOKING_FIELDS), sign=-1)
+        elif isinstance(obj, Property):
+            deleted_properties.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, Booking) and session.is_modified(obj):
+            delta.add(committed_values(session, obj, BOOKING_FIELDS), sign=-1)
+            delta.add(_current_values(obj))
+
+    connection = None
+    if deleted_properties:
+        # A deleted property's stats go with it rather than being counted down
+        delta.discard(deleted_properties)
+        connection = session.connection()
+        for model in (PropertyBookingStats, PropertyMonthlyStats):
+            connection.execute(delete(model).where(model.property_id.in_(deleted_properties)))
+    if delta.totals or delta.months:
+        delta.apply(connection or session.connection())
+
+
+def rebuild_owner_analytics():
+    """Recompute the booking stats tables from every booking"""
+    db.session.execute(delete(PropertyMonthlyStats))
+    db.session.execute(delete(PropertyBookingStats))
+    delta = StatsDelta()
+    rows = db.session.execute(
+        select(*(getattr(Booking, name) for name in BOOKING_FIELDS))
+        .execution_options(yield_per=1000))
+    for row in rows:
+        delta.add(dict(row._mapping))
+    # The tables were just emptied, so insert in bulk instead of upserting row by row
+    delta.insert(db.session.connection())
+    db.session.commit()
+
+
+def ensure_owner_analytics():
+    """Build the booking stats tables if bookings exist but they have never been built"""
+    if (db.session.query(PropertyBookingStats.property_id).first() is None
+            and db.session.query(Booking.id).first() is not None):
+        rebuild_owner_analytics()
+
+
+def parse_month(value, name):
+    """Parse a YYYY-MM query value into the first day of that month"""
+    try:
+        year, month = (int(part) for part in value.split('-'))
+        return date(year, month, 1)
+    except (AttributeError, TypeError, ValueError):
+        raise ValueError(f'{name} must be a month in YYYY-MM format')
+
+
+def month_window(args, today):
+    """Read an inclusive [from, to] month range from args, defaulting to the last 12 months"""
+    end = parse_month(args['to'], 'to') if args.get('to') else date(today.year, today.month, 1)
+    if args.get('from'):
+        start = parse_month(args['from'], 'from')
+    else:
+        months_back = end.year * 12 + end.month - 12
+        start = date(months_back // 12, months_back % 12 + 1, 1)
+    span = (end.year - start.year) * 12 + end.month - start.month + 1
+    if span < 1:
+        raise ValueError('to must not be before from')
+    if span > MAX_ANALYTICS_MONTHS:
+        raise ValueError(f'Date range cannot exceed {MAX_ANALYTICS_MONTHS} months')
+    return start, end
+
+
+def _months(start, end):
+    months = []
+    cursor = start
+    while cursor <= end:
+        months.append(cursor)
+        cursor = date(cursor.year + cursor.month // 12, cursor.month % 12 + 1, 1)
+    return months
+
+
+def owner_analytics(owner_id, start, end):
+    """Dashboard figures for an owner from the stats tables, without reading bookings"""
+    properties = db.session.execute(
+        select(Property.id, Property.title, PropertyBookingStats)
+        .outerjoin(PropertyBookingStats, PropertyBookingStats.property_id == Property.id)
+        .where(Property.owner_id == owner_id)
+        .order_by(Property.created_at, Property.id)).all()
+
+    monthly_rows = db.session.execute(
+        select(PropertyMonthlyStats.property_id, PropertyMonthlyStats.month,
+               PropertyMonthlyStats.occupied_nights, PropertyMonthlyStats.revenue)
+        .where(PropertyMonthlyStats.owner_id == owner_id,
+               PropertyMonthlyStats.month.between(month_key(start), month_key(end)))).all()
+
+    months = _months(start, end)
+    nights_in_window = Counter()
+    by_month = {month_key(month): {'occupied_nights': 0, 'revenue': 0.0} for month in months}
+    for property_id, month, nights, revenue in monthly_rows:
+        nights_in_window[property_id] += nights
+        by_month[month]['occupied_nights'] += nights
+        by_month[month]['revenue'] += revenue
+
+    window_days = sum(calendar.monthrange(month.year, month.month)[1] for month in months)
+    totals = Counter()
+    properties_data = []
+    for property_id, title, stats in properties:
+        bookings = {status: getattr(stats, status) if stats else 0 for status in BOOKING_STATUSES}
+        revenue = stats.approved_revenue if stats else 0.0
+        totals.update(bookings)
+        totals['approved_revenue'] += revenue
+        properties_data.append({
+            'property_id': property_id,
+            'title': title,
+            'bookings': bookings,
+            'approved_revenue': round(revenue, 2),
+            'occupied_nights': nights_in_window[property_id],
+            'occupancy_rate': round(nights_in_window[property_id] / window_days, 4)
+        })
+
+    property_count = len(properties)
+    monthly = []
+    for month in months:
+        key = month_key(month)
+        available_nights = calendar.monthrange(month.year, month.month)[1] * property_count
+        monthly.append({
+            'month': key,
+            'occupied_nights': by_month[key]['occupied_nights'],
+            'revenue': round(by_month[key]['revenue'], 2),
+            'occupancy_rate': round(by_month[key]['occupied_nights'] / available_nights, 4)
+            if available_nights else 0.0
+        })
+
+    return {
+        'from': month_key(start),
+        'to': month_key(end),
+        'totals': {
+            'properties': property_count,
+            'bookings': {status: totals[status] for status in BOOKING_STATUSES},
+            'pending_requests': totals['pending'],
+            'approved_revenue': round(totals['approved_revenue'], 2)
+        },
+        'properties': properties_data,
+        'monthly': monthly
+    }
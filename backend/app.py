@@ -1,38 +1,64 @@
-from flask import Flask
-from flask_bcrypt import Bcrypt
+from flask import Flask, jsonify
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from config import config
 from models import db
+from cache import listing_cache
+from passwords import password_hasher, PoolSaturated
+from sqlite_pragmas import install_sqlite_pragmas
+from replica import replica_router, REPLICA_BIND
+from instrumentation import sql_instrumentation
+from metrics import metrics
+from auth_tokens import user_cache, token_revoked
 
 # Initialize extensions
-bcrypt = Bcrypt()
 jwt = JWTManager()
+jwt.token_in_blocklist_loader(token_revoked)
 
 
-def create_app(config_name='default'):
+def create_app(config_name='default', replica_url=None):
     """Application factory pattern"""
     app = Flask(__name__)
     
     # Load configuration
     app.config.from_object(config[config_name])
+    if replica_url:
+        app.config['REPLICA_DATABASE_URL'] = replica_url
     
-    # Initialize extensions
+    # Initialize extensions (the replica bind has to be configured before db)
+    replica_router.init_app(app)
     db.init_app(app)
-    bcrypt.init_app(app)
+    # The replica is a copy of the primary, so create_all/drop_all leave it alone
+    db.metadatas.pop(REPLICA_BIND, None)
     jwt.init_app(app)
+    listing_cache.init_app(app)
+    password_hasher.init_app(app)
+    user_cache.init_app(app)
+    sql_instrumentation.init_app(app)
+    metrics.init_app(app)
     CORS(app, resources={r"/api/*": {"origins": "*"}})
     
+    @app.errorhandler(PoolSaturated)
+    def handle_pool_saturated(e):
+        response = jsonify({'error': 'Server is busy, please retry shortly'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    
     # Register blueprints
     from routes.auth import auth_bp
     from routes.rentals import rentals_bp
+    from routes.batch import batch_bp
     
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(rentals_bp, url_prefix='/api/rentals')
+    app.register_blueprint(batch_bp, url_prefix='/api/batch')
     
-    # Create database tables
+    # Apply pending schema migrations; a single query when there are none
+    from migrations import check_schema
     with app.app_context():
-        db.create_all()
+        for engine in db.engines.values():
+            install_sqlite_pragmas(engine, app.config['SQLITE_PRAGMAS'])
+        check_schema(app)
     
     return app
 
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Query plan audit for the Novella API
+Drives every route in process, runs EXPLAIN QUERY PLAN on each SQL statement
+it issues and exits non-zero if any statement falls back to a full table scan.
+
+Run with: python audit_query_plans.py [--verbose]
+"""
+
+import json
+import re
+import sys
+from collections import defaultdict
+from flask import has_request_context, request
+from sqlalchemy import event
+from app import create_app
+from models import db
+
+SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\w+)(.*)$')
+
+# Summary tables small enough, and meant, to be read whole
+WHOLE_TABLE_READS = {'facet_counts'}
+
+PROPERTY = {
+    "title": "Sunny Garden Apartment",
+    "description": "Bright two bedroom apartment with a private garden",
+    "address": "12 Riverside Drive",
+    "city": "Nairobi",
+    "state": "Nairobi",
+    "zip_code": "00100",
+    "property_type": "apartment",
+    "bedrooms": 2,
+    "bathrooms": 1,
+    "square_feet": 900,
+    "price_per_month": 1200,
+    "latitude": -1.2864,
+    "longitude": 36.8172,
+    "amenities": ["wifi", "parking"],
+    "images": ["https://example.com/image1.jpg"]
+}
+
+
+def run_scenario(client):
+    """Exercise every route with the filter combinations the frontend uses"""
+    owner = client.post('/api/auth/signup', json={
+        "email": "owner@example.com", "password": "password123", "first_name": "Owner",
+        "last_name": "Audit", "user_type": "owner"
+    }).get_json()
+    renter = client.post('/api/auth/signup', json={
+        "email": "renter@example.com", "password": "password123", "first_name": "Renter",
+        "last_name": "Audit", "user_type": "renter"
+    }).get_json()
+    owner_headers = {"Authorization": f"Bearer {owner['access_token']}"}
+    renter_headers = {"Authorization": f"Bearer {renter['access_token']}"}
+
+    client.post('/api/auth/login', json={"email": "owner@example.com", "password": "password123"})
+    client.get('/api/auth/me', headers=owner_headers)
+    client.put('/api/auth/update-profile', json={"phone": "555-0100"}, headers=owner_headers)
+
+    property_id = client.post('/api/rentals/properties', json=PROPERTY,
+                              headers=owner_headers).get_json()['property']['id']
+    client.post('/api/rentals/properties/import', data='\n'.join(
+        json.dumps(dict(PROPERTY, title=f"Imported {i}")) for i in range(3)),
+        content_type='application/x-ndjson', headers=owner_headers)
+    listing_filters = [
+        {},
+        {"sort": "price_asc"},
+        {"sort": "price_desc", "max_price": 2000},
+        {"property_type": "apartment"},
+        {"property_type": "apartment", "sort": "price_asc"},
+        {"min_price": 500, "max_price": 1500},
+        {"bedrooms": 2},
+        {"city": "nairobi"},
+        {"q": "garden"},
+        {"q": "garden", "city": "nairobi", "property_type": "apartment", "max_price": 2000},
+        {"include_count": "true"},
+        {"amenities": "wifi,parking"},
+        {"amenities": "wifi,pool", "amenities_match": "any", "property_type": "apartment"},
+        {"available_from": "2025-03-01", "available_to": "2025-04-01"},
+        {"near": "-1.2921,36.8219", "radius_km": 5},
+        {"bbox": "36.6,-1.45,37.1,-1.1", "property_type": "apartment"},
+    ]
+    for filters in listing_filters:
+        page = client.get('/api/rentals/properties', query_string=dict(filters, limit=1)).get_json()
+        if page.get('next_cursor'):
+            client.get('/api/rentals/properties',
+                       query_string=dict(filters, limit=1, cursor=page['next_cursor']))
+    for facet_filters in ({}, {"city": "Austin"}, {"min_price": 1000, "bedrooms": 2}):
+        client.get('/api/rentals/properties/facets', query_string=facet_filters)
+    client.get(f'/api/rentals/properties/{property_id}')
+    client.put(f'/api/rentals/properties/{property_id}', json={"price_per_month": 1300},
+               headers=owner_headers)
+    client.get('/api/rentals/my-properties', headers=owner_headers,
+               query_string={"include_count": "true"})
+    client.get('/api/rentals/my-properties', headers=owner_headers,
+               query_string={"sort": "price_asc"})
+
+    booking_id = client.post('/api/rentals/bookings', json={
+        "property_id": property_id, "start_date": "2025-02-01", "end_date": "2025-08-01"
+    }, headers=renter_headers).get_json()['booking']['id']
+    client.get('/api/rentals/my-bookings', headers=renter_headers,
+               query_string={"include_count": "true"})
+    client.get('/api/rentals/property-bookings', headers=owner_headers,
+               query_string={"include_count": "true"})
+    for fmt in ('ndjson', 'csv'):
+        client.get('/api/rentals/my-properties/export', headers=owner_headers,
+                   query_string={"format": fmt}).get_data()
+        client.get('/api/rentals/property-bookings/export', headers=owner_headers,
+                   query_string={"format": fmt}).get_data()
+    client.put(f'/api/rentals/bookings/{booking_id}/status', json={"status": "approved"},
+               headers=owner_headers)
+    client.get('/api/rentals/owner-analytics', headers=owner_headers,
+               query_string={"from": "2025-01", "to": "2025-12"})
+    second_id = client.post('/api/rentals/bookings', json={
+        "property_id": property_id, "start_date": "2025-09-01", "end_date": "2025-10-01"
+    }, headers=renter_headers).get_json()['booking']['id']
+    client.put('/api/rentals/bookings/status', json={"updates": [
+        {"booking_id": second_id, "status": "approved"},
+        {"booking_id": booking_id, "status": "cancelled"},
+    ]}, headers=owner_headers)
+    client.put(f'/api/rentals/bookings/{booking_id}/status', json={"status": "approved"},
+               headers=owner_headers)
+    client.post('/api/rentals/bookings', json={
+        "property_id": property_id, "start_date": "2025-03-01", "end_date": "2025-04-01"
+    }, headers=renter_headers)
+    client.get('/api/rentals/properties', query_string={
+        "available_from": "2025-03-01", "available_to": "2025-04-01"
+    })
+    client.get(f'/api/rentals/properties/{property_id}/availability',
+               query_string={"from": "2025-01-01", "to": "2025-12-31"})
+    client.delete(f'/api/rentals/properties/{property_id}', headers=owner_headers)
+
+
+def audit(verbose=False):
+    app = create_app('testing')
+    # Every listing request must reach the database to be audited
+    app.config['LISTING_CACHE_ENABLED'] = False
+    client = app.test_client()
+    captured = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if executemany or not has_request_context():
+            return
+        captured.append((request.endpoint, statement, parameters))
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        engine = db.engine
+        tables = set(db.metadata.tables) - WHOLE_TABLE_READS
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        run_scenario(client)
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+    failures = defaultdict(list)
+    seen = set()
+    with engine.connect() as conn:
+        for endpoint, statement, parameters in captured:
+            if (endpoint, statement) in seen:
+                continue
+            seen.add((endpoint, statement))
+            plan = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+            details = [row[-1] for row in plan]
+            scans = [detail for detail in details
+                     if (match := SCAN_RE.match(detail)) and match.group(1) in tables
+                     and 'USING' not in match.group(2)]
+            if scans:
+                failures[endpoint].append((statement, details))
+            if verbose:
+                print(f"\n[{endpoint}] {' '.join(statement.split())}")
+                for detail in details:
+                    print(f"    {detail}")
+
+    print(f"\nAudited {len(seen)} distinct statements across "
+          f"{len({endpoint for endpoint, _ in seen})} endpoints")
+    if not failures:
+        print("✅ No full table scans")
+        return 0
+
+    for endpoint, statements in failures.items():
+        for statement, details in statements:
+            print(f"\n❌ Full table scan in {endpoint}:")
+            print(f"    {' '.join(statement.split())}")
+            for detail in details:
+                print(f"    {detail}")
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(audit(verbose='--verbose' in sys.argv))
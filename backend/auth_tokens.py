@@ -0,0 +1,121 @@
+from collections import namedtuple
+from functools import wraps
+from flask import g, jsonify
+from flask_jwt_extended import (create_access_token, get_jwt, get_jwt_header, get_jwt_identity,
+                                verify_jwt_in_request)
+from flask_jwt_extended.exceptions import JWTExtendedException, RevokedTokenError
+from jwt import PyJWTError
+from models import db, User
+from cache import TTLCache
+
+# What a request usually needs to know about its caller; profile is to_dict()
+CachedUser = namedtuple('CachedUser', 'id user_type token_version profile')
+
+
+class UserCache(TTLCache):
+    """Per-process TTL cache of users, keyed by id
+
+    Spares authenticated requests the user lookup. Each worker process holds
+    its own cache; the TTL bounds how long another worker can keep serving a
+    changed profile or accepting a revoked token. Writes to a user in this
+    process should call invalidate().
+    """
+
+    def __init__(self, app=None):
+        super().__init__(max_entries=10000)
+        self.ttl = 30
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.setdefault('USER_CACHE_TTL', self.ttl)
+        self.max_entries = app.config.setdefault('USER_CACHE_MAX_ENTRIES', self.max_entries)
+        self.clear()
+
+    def get(self, user_id):
+        """The CachedUser for user_id, loading it on a miss; None if there is no such user"""
+        return self.get_or_compute(user_id, self.ttl, lambda: self._load(user_id))
+
+    @staticmethod
+    def _load(user_id):
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        return CachedUser(user.id, user.user_type, user.token_version, user.to_dict())
+
+
+user_cache = UserCache()
+
+
+def issue_token(user):
+    """Access token for user carrying its user_type and token_version as claims"""
+    return create_access_token(identity=user.id, additional_claims={
+        'user_type': user.user_type,
+        'token_version': user.token_version,
+    })
+
+
+def token_revoked(jwt_header, jwt_payload):
+    """Reject tokens issued before the user's token_version was last bumped"""
+    version = jwt_payload.get('token_version')
+    if version is None:
+        # Issued before tokens carried claims; they still expire on their own
+        return False
+    user = user_cache.get(jwt_payload['sub'])
+    return user is None or user.token_version != version
+
+
+def share_caller():
+    """Verify the request's token once for the sub-requests run under it; False if there is none
+
+    Sub-requests of POST /api/batch share the batch's app context, and with it
+    g, where flask_jwt_extended keeps the verified token. Without a valid
+    token each sub-request verifies the header itself and reports its error.
+    """
+    try:
+        g.shared_caller = verify_jwt_in_request(optional=True) is not None
+    except (JWTExtendedException, PyJWTError):
+        g.shared_caller = False
+    return g.shared_caller
+
+
+def token_required():
+    """jwt_required() that reuses a token share_caller() already verified
+
+    Revocation is still checked against the user cache, so a batch that
+    changes the password stops acting on the old token part way through.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if g.get('shared_caller'):
+                jwt_header, jwt_payload = get_jwt_header(), get_jwt()
+                if token_revoked(jwt_header, jwt_payload):
+                    raise RevokedTokenError(jwt_header, jwt_payload)
+            else:
+                verify_jwt_in_request()
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def role_required(user_type, message):
+    """token_required() that also requires a user_type, authorized from the token's claims
+
+    Tokens without the claim (issued before it existed) fall back to the
+    cached user. user_type never changes once an account exists; if that
+    changes, bump token_version along with it.
+    """
+    def decorator(view):
+        @wraps(view)
+        @token_required()
+        def wrapper(*args, **kwargs):
+            claimed = get_jwt().get('user_type')
+            if claimed is None:
+                user = user_cache.get(get_jwt_identity())
+                claimed = user.user_type if user else None
+            if claimed != user_type:
+                return jsonify({'error': message}), 403
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
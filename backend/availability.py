@@ -0,0 +1,83 @@
+from datetime import datetime
+from sqlalchemy import exists
+from models import Booking, Property
+
+# Bookings in this status hold a property's dates
+BLOCKING_STATUS = 'approved'
+
+
+def parse_date(value, name):
+    """Parse a YYYY-MM-DD query value, raising ValueError with a readable message"""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be a date in YYYY-MM-DD format')
+
+
+def parse_date_range(args, from_key, to_key):
+    """Read an optional [from, to) date range from request args"""
+    start, end = args.get(from_key), args.get(to_key)
+    if not start and not end:
+        return None
+    if not start or not end:
+        raise ValueError(f'{from_key} and {to_key} must be given together')
+    start, end = parse_date(start, from_key), parse_date(end, to_key)
+    if start >= end:
+        raise ValueError(f'{to_key} must be after {from_key}')
+    return start, end
+
+
+def _approved_overlapping(property_id, start_date, end_date):
+    """Approved bookings of a property overlapping [start_date, end_date), by end date
+
+    Seeks ix_bookings_property_status_end to the bookings ending after
+    start_date, which are the current and future ones rather than the
+    property's whole history, and checks the start of each. No assumption is
+    made about approved bookings not overlapping one another. Ordering by
+    end_date, the index order, also keeps the planner off
+    ix_bookings_property_start and its scan of past bookings.
+    """
+    return (Booking.query
+            .filter(Booking.property_id == property_id,
+                    Booking.status == BLOCKING_STATUS,
+                    Booking.end_date > start_date,
+                    Booking.start_date < end_date)
+            .order_by(Booking.end_date))
+
+
+def find_conflict(property_id, start_date, end_date, exclude_id=None):
+    """Return an approved booking overlapping [start_date, end_date), if any"""
+    query = _approved_overlapping(property_id, start_date, end_date)
+    if exclude_id is not None:
+        query = query.filter(Booking.id != exclude_id)
+    return query.first()
+
+
+def filter_available(query, start_date, end_date):
+    """Restrict a Property query to properties free for all of [start_date, end_date)"""
+    booked = (exists().where(Booking.property_id == Property.id,
+                             Booking.status == BLOCKING_STATUS,
+                             Booking.end_date > start_date,
+                             Booking.start_date < end_date)
+              .correlate(Property))
+    return query.filter(~booked)
+
+
+def booked_ranges(property_id, start_date, end_date):
+    """Approved bookings overlapping [start_date, end_date), in date order"""
+    bookings = _approved_overlapping(property_id, start_date, end_date).all()
+    return sorted(bookings, key=lambda booking: (booking.start_date, booking.end_date))
+
+
+def availability_calendar(property_id, start_date, end_date):
+    """Booked and free date ranges of a property within [start_date, end_date)"""
+    booked, free = [], []
+    cursor = start_date
+    for booking in booked_ranges(property_id, start_date, end_date):
+        if booking.start_date > cursor:
+            free.append((cursor, booking.start_date))
+        booked.append((booking.start_date, booking.end_date))
+        cursor = max(cursor, booking.end_date)
+    if cursor < end_date:
+        free.append((cursor, end_date))
+    return booked, free
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Load and latency benchmark for the Novella API
+Seeds a synthetic dataset into the testing database with bulk inserts, drives
+each endpoint in process through Flask's test client and reports throughput
+and p50/p95/p99 latency per endpoint. Results are saved as JSON; pass a
+previous run as --baseline to compare against it.
+
+Run with: python benchmark_api.py [--users 10000] [--properties 100000] [--bookings 500000]
+                                  [--requests 200] [--concurrency 1] [--reuse]
+                                  [--output benchmark.json] [--baseline baseline.json]
+"""
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from flask_jwt_extended import create_access_token
+from sqlalchemy import func, select
+from app import create_app
+from models import db, User, Property, Booking
+from synthetic_data import CITIES, PROPERTY_TYPES, AMENITIES, generate_dataset
+from benchmark_sqlite import percentile
+
+# Requests per endpoint sent before measuring, to warm caches and the pool
+WARMUP_REQUESTS = 5
+# p95 increase over the baseline reported as a regression, as a fraction
+REGRESSION_THRESHOLD = 0.2
+
+
+class Fixtures:
+    """Ids and tokens the scenarios pick from, sampled from the seeded data"""
+
+    def __init__(self, app, sample=200):
+        with app.app_context():
+            self.property_ids = db.session.scalars(
+                select(Property.id).where(Property.is_available.is_(True))
+                .order_by(func.random()).limit(sample)).all()
+            owner_ids = db.session.scalars(
+                select(Property.owner_id).group_by(Property.owner_id)
+                .order_by(func.random()).limit(sample)).all()
+            renter_ids = db.session.scalars(
+                select(Booking.renter_id).group_by(Booking.renter_id)
+                .order_by(func.random()).limit(sample)).all()
+            self.owners = [self._auth(user_id) for user_id in owner_ids]
+            self.renters = [self._auth(user_id) for user_id in renter_ids]
+
+    @staticmethod
+    def _auth(user_id):
+        return {'Authorization': f'Bearer {create_access_token(identity=user_id)}'}
+
+
+def _listing(rng, fixtures):
+    return 'GET', '/api/rentals/properties', {'query_string': {
+        'limit': 20, 'sort': rng.choice(('newest', 'price_asc', 'price_desc'))}}
+
+
+def _listing_filtered(rng, fixtures):
+    low = rng.randrange(300, 3000, 100)
+    return 'GET', '/api/rentals/properties', {'query_string': {
+        'limit': 20, 'city': rng.choice(CITIES)[0], 'property_type': rng.choice(PROPERTY_TYPES),
+        'min_price': low, 'max_price': low + 1500, 'sort': 'price_asc'}}
+
+
+def _listing_count(rng, fixtures):
+    return 'GET', '/api/rentals/properties', {'query_string': {
+        'limit': 20, 'bedrooms': rng.randint(1, 4), 'include_count': 'true'}}
+
+
+def _search(rng, fixtures):
+    return 'GET', '/api/rentals/properties', {'query_string': {
+        'limit': 20, 'q': rng.choice(('garden', 'sunny loft', 'quiet terrace', 'modern view'))}}
+
+
+def _amenities(rng, fixtures):
+    return 'GET', '/api/rentals/properties', {'query_string': {
+        'limit': 20, 'amenities': ','.join(rng.sample(AMENITIES, 2))}}
+
+
+def _near(rng, fixtures):
+    _, _, latitude, longitude = rng.choice(CITIES)
+    return 'GET', '/api/rentals/properties', {'query_string': {
+        'limit': 20, 'near': f'{latitude},{longitude}', 'radius_km': rng.choice((2, 5, 10))}}
+
+
+def _available(rng, fixtures):
+    start = date(2024, 1, 1) + timedelta(days=rng.randrange(700))
+    return 'GET', '/api/rentals/properties', {'query_string': {
+        'limit': 20, 'available_from': start.isoformat(),
+        'available_to': (start + timedelta(days=30)).isoformat()}}
+
+
+def _facets(rng, fixtures):
+    query = rng.choice(({}, {'city': rng.choice(CITIES)[0]}, {'bedrooms': rng.randint(1, 4)}))
+    return 'GET', '/api/rentals/properties/facets', {'query_string': query}
+
+
+def _detail(rng, fixtures):
+    return 'GET', f'/api/rentals/properties/{rng.choice(fixtures.property_ids)}', {}
+
+
+def _availability(rng, fixtures):
+    return 'GET', f'/api/rentals/properties/{rng.choice(fixtures.property_ids)}/availability', {
+        'query_string': {'from': '2024-01-01', 'to': '2025-12-31'}}
+
+
+def _me(rng, fixtures):
+    return 'GET', '/api/auth/me', {'headers': rng.choice(fixtures.renters)}
+
+
+def _my_properties(rng, fixtures):
+    return 'GET', '/api/rentals/my-properties', {
+        'headers': rng.choice(fixtures.owners), 'query_string': {'include_count': 'true'}}
+
+
+def _property_bookings(rng, fixtures):
+    return 'GET', '/api/rentals/property-bookings', {'headers': rng.choice(fixtures.owners)}
+
+
+def _my_bookings(rng, fixtures):
+    return 'GET', '/api/rentals/my-bookings', {'headers': rng.choice(fixtures.renters)}
+
+
+def _owner_analytics(rng, fixtures):
+    return 'GET', '/api/rentals/owner-analytics', {
+        'headers': rng.choice(fixtures.owners), 'query_string': {'from': '2024-01', 'to': '2025-12'}}
+
+
+def _create_booking(rng, fixtures):
+    # Far in the future so requests rarely collide with seeded bookings
+    start = date(2030, 1, 1) + timedelta(days=rng.randrange(3000))
+    return 'POST', '/api/rentals/bookings', {'headers': rng.choice(fixtures.renters), 'json': {
+        'property_id': rng.choice(fixtures.property_ids), 'start_date': start.isoformat(),
+        'end_date': (start + timedelta(days=rng.randint(7, 60))).isoformat()}}
+
+
+# Endpoint scenarios by name; each returns (method, path, test client kwargs)
+SCENARIOS = {
+    'list_properties': _listing,
+    'list_properties_filtered': _listing_filtered,
+    'list_properties_count': _listing_count,
+    'search_properties': _search,
+    'filter_amenities': _amenities,
+    'near_properties': _near,
+    'available_properties': _available,
+    'property_facets': _facets,
+    'property_detail': _detail,
+    'property_availability': _availability,
+    'auth_me': _me,
+    'my_properties': _my_properties,
+    'property_bookings': _property_bookings,
+    'my_bookings': _my_bookings,
+    'owner_analytics': _owner_analytics,
+    'create_booking': _create_booking,
+}
+
+
+def run_scenario(app, fixtures, scenario, requests, concurrency, seed):
+    """Send requests to one scenario from concurrency threads; returns its statistics"""
+    per_thread = max(1, requests // concurrency)
+    latencies, statuses = [], Counter()
+    lock = threading.Lock()
+
+    def worker(index):
+        client = app.test_client()
+        rng = random.Random(seed * 1000 + index)
+        for _ in range(WARMUP_REQUESTS):
+            method, path, kwargs = scenario(rng, fixtures)
+            client.open(path, method=method, **kwargs)
+        barrier.wait()
+        local_latencies, local_statuses = [], Counter()
+        for _ in range(per_thread):
+            method, path, kwargs = scenario(rng, fixtures)
+            started = time.perf_counter()
+            response = client.open(path, method=method, **kwargs)
+            response.get_data()
+            local_latencies.append(time.perf_counter() - started)
+            local_statuses[response.status_code] += 1
+        with lock:
+            latencies.extend(local_latencies)
+            statuses.update(local_statuses)
+
+    barrier = threading.Barrier(concurrency + 1)
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        'requests': len(latencies),
+        'per_second': round(len(latencies) / elapsed, 1),
+        'errors': sum(count for status, count in statuses.items() if status >= 500),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+    }
+
+
+def dataset_counts():
+    return {
+        'users': db.session.scalar(select(func.count(User.id))),
+        'properties': db.session.scalar(select(func.count(Property.id))),
+        'bookings': db.session.scalar(select(func.count(Booking.id))),
+    }
+
+
+def prepare_dataset(app, args):
+    """Seed the testing database, or keep it with --reuse if it already has the data"""
+    wanted = {'users': args.users, 'properties': args.properties, 'bookings': args.bookings}
+    with app.app_context():
+        counts = dataset_counts()
+        # Earlier runs' create_booking requests only ever add bookings
+        if (args.reuse and counts['users'] == wanted['users']
+                and counts['properties'] == wanted['properties']
+                and counts['bookings'] >= wanted['bookings']):
+            print(f"Reusing dataset: {counts}")
+            return 0.0
+        db.drop_all()
+        db.create_all()
+        started = time.perf_counter()
+        counts = generate_dataset(args.users, args.properties, args.bookings, seed=args.seed)
+        elapsed = time.perf_counter() - started
+    print(f"Seeded {counts} in {elapsed:.1f}s")
+    return round(elapsed, 1)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Print each endpoint against the baseline; returns the names of regressed endpoints"""
+    regressed = []
+    print(f"\nCompared with baseline {baseline['meta'].get('commit')} "
+          f"({baseline['meta'].get('timestamp')}):")
+    for name, stats in results['endpoints'].items():
+        before = baseline['endpoints'].get(name)
+        if not before:
+            print(f"    {name:26} (not in baseline)")
+            continue
+        change = (stats['p95_ms'] - before['p95_ms']) / before['p95_ms'] if before['p95_ms'] else 0
+        flag = '  ❌ regression' if change > threshold else ''
+        if flag:
+            regressed.append(name)
+        print(f"    {name:26} p95 {before['p95_ms']:8.2f} -> {stats['p95_ms']:8.2f} ms "
+              f"({change:+.0%})   {before['per_second']:8.1f} -> {stats['per_second']:8.1f} req/s{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--properties', type=int, default=100000)
+    parser.add_argument('--bookings', type=int, default=500000)
+    parser.add_argument('--seed', type=int, default=0, help='random seed for data and requests')
+    parser.add_argument('--reuse', action='store_true',
+                        help='keep the testing database if it already holds this dataset')
+    parser.add_argument('--requests', type=int, default=200, help='measured requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=1, help='client threads per endpoint')
+    parser.add_argument('--endpoints', help='comma-separated scenario names (default: all)')
+    parser.add_argument('--cache', action='store_true', help='leave the listing cache on')
+    parser.add_argument('--output', default='benchmark.json', help='where to write the results')
+    parser.add_argument('--baseline', help='results JSON of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='p95 increase counted as a regression (default 0.2 = 20%%)')
+    args = parser.parse_args()
+
+    names = args.endpoints.split(',') if args.endpoints else list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(unknown)}. Choose from {', '.join(SCENARIOS)}")
+
+    app = create_app('testing')
+    app.config['LISTING_CACHE_ENABLED'] = args.cache
+    seed_seconds = prepare_dataset(app, args)
+    fixtures = Fixtures(app)
+
+    results = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'dataset': {'users': args.users, 'properties': args.properties,
+                        'bookings': args.bookings, 'seed': args.seed},
+            'seed_seconds': seed_seconds,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'listing_cache': args.cache,
+        },
+        'endpoints': {},
+    }
+    print(f"\n{'endpoint':26} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for name in names:
+        stats = run_scenario(app, fixtures, SCENARIOS[name], args.requests, args.concurrency,
+                             args.seed)
+        results['endpoints'][name] = stats
+        print(f"{name:26} {stats['per_second']:8.1f} {stats['p50_ms']:8.2f} {stats['p95_ms']:8.2f} "
+              f"{stats['p99_ms']:8.2f} {stats['errors']:7}")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+SQLite concurrency benchmark for the Novella API
+Runs reader and writer threads against the app in process, once with the
+default engine settings and once with the production profile (WAL, pragmas
+and pool tuning), and reports throughput, latency and errors for each.
+
+Run with: python benchmark_sqlite.py [--seconds 10] [--readers 8] [--writers 2]
+                                     [--properties 500] [--json]
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from app import create_app
+from config import config, Config, ProductionConfig
+from models import db
+from sqlite_pragmas import current_pragmas
+
+# Engine settings compared, by name; the app's own config classes supply them
+PROFILES = {
+    'default': {'SQLITE_PRAGMAS': {}, 'SQLALCHEMY_ENGINE_OPTIONS': {}},
+    'production': {'SQLITE_PRAGMAS': ProductionConfig.SQLITE_PRAGMAS,
+                   'SQLALCHEMY_ENGINE_OPTIONS': ProductionConfig.SQLALCHEMY_ENGINE_OPTIONS},
+}
+
+REPORTED_PRAGMAS = ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size', 'mmap_size')
+
+PROPERTY = {
+    "description": "Benchmark listing", "address": "1 Load Street", "state": "TX",
+    "zip_code": "73301", "bathrooms": 1, "square_feet": 800,
+    "amenities": ["wifi"], "images": ["https://example.com/image.jpg"]
+}
+CITIES = ('Austin', 'Denver', 'Seattle', 'Boston', 'Nairobi')
+TYPES = ('apartment', 'house', 'condo', 'studio')
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def make_app(profile, directory):
+    """An app on a fresh database file in directory, configured with profile"""
+    name = f'benchmark-{profile}'
+    config[name] = type(name, (Config,), dict(
+        PROFILES[profile],
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(directory, f'{profile}.db')}",
+        # Every read has to reach the database to measure it
+        LISTING_CACHE_ENABLED=False,
+        BCRYPT_LOG_ROUNDS=4,
+        DEBUG=False,
+        TESTING=False,
+    ))
+    return create_app(name)
+
+
+def signup(client, email, user_type):
+    response = client.post('/api/auth/signup', json={
+        "email": email, "password": "password123", "first_name": "Bench",
+        "last_name": "Mark", "user_type": user_type
+    })
+    return {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+
+
+def seed(client, properties):
+    owner = signup(client, 'owner@example.com', 'owner')
+    renters = [signup(client, f'renter{i}@example.com', 'renter') for i in range(4)]
+    rows = '\n'.join(json.dumps(dict(
+        PROPERTY, title=f"Listing {i}", city=CITIES[i % len(CITIES)],
+        property_type=TYPES[i % len(TYPES)], bedrooms=1 + i % 4,
+        price_per_month=500 + (i * 37) % 3000)) for i in range(properties))
+    response = client.post('/api/rentals/properties/import', data=rows,
+                           content_type='application/x-ndjson', headers=owner)
+    assert response.get_json()['imported'] == properties, response.get_json()
+    page = client.get('/api/rentals/my-properties', headers=owner,
+                      query_string={"limit": 100, "fields": "id"}).get_json()
+    return owner, renters, [prop['id'] for prop in page['properties']]
+
+
+def read_once(client, rng, property_ids):
+    if rng.random() < 0.5:
+        return client.get('/api/rentals/properties', query_string={
+            "limit": 20, "city": rng.choice(CITIES), "max_price": rng.choice((1500, 2500, 4000))})
+    return client.get(f'/api/rentals/properties/{rng.choice(property_ids)}')
+
+
+def write_once(client, rng, owner, renters, property_ids):
+    if rng.random() < 0.5:
+        return client.put(f'/api/rentals/properties/{rng.choice(property_ids)}',
+                          json={"price_per_month": rng.randrange(500, 3500)}, headers=owner)
+    start = date(2026, 1, 1) + timedelta(days=rng.randrange(700))
+    return client.post('/api/rentals/bookings', json={
+        "property_id": rng.choice(property_ids),
+        "start_date": start.isoformat(),
+        "end_date": (start + timedelta(days=rng.randrange(3, 30))).isoformat()
+    }, headers=rng.choice(renters))
+
+
+def run_profile(profile, directory, seconds, readers, writers, properties):
+    app = make_app(profile, directory)
+    with app.app_context():
+        pragmas = current_pragmas(db.session.connection(), REPORTED_PRAGMAS)
+        db.session.rollback()
+    owner, renters, property_ids = seed(app.test_client(), properties)
+
+    lock = threading.Lock()
+    results = {'read': ([], Counter()), 'write': ([], Counter())}
+    deadline = time.perf_counter() + seconds
+    start_barrier = threading.Barrier(readers + writers)
+
+    def worker(kind, seed_value):
+        client = app.test_client()
+        rng = random.Random(seed_value)
+        latencies, statuses = [], Counter()
+        start_barrier.wait()
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            if kind == 'read':
+                response = read_once(client, rng, property_ids)
+            else:
+                response = write_once(client, rng, owner, renters, property_ids)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] += 1
+        with lock:
+            results[kind][0].extend(latencies)
+            results[kind][1].update(statuses)
+
+    threads = [threading.Thread(target=worker, args=('read', i)) for i in range(readers)]
+    threads += [threading.Thread(target=worker, args=('write', 1000 + i)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        db.engine.dispose()
+
+    report = {'pragmas': pragmas}
+    for kind, (latencies, statuses) in results.items():
+        errors = sum(count for status, count in statuses.items() if status >= 500)
+        report[kind] = {
+            'requests': len(latencies),
+            'per_second': round(len(latencies) / seconds, 1),
+            'errors': errors,
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+            'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--properties', type=int, default=500)
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='novella-benchmark-')
+    try:
+        reports = {profile: run_profile(profile, directory, args.seconds, args.readers,
+                                        args.writers, args.properties)
+                   for profile in PROFILES}
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return 0
+
+    print(f"\n{args.readers} readers, {args.writers} writers, {args.seconds:g}s per profile, "
+          f"{args.properties} properties")
+    for profile, report in reports.items():
+        print(f"\n{profile}: " + ', '.join(f"{name}={value}"
+                                          for name, value in report['pragmas'].items()))
+        for kind in ('read', 'write'):
+            stats = report[kind]
+            print(f"    {kind:5} {stats['per_second']:8.1f} req/s   p50 {stats['p50_ms']:7.2f} ms"
+                  f"   p95 {stats['p95_ms']:7.2f} ms   p99 {stats['p99_ms']:7.2f} ms"
+                  f"   errors {stats['errors']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
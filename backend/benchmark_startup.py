@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Worker cold start benchmark for the Novella API
+Starts fresh interpreters that import the app and call create_app against an
+already migrated database, the way a new WSGI worker does, and reports import
+time, create_app time and the SQL statements create_app ran.
+
+Run with: python benchmark_startup.py [--runs 5] [--config testing]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# Runs in each child interpreter; prints one JSON line
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import create_app
+imported = time.perf_counter()
+statements = []
+event.listen(Engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+create_app(sys.argv[1])
+created = time.perf_counter()
+print(json.dumps({'import_ms': (imported - started) * 1000, 'create_app_ms': (created - imported) * 1000,
+                  'queries': len(statements)}))
+'''
+
+
+def run_child(config_name):
+    output = subprocess.run([sys.executable, '-c', CHILD, config_name], check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--config', default='testing')
+    args = parser.parse_args()
+
+    # The first start migrates a fresh database; only later ones are measured
+    run_child(args.config)
+    runs = [run_child(args.config) for _ in range(args.runs)]
+    for key in ('import_ms', 'create_app_ms'):
+        values = [run[key] for run in runs]
+        print(f"{key:14s} median {statistics.median(values):7.1f}  min {min(values):7.1f}  "
+              f"max {max(values):7.1f}")
+    print(f"{'queries':14s} {runs[-1]['queries']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
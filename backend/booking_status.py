@@ -0,0 +1,185 @@
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import case, exists, or_, select, update
+from sqlalchemy.orm import aliased
+from models import db, Booking, Property
+from analytics import BOOKING_STATUSES, BOOKING_FIELDS, StatsDelta
+from availability import BLOCKING_STATUS
+from versions import bump_version
+
+
+def parse_status_updates(data, max_items):
+    """The list of {booking_id, status} items of a bulk status update body"""
+    items = data.get('updates') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        raise ValueError('updates must be a non-empty list')
+    if len(items) > max_items:
+        raise ValueError(f'At most {max_items} bookings can be updated at once')
+    return items
+
+
+def _failure(booking_id, code, error, **extra):
+    return dict({'booking_id': booking_id, 'success': False, 'code': code, 'error': error}, **extra)
+
+
+def _success(booking_id, status, previous_status, version):
+    return {'booking_id': booking_id, 'success': True, 'status': status,
+            'previous_status': previous_status, 'version': version}
+
+
+def _modified(row):
+    return _failure(row.id, 409, 'Booking was modified by another request', version=row.version)
+
+
+def _approved_bookings(approvals):
+    """Approved bookings that could overlap any of approvals, by property"""
+    approved = defaultdict(list)
+    rows = db.session.execute(
+        select(Booking.id, Booking.property_id, Booking.start_date, Booking.end_date)
+        .where(Booking.property_id.in_({row.property_id for row in approvals}),
+               Booking.status == BLOCKING_STATUS,
+               Booking.start_date < max(row.end_date for row in approvals),
+               Booking.end_date > min(row.start_date for row in approvals)))
+    for row in rows:
+        approved[row.property_id].append(row)
+    return approved
+
+
+def _overlaps(row, others):
+    return any(other.id != row.id and other.start_date < row.end_date
+               and other.end_date > row.start_date for other in others)
+
+
+def _is_integer(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _guarded_update(changes):
+    """The UPDATE writing changes, each only if its row is still at the version read
+
+    An approval also only applies while no other approved booking overlaps
+    it. The check runs inside the UPDATE, under the database's write lock, so
+    two requests approving overlapping bookings at once can't both succeed.
+    Bookings changed by the same statement are left out of the check; the
+    caller has already checked them against each other.
+    """
+    ids = [row.id for _, row, _ in changes]
+    new_status = case({row.id: status for _, row, status in changes}, value=Booking.id)
+    other = aliased(Booking)
+    overlap = exists().where(other.property_id == Booking.property_id,
+                             other.status == BLOCKING_STATUS,
+                             other.start_date < Booking.end_date,
+                             other.end_date > Booking.start_date,
+                             other.id.not_in(ids))
+    return (update(Booking)
+            .where(Booking.id.in_(ids),
+                   Booking.version == case({row.id: row.version for _, row, _ in changes},
+                                           value=Booking.id),
+                   or_(new_status != BLOCKING_STATUS, ~overlap))
+            .values(status=new_status, version=Booking.version + 1, updated_at=datetime.utcnow())
+            .returning(Booking.id))
+
+
+def update_booking_statuses(owner_id, items):
+    """Change the status of many of owner_id's bookings in one transaction
+
+    Ownership is checked for every booking with one joined query, approvals
+    are checked for overlaps against approved bookings (and each other) with
+    one more, and the accepted changes are written with a single conditional
+    UPDATE (see _guarded_update). An item may carry the version it expects,
+    e.g. from If-Match. The UPDATE skips the flush hooks, so the bookings
+    version and booking stats are updated here. Returns a result per item,
+    in order, and the (booking row, new status) pairs that were applied.
+    """
+    results = [None] * len(items)
+    wanted = {}
+    for index, item in enumerate(items):
+        item = item if isinstance(item, dict) else {}
+        booking_id, status, version = item.get('booking_id'), item.get('status'), item.get('version')
+        if not _is_integer(booking_id):
+            results[index] = _failure(booking_id, 400, 'booking_id must be an integer')
+        elif status not in BOOKING_STATUSES:
+            results[index] = _failure(booking_id, 400, 'Invalid status')
+        elif version is not None and not _is_integer(version):
+            results[index] = _failure(booking_id, 400, 'version must be an integer')
+        elif booking_id in wanted:
+            results[index] = _failure(booking_id, 400, 'Booking is listed more than once')
+        else:
+            wanted[booking_id] = (index, status, version)
+
+    rows = {}
+    if wanted:
+        rows = {row.id: row for row in db.session.execute(
+            select(Booking.id, Booking.version,
+                   *(getattr(Booking, name) for name in BOOKING_FIELDS), Property.owner_id)
+            .join(Property, Property.id == Booking.property_id)
+            .where(Booking.id.in_(wanted)))}
+
+    changes = []
+    for booking_id, (index, status, version) in wanted.items():
+        row = rows.get(booking_id)
+        if row is None:
+            results[index] = _failure(booking_id, 404, 'Booking not found')
+        elif row.owner_id != owner_id:
+            results[index] = _failure(booking_id, 403,
+                                      'You can only update bookings for your own properties')
+        elif version is not None and version != row.version:
+            results[index] = _modified(row)
+        elif row.status == status:
+            results[index] = _success(booking_id, status, row.status, row.version)
+        else:
+            changes.append((index, row, status))
+
+    approvals = [row for _, row, status in changes if status == BLOCKING_STATUS]
+    if approvals:
+        approved = _approved_bookings(approvals)
+        # Bookings this update takes out of approved no longer block anything
+        released = {row.id for _, row, _ in changes if row.status == BLOCKING_STATUS}
+        for property_id, bookings in approved.items():
+            approved[property_id] = [other for other in bookings if other.id not in released]
+        accepted = []
+        for index, row, status in changes:
+            if status == BLOCKING_STATUS:
+                if _overlaps(row, approved[row.property_id]):
+                    results[index] = _failure(
+                        row.id, 409, 'Booking overlaps an approved booking for this property')
+                    continue
+                approved[row.property_id].append(row)
+            accepted.append((index, row, status))
+        changes = accepted
+
+    if not changes:
+        db.session.rollback()
+        return results, []
+
+    connection = db.session.connection()
+    updated = set(connection.execute(_guarded_update(changes)).scalars())
+    if len(updated) < len(changes):
+        # Lost a race since the rows were read: tell a concurrent edit from an approval
+        current = dict(connection.execute(
+            select(Booking.id, Booking.version)
+            .where(Booking.id.in_([row.id for _, row, _ in changes if row.id not in updated]))).all())
+        for index, row, status in changes:
+            if row.id in updated:
+                continue
+            if current.get(row.id) != row.version:
+                results[index] = _modified(row._replace(version=current.get(row.id)))
+            else:
+                results[index] = _failure(
+                    row.id, 409, 'Booking overlaps an approved booking for this property')
+        changes = [change for change in changes if change[1].id in updated]
+        if not changes:
+            db.session.rollback()
+            return results, []
+    bump_version(connection, Booking.__tablename__)
+    delta = StatsDelta()
+    for _, row, status in changes:
+        values = {name: getattr(row, name) for name in BOOKING_FIELDS}
+        delta.add(values, sign=-1)
+        delta.add(dict(values, status=status))
+    delta.apply(connection)
+    db.session.commit()
+
+    for index, row, status in changes:
+        results[index] = _success(row.id, status, row.status, row.version + 1)
+    return results, [(row, status) for _, row, status in changes]
@@ -0,0 +1,254 @@
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from flask import current_app
+from search import SEARCH_COLUMNS, tokenize
+
+# Rough per-entry bookkeeping cost on top of the cached body, in bytes
+ENTRY_OVERHEAD = 512
+
+
+def _fold(value):
+    """Lowercase and strip diacritics, mirroring the FTS5 unicode61 tokenizer"""
+    decomposed = unicodedata.normalize('NFKD', value.lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def _tokens(value):
+    return [_fold(token) for token in tokenize(value)]
+
+
+def _prefix_match(query_tokens, tokens):
+    return all(any(token.startswith(term) for token in tokens) for term in query_tokens)
+
+
+def property_state(prop):
+    """Snapshot the fields of a property that listing filters look at"""
+    text_tokens = {name: _tokens(getattr(prop, name)) for name in SEARCH_COLUMNS}
+    return {
+        'id': prop.id,
+        'is_available': prop.is_available,
+        'property_type': prop.property_type,
+        'price_per_month': prop.price_per_month,
+        'bedrooms': prop.bedrooms,
+        'amenities': {amenity.name for amenity in prop.amenities},
+        'city_tokens': text_tokens['city'],
+        'text_tokens': [token for tokens in text_tokens.values() for token in tokens],
+    }
+
+
+def property_matches(filters, state):
+    """Whether a property in state would appear in a listing with filters"""
+    if state is None or state['is_available'] is False:
+        return False
+    if filters.get('property_type') and state['property_type'] != filters['property_type']:
+        return False
+    if filters.get('min_price') and state['price_per_month'] < filters['min_price']:
+        return False
+    if filters.get('max_price') and state['price_per_month'] > filters['max_price']:
+        return False
+    if filters.get('bedrooms') and state['bedrooms'] < filters['bedrooms']:
+        return False
+    if filters.get('amenities'):
+        wanted = set(filters['amenities'])
+        if filters.get('amenities_match') == 'any':
+            if not wanted & state['amenities']:
+                return False
+        elif not wanted <= state['amenities']:
+            return False
+    if filters.get('city') and not _prefix_match(_tokens(filters['city']), state['city_tokens']):
+        return False
+    if filters.get('q') and not _prefix_match(_tokens(filters['q']), state['text_tokens']):
+        return False
+    return True
+
+
+def _overlaps(window, start_date, end_date):
+    return window is not None and window[0] < end_date and start_date < window[1]
+
+
+class TTLCache:
+    """Small per-process TTL cache bounded to max_entries
+
+    When full, expired entries are purged first and everything if none had
+    expired. None results are not cached, so a missing row is looked up again.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, ttl, compute):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > now:
+                return entry[0]
+        value = compute()
+        if value is None:
+            return None
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries = {k: v for k, v in self._entries.items() if v[1] > now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+            self._entries[key] = (value, now + ttl)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class _Entry:
+    __slots__ = ('body', 'etag', 'size', 'expires', 'filters', 'property_ids')
+
+    def __init__(self, body, etag, expires, filters, property_ids):
+        self.body = body
+        self.etag = etag
+        self.size = len(body) + ENTRY_OVERHEAD
+        self.expires = expires
+        self.filters = filters
+        self.property_ids = frozenset(property_ids)
+
+
+class ListingCache:
+    """In-process LRU/TTL cache of serialized listing responses
+
+    Entries are keyed on the normalized query string and remember the filter
+    set and property ids they were built from, so a property write only drops
+    the entries it could have changed and every other entry keeps serving.
+    Each worker process holds its own cache; the TTL bounds how long it can
+    serve a listing that a write in another worker changed.
+    """
+
+    def __init__(self, app=None):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.ttl = 60
+        self.max_bytes = 16 * 1024 * 1024
+        self.max_entry_bytes = 512 * 1024
+        self.bytes = 0
+        self.reset_stats()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('LISTING_CACHE_ENABLED', True)
+        app.config.setdefault('LISTING_CACHE_STATS_ENABLED', False)
+        self.ttl = app.config.setdefault('LISTING_CACHE_TTL', self.ttl)
+        self.max_bytes = app.config.setdefault('LISTING_CACHE_MAX_BYTES', self.max_bytes)
+        self.max_entry_bytes = app.config.setdefault('LISTING_CACHE_MAX_ENTRY_BYTES',
+                                                     self.max_entry_bytes)
+        self.clear()
+
+    @property
+    def enabled(self):
+        return current_app.config['LISTING_CACHE_ENABLED']
+
+    def reset_stats(self):
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+    @staticmethod
+    def make_key(args):
+        """Normalize request args into a cache key, ignoring order and empty values"""
+        return tuple(sorted((key, value.strip()) for key, value in args.items(multi=True)
+                            if value.strip()))
+
+    def get(self, key):
+        """Return the (body, etag) cached under key, or None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires <= now:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.body, entry.etag
+
+    def set(self, key, body, etag, filters, property_ids):
+        entry = _Entry(body, etag, time.monotonic() + self.ttl, filters, property_ids)
+        if entry.size > self.max_entry_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self.bytes += entry.size
+            while self.bytes > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_property(self, property_id, before=None, after=None):
+        """Drop entries listing property_id or whose filters match its old or new state"""
+        with self._lock:
+            stale = [key for key, entry in self._entries.items()
+                     if property_id in entry.property_ids
+                     or property_matches(entry.filters, before)
+                     or property_matches(entry.filters, after)]
+            for key in stale:
+                self._remove(key)
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def invalidate_freed_dates(self, property_id, state, start_date, end_date):
+        """Drop entries a property could now join because [start_date, end_date) was freed"""
+        with self._lock:
+            stale = [key for key, entry in self._entries.items()
+                     if property_id in entry.property_ids
+                     or (_overlaps(entry.filters.get('available'), start_date, end_date)
+                         and property_matches(entry.filters, state))]
+            for key in stale:
+                self._remove(key)
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def invalidate_all(self):
+        """Drop every entry, e.g. after a bulk write touching arbitrary listings"""
+        with self._lock:
+            dropped = len(self._entries)
+            self._entries.clear()
+            self.bytes = 0
+            self.invalidations += dropped
+        return dropped
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.bytes -= entry.size
+
+
+listing_cache = ListingCache()
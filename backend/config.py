@@ -13,6 +13,76 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     JWT_ACCESS_TOKEN_EXPIRES = 86400  # 24 hours in seconds
     
+    # Per-process cache of users for authenticated requests; also how long
+    # other workers keep accepting a token revoked by a password change
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 30))  # seconds
+    USER_CACHE_MAX_ENTRIES = int(os.getenv('USER_CACHE_MAX_ENTRIES', 10000))
+    
+    # Read replica; GET requests read from it unless the client wrote within
+    # REPLICA_STICKY_SECONDS
+    REPLICA_DATABASE_URL = os.getenv('REPLICA_DATABASE_URL')
+    REPLICA_STICKY_SECONDS = float(os.getenv('REPLICA_STICKY_SECONDS', 5))
+    
+    # Per-request SQL instrumentation: Server-Timing header plus a log of slow
+    # requests (by time or statement count) and slow statements
+    SQL_INSTRUMENTATION_ENABLED = os.getenv('SQL_INSTRUMENTATION_ENABLED', 'false').lower() == 'true'
+    SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', 500))
+    SLOW_REQUEST_QUERIES = int(os.getenv('SLOW_REQUEST_QUERIES', 50))
+    SLOW_QUERY_MS = int(os.getenv('SLOW_QUERY_MS', 100))
+    SLOW_LOG_PATH = os.getenv('SLOW_LOG_PATH')  # log file; unset logs through the 'novella.slow' logger
+    SLOW_LOG_PARAMETERS = os.getenv('SLOW_LOG_PARAMETERS', 'false').lower() == 'true'  # may hold personal data
+    SLOW_LOG_MAX_SQL = int(os.getenv('SLOW_LOG_MAX_SQL', 2000))  # characters
+    
+    # Prometheus metrics at METRICS_PATH, added up across worker processes
+    # through per-process files in METRICS_DIR (default: instance/metrics)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'false').lower() == 'true'
+    METRICS_PATH = os.getenv('METRICS_PATH', '/metrics')
+    METRICS_DIR = os.getenv('METRICS_DIR')
+    METRICS_FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', 1))
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')  # if set, scrapes must send it as a Bearer token
+    
+    # PRAGMAs run on every new SQLite connection (ignored for other databases)
+    SQLITE_PRAGMAS = {
+        'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),  # milliseconds
+    }
+    
+    # Schema migrations: workers apply pending ones on startup under a lock
+    # unless this is off, in which case run "python migrate.py upgrade" first.
+    # A lock not refreshed for MIGRATION_LOCK_TIMEOUT is stale and taken over;
+    # a worker gives up after waiting MIGRATION_WAIT_TIMEOUT for it
+    MIGRATE_ON_STARTUP = os.getenv('MIGRATE_ON_STARTUP', 'true').lower() == 'true'
+    MIGRATION_LOCK_TIMEOUT = int(os.getenv('MIGRATION_LOCK_TIMEOUT', 300))  # seconds
+    MIGRATION_WAIT_TIMEOUT = int(os.getenv('MIGRATION_WAIT_TIMEOUT', 600))  # seconds
+    
+    # Password hashing (existing hashes are upgraded on login when the cost changes)
+    BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))
+    PASSWORD_POOL_WORKERS = int(os.getenv('PASSWORD_POOL_WORKERS', 4))
+    PASSWORD_POOL_MAX_PENDING = int(os.getenv('PASSWORD_POOL_MAX_PENDING', 32))
+    PASSWORD_POOL_TIMEOUT = int(os.getenv('PASSWORD_POOL_TIMEOUT', 10))  # seconds
+    
+    # Pagination
+    PAGE_SIZE_DEFAULT = int(os.getenv('PAGE_SIZE_DEFAULT', 20))
+    PAGE_SIZE_MAX = int(os.getenv('PAGE_SIZE_MAX', 100))
+    COUNT_CACHE_TTL = int(os.getenv('COUNT_CACHE_TTL', 30))  # seconds
+    
+    # Listing response cache (per worker process)
+    LISTING_CACHE_ENABLED = os.getenv('LISTING_CACHE_ENABLED', 'true').lower() == 'true'
+    LISTING_CACHE_TTL = int(os.getenv('LISTING_CACHE_TTL', 60))  # seconds
+    LISTING_CACHE_MAX_BYTES = int(os.getenv('LISTING_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+    LISTING_CACHE_MAX_ENTRY_BYTES = int(os.getenv('LISTING_CACHE_MAX_ENTRY_BYTES', 512 * 1024))
+    # GET /api/rentals/cache-stats; when METRICS_TOKEN is set it is required there too
+    LISTING_CACHE_STATS_ENABLED = os.getenv('LISTING_CACHE_STATS_ENABLED', 'false').lower() == 'true'
+    
+    # PUT /api/rentals/bookings/status
+    BULK_STATUS_MAX_ITEMS = int(os.getenv('BULK_STATUS_MAX_ITEMS', 200))
+    
+    # POST /api/batch
+    BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', 20))
+    
+    # Bulk property import
+    IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 500))
+    IMPORT_MAX_ERRORS = int(os.getenv('IMPORT_MAX_ERRORS', 100))  # row errors reported per upload
+    
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -24,6 +94,27 @@ class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
     TESTING = False
+    
+    # WAL lets readers run alongside the single writer instead of queueing
+    # behind it. synchronous=NORMAL is crash-safe in WAL mode; a power loss can
+    # only drop the last few commits.
+    SQLITE_PRAGMAS = {
+        'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'wal'),
+        'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),  # milliseconds
+        'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'normal'),
+        'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', -64000)),  # negative: KiB, so 64 MB
+        'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),  # bytes
+        'temp_store': 'memory',
+    }
+    
+    # Connection pool; each worker thread holds one connection per request
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 10)),  # seconds
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 3600)),  # seconds
+        'pool_pre_ping': True,
+    }
 
 
 class TestingConfig(Config):
@@ -31,6 +122,7 @@ class TestingConfig(Config):
     DEBUG = True
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///test_novella.db'
+    BCRYPT_LOG_ROUNDS = 4
 
 
 # Configuration dictionary
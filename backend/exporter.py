@@ -0,0 +1,119 @@
+import csv
+import io
+import json
+from sqlalchemy import select
+from sqlalchemy.orm import defaultload
+from models import db, Booking, Property
+from importer import CSV_LIST_SEPARATOR
+from queries import owner_bookings_query, renter_summary
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+# Rows fetched from the database cursor at a time
+EXPORT_YIELD_PER = 1000
+# Bytes buffered before a chunk is handed to the server
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+# Property CSV columns match the bulk import, so an export can be re-imported
+PROPERTY_COLUMNS = ('id', 'title', 'description', 'address', 'city', 'state', 'zip_code',
+                    'property_type', 'bedrooms', 'bathrooms', 'square_feet', 'price_per_month',
+                    'is_available', 'latitude', 'longitude', 'amenities', 'images', 'created_at')
+BOOKING_COLUMNS = ('id', 'property_id', 'property_title', 'renter_id', 'renter_name',
+                   'renter_email', 'start_date', 'end_date', 'total_price', 'status', 'message',
+                   'created_at')
+
+
+def export_format(requested):
+    """Validate ?format= for an export, defaulting to NDJSON"""
+    fmt = requested or 'ndjson'
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError('format must be "ndjson" or "csv"')
+    return fmt
+
+
+def owner_properties_export(owner_id):
+    """Statement for an owner's properties, oldest first"""
+    return (select(Property)
+            .where(Property.owner_id == owner_id)
+            .order_by(Property.created_at, Property.id))
+
+
+def owner_bookings_export(owner_id):
+    """Statement for the bookings on an owner's properties, grouped by property"""
+    return (owner_bookings_query(owner_id)
+            # Booking rows don't include amenities, so skip their per-batch load
+            .options(defaultload(Booking.property).lazyload(Property.amenities))
+            .order_by(Property.created_at, Property.id, Booking.start_date, Booking.id)
+            .statement)
+
+
+def property_record(prop):
+    return prop.to_dict()
+
+
+def booking_record(booking):
+    record = booking.to_dict()
+    renter = renter_summary(booking.renter) or {}
+    record['property_title'] = booking.property.title
+    record['renter_name'] = renter.get('name')
+    record['renter_email'] = renter.get('email')
+    return record
+
+
+def _csv_value(value):
+    if isinstance(value, list):
+        return CSV_LIST_SEPARATOR.join(str(item) for item in value)
+    return '' if value is None else value
+
+
+def _ndjson_lines(records):
+    for record in records:
+        yield json.dumps(record) + '\n'
+
+
+def _csv_lines(records, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for record in records:
+        writer.writerow([_csv_value(record.get(column)) for column in columns])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # The header alone still needs sending when there are no rows
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _chunked(lines):
+    # Send the first line straight away, then batch lines into larger chunks
+    chunk, size = [], 0
+    first = True
+    for line in lines:
+        if first:
+            yield line
+            first = False
+            continue
+        chunk.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_BYTES:
+            yield ''.join(chunk)
+            chunk, size = [], 0
+    if chunk:
+        yield ''.join(chunk)
+
+
+def stream_export(statement, to_record, fmt, columns):
+    """Generate an export body chunk by chunk, holding one cursor batch in memory"""
+    # A 2.0-style result rather than Query: Query de-duplicates rows, which
+    # needs them all in memory and can't be combined with yield_per
+    rows = db.session.scalars(statement.execution_options(yield_per=EXPORT_YIELD_PER))
+    records = (to_record(obj) for obj in rows)
+    if fmt == 'csv':
+        lines = _csv_lines(records, columns)
+    else:
+        lines = _ndjson_lines(records)
+    return _chunked(lines)
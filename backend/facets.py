@@ -0,0 +1,166 @@
+from collections import Counter
+from sqlalchemy import case, delete, event, func, insert, select, update
+from sqlalchemy.orm import Session
+from models import db, FacetCount, Property
+from versions import committed_values
+
+FACETS = ('city', 'property_type', 'bedrooms', 'price')
+# Lower bounds of the price buckets; the last bucket is open-ended
+PRICE_BUCKETS = (0, 500, 1000, 1500, 2000, 3000, 5000)
+# Most common values returned per facet
+FACET_VALUE_LIMIT = 50
+
+FACET_FIELDS = ('is_available', 'city', 'property_type', 'bedrooms', 'price_per_month')
+
+
+def _bucket_label(index):
+    lower = PRICE_BUCKETS[index]
+    if index + 1 < len(PRICE_BUCKETS):
+        return f'{lower}-{PRICE_BUCKETS[index + 1]}'
+    return f'{lower}+'
+
+
+PRICE_LABELS = tuple(_bucket_label(index) for index in range(len(PRICE_BUCKETS)))
+
+
+def price_bucket(price):
+    """Label of the price bucket holding price"""
+    for index in range(len(PRICE_BUCKETS) - 1, -1, -1):
+        if price >= PRICE_BUCKETS[index]:
+            return PRICE_LABELS[index]
+    return PRICE_LABELS[0]
+
+
+def price_bucket_expression():
+    """SQL expression for a property's price bucket label"""
+    return case(*((Property.price_per_month < PRICE_BUCKETS[index + 1], PRICE_LABELS[index])
+                  for index in range(len(PRICE_BUCKETS) - 1)),
+                else_=PRICE_LABELS[-1])
+
+
+def facet_keys(values):
+    """(facet, value) pairs a property with values counts towards, if listed at all"""
+    if not values.get('is_available', True) or values['price_per_month'] is None:
+        return []
+    return [('city', str(values['city'])),
+            ('property_type', str(values['property_type'])),
+            ('bedrooms', str(values['bedrooms'])),
+            ('price', price_bucket(float(values['price_per_month'])))]
+
+
+def _current_values(prop):
+    return {name: getattr(prop, name) for name in FACET_FIELDS}
+
+
+@event.listens_for(Session, 'before_flush')
+def track_facet_counts(session, flush_context, instances):
+    """Apply the facet count changes of the pending flush in the same transaction"""
+    deltas = Counter()
+    for obj in session.new:
+        if isinstance(obj, Property):
+            values = _current_values(obj)
+            # is_available is only defaulted to True on insert
+            if values['is_available'] is None:
+                values['is_available'] = True
+            deltas.update(facet_keys(values))
+    for obj in session.deleted:
+        if isinstance(obj, Property):
+            deltas.subtract(facet_keys(committed_values(session, obj, FACET_FIELDS)))
+    for obj in session.dirty:
+        if isinstance(obj, Property) and session.is_modified(obj):
+            deltas.subtract(facet_keys(committed_values(session, obj, FACET_FIELDS)))
+            deltas.update(facet_keys(_current_values(obj)))
+    if any(deltas.values()):
+        adjust_facet_counts(session.connection(), deltas)
+
+
+def adjust_facet_counts(connection, deltas):
+    """Add deltas, a Counter of (facet, value) -> change, to the stored counts"""
+    for (facet, value), delta in sorted(deltas.items()):
+        if not delta:
+            continue
+        match = (FacetCount.facet == facet, FacetCount.value == value)
+        result = connection.execute(update(FacetCount).where(*match)
+                                    .values(count=FacetCount.count + delta))
+        if result.rowcount == 0:
+            connection.execute(insert(FacetCount).values(facet=facet, value=value, count=delta))
+        elif delta < 0:
+            connection.execute(delete(FacetCount).where(*match, FacetCount.count <= 0))
+
+
+def _facet_columns():
+    return {
+        'city': Property.city,
+        'property_type': Property.property_type,
+        'bedrooms': Property.bedrooms,
+        'price': price_bucket_expression(),
+    }
+
+
+def _grouped_counts(query, column, limit=None):
+    grouped = (query.order_by(None)
+               .with_entities(column, func.count())
+               .group_by(column)
+               .order_by(func.count().desc(), column))
+    if limit:
+        grouped = grouped.limit(limit)
+    return [(str(value), count) for value, count in grouped]
+
+
+def rebuild_facet_counts():
+    """Recompute the stored facet counts from scratch"""
+    available = Property.query.filter_by(is_available=True)
+    rows = [{'facet': facet, 'value': value, 'count': count}
+            for facet, column in _facet_columns().items()
+            for value, count in _grouped_counts(available, column)]
+    db.session.execute(delete(FacetCount))
+    if rows:
+        db.session.execute(insert(FacetCount), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def ensure_facet_counts():
+    """Build the stored facet counts if they have never been built"""
+    if db.session.query(FacetCount.facet).first() is None:
+        rebuild_facet_counts()
+
+
+def _format(counts):
+    """Shape {facet: [(value, count)]} for the API"""
+    facets = {}
+    for facet in FACETS:
+        values = counts.get(facet, [])
+        if facet == 'bedrooms':
+            facets[facet] = sorted(({'value': int(value), 'count': count} for value, count in values),
+                                   key=lambda item: item['value'])
+        elif facet == 'price':
+            by_label = dict(values)
+            facets[facet] = [{'value': label, 'min': PRICE_BUCKETS[index],
+                              'max': PRICE_BUCKETS[index + 1] if index + 1 < len(PRICE_BUCKETS) else None,
+                              'count': by_label[label]}
+                             for index, label in enumerate(PRICE_LABELS) if label in by_label]
+        else:
+            ranked = sorted(values, key=lambda item: (-item[1], item[0]))[:FACET_VALUE_LIMIT]
+            facets[facet] = [{'value': value, 'count': count} for value, count in ranked]
+    # Every listed property falls in exactly one price bucket
+    total = sum(item['count'] for item in facets['price'])
+    return total, facets
+
+
+def stored_facets():
+    """Facet counts for the unfiltered listing, read from the summary table in one query"""
+    counts = {}
+    for facet, value, count in db.session.execute(
+            select(FacetCount.facet, FacetCount.value, FacetCount.count)):
+        counts.setdefault(facet, []).append((value, count))
+    return _format(counts)
+
+
+def query_facets(query):
+    """Facet counts for a filtered Property query, as grouped aggregates"""
+    counts = {}
+    for facet, column in _facet_columns().items():
+        limit = FACET_VALUE_LIMIT if facet in ('city', 'property_type') else None
+        counts[facet] = _grouped_counts(query, column, limit)
+    return _format(counts)
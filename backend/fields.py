@@ -0,0 +1,70 @@
+from sqlalchemy.orm import Load, defaultload
+from models import Booking, Property, PROPERTY_DICT_FIELDS, BOOKING_DICT_FIELDS
+
+# Everything Property.to_dict can return; 'image' is the first of 'images'
+PROPERTY_FIELDS = PROPERTY_DICT_FIELDS + ('image',)
+# What a listing card shows; the default for list endpoints
+PROPERTY_SUMMARY_FIELDS = ('id', 'title', 'property_type', 'city', 'state', 'bedrooms',
+                           'bathrooms', 'square_feet', 'price_per_month', 'is_available', 'image')
+
+BOOKING_FIELDS = BOOKING_DICT_FIELDS
+# Renter messages can be long, so lists leave them out unless asked for
+BOOKING_SUMMARY_FIELDS = ('id', 'property_id', 'renter_id', 'start_date', 'end_date',
+                          'total_price', 'status', 'created_at')
+
+# Fields that aren't a column of the same name, mapped to the column they read
+# (None for relationships loaded separately)
+FIELD_COLUMNS = {
+    'image': 'images',
+    'amenities': None,
+    'property': 'property_id',
+    'renter': 'renter_id',
+}
+
+FIELD_PRESETS = ('summary', 'all')
+
+
+class FieldsError(ValueError):
+    """Raised when a fields= query parameter names unknown fields"""
+
+
+def parse_fields(args, allowed, summary, key='fields', default=None):
+    """Read a comma-separated field list (or 'summary' / 'all') from args"""
+    value = (args.get(key) or '').strip()
+    if not value:
+        return default or summary
+    if value == 'summary':
+        return summary
+    if value == 'all':
+        return allowed
+    fields = tuple(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise FieldsError(f'Unknown {key}: {", ".join(unknown)}. '
+                          f'Choose from {", ".join(allowed + FIELD_PRESETS)}')
+    return fields
+
+
+def _columns(model, fields, extra_columns):
+    names = {FIELD_COLUMNS.get(field, field) for field in fields} - {None}
+    columns = [getattr(model, name) for name in sorted(names) if hasattr(model, name)]
+    return columns + [column for column in extra_columns if column is not None]
+
+
+def property_options(fields, extra_columns=(), via=None):
+    """Loader options fetching only the Property columns fields need
+
+    via is the relationship a Property is loaded through (e.g. Booking.property).
+    extra_columns are loaded too, for code that reads them besides to_dict
+    (sort keys, distances). Amenities are only loaded when asked for.
+    """
+    load = defaultload(via) if via is not None else Load(Property)
+    options = [load.load_only(*_columns(Property, fields, extra_columns))]
+    if 'amenities' not in fields:
+        options.append(load.lazyload(Property.amenities))
+    return options
+
+
+def booking_options(fields, extra_columns=()):
+    """Loader options fetching only the Booking columns fields need"""
+    return [Load(Booking).load_only(*_columns(Booking, fields, extra_columns))]
@@ -0,0 +1,180 @@
+import math
+from sqlalchemy import case, or_, select, union_all
+from models import Property
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9  # ~5m cells
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+# Upper bound on geohash cells used to cover a search area; more cells means a
+# tighter cover but more index range lookups
+MAX_COVER_CELLS = 32
+MAX_RADIUS_KM = 500
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Geohash of a point; nearby points share long prefixes"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits, bit_count = 0, 0
+    return ''.join(chars)
+
+
+def _cell_size(precision):
+    """(height, width) in degrees of a geohash cell at precision"""
+    total_bits = 5 * precision
+    lon_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def cover(min_lat, min_lon, max_lat, max_lon):
+    """The geohash prefixes of the finest cell grid covering a box in few cells"""
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = _cell_size(precision)
+        rows = math.floor((max_lat + 90) / height) - math.floor((min_lat + 90) / height) + 1
+        cols = math.floor((max_lon + 180) / width) - math.floor((min_lon + 180) / width) + 1
+        if rows * cols <= MAX_COVER_CELLS:
+            break
+    cells = set()
+    lat = min_lat
+    for row in range(rows):
+        lon = min_lon
+        for col in range(cols):
+            cells.add(encode(min(lat, max_lat), min(lon, max_lon), precision))
+            lon += width
+        lat += height
+    return sorted(cells)
+
+
+def _cells_subquery(prefixes):
+    # One index range per cell; '{' sorts right after 'z', the last geohash character
+    return union_all(*(select(Property.id).where(Property.geohash >= prefix,
+                                                 Property.geohash < prefix + '{')
+                       for prefix in prefixes))
+
+
+def filter_bbox(query, min_lat, min_lon, max_lat, max_lon):
+    """Restrict a Property query to a bounding box, through the geohash index"""
+    boxes = [(min_lon, max_lon)] if min_lon <= max_lon else [(min_lon, 180.0), (-180.0, max_lon)]
+    prefixes = []
+    for west, east in boxes:
+        prefixes.extend(cover(min_lat, west, max_lat, east))
+    in_lon = or_(*(Property.longitude.between(west, east) for west, east in boxes))
+    # Joined rather than IN (...): as a filter SQLite would test it against every
+    # row of ix_properties_available_*, as a join it drives the lookup
+    cells = _cells_subquery(prefixes).subquery()
+    return query.join(cells, cells.c.id == Property.id).filter(
+        Property.latitude.between(min_lat, max_lat), in_lon)
+
+
+def radius_bbox(latitude, longitude, radius_km):
+    """Bounding box (min_lat, min_lon, max_lat, max_lon) enclosing a radius
+
+    Longitudes wrap like a bbox crossing the antimeridian (min_lon > max_lon);
+    a radius reaching a pole spans every longitude.
+    """
+    dlat = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = latitude - dlat, latitude + dlat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), -180.0, min(max_lat, 90.0), 180.0
+    dlon = radius_km / (KM_PER_DEGREE * math.cos(math.radians(latitude)))
+    if dlon >= 180:
+        return min_lat, -180.0, max_lat, 180.0
+    min_lon, max_lon = longitude - dlon, longitude + dlon
+    if min_lon < -180:
+        min_lon += 360
+    if max_lon > 180:
+        max_lon -= 360
+    return min_lat, min_lon, max_lat, max_lon
+
+
+def distance_expression(latitude, longitude):
+    """SQL expression for squared equirectangular distance in degrees, for sorting
+
+    Plain arithmetic, so it works on databases without trig functions. The
+    longitude difference wraps, so points across the antimeridian are near.
+    """
+    scale = math.cos(math.radians(latitude))
+    dlon = Property.longitude - longitude
+    dlon = case((dlon > 180, dlon - 360), (dlon < -180, dlon + 360), else_=dlon)
+    dx = dlon * scale
+    dy = Property.latitude - latitude
+    return dx * dx + dy * dy
+
+
+def filter_radius(query, latitude, longitude, radius_km):
+    """Restrict a Property query to a radius; returns (query, distance sort expression)"""
+    query = filter_bbox(query, *radius_bbox(latitude, longitude, radius_km))
+    distance = distance_expression(latitude, longitude)
+    return query.filter(distance <= (radius_km / KM_PER_DEGREE) ** 2), distance
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def parse_point(value, name):
+    """Parse 'lat,lon' into a validated (latitude, longitude) pair"""
+    try:
+        latitude, longitude = (float(part) for part in value.split(','))
+    except ValueError:
+        raise ValueError(f'{name} must be "latitude,longitude"')
+    return validate_point(latitude, longitude)
+
+
+def parse_bbox(value):
+    """Parse 'min_lon,min_lat,max_lon,max_lat' into (min_lat, min_lon, max_lat, max_lon)"""
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(part) for part in value.split(','))
+    except ValueError:
+        raise ValueError('bbox must be "min_lon,min_lat,max_lon,max_lat"')
+    validate_point(min_lat, min_lon)
+    validate_point(max_lat, max_lon)
+    if min_lat > max_lat:
+        raise ValueError('bbox min_lat must not exceed max_lat')
+    return min_lat, min_lon, max_lat, max_lon
+
+
+def validate_point(latitude, longitude):
+    if not -90 <= latitude <= 90:
+        raise ValueError('latitude must be between -90 and 90')
+    if not -180 <= longitude <= 180:
+        raise ValueError('longitude must be between -180 and 180')
+    return latitude, longitude
+
+
+def location_from(data):
+    """Read an optional latitude/longitude pair from a request payload
+
+    Returns (latitude, longitude), (None, None) to clear, or raises ValueError.
+    """
+    latitude, longitude = data.get('latitude'), data.get('longitude')
+    if latitude is None and longitude is None:
+        return None, None
+    if latitude is None or longitude is None:
+        raise ValueError('latitude and longitude must be given together')
+    try:
+        latitude, longitude = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        raise ValueError('latitude and longitude must be numbers')
+    return validate_point(latitude, longitude)
@@ -0,0 +1,217 @@
+import csv
+import io
+import json
+from collections import Counter
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from models import db, Property, property_amenities
+from amenities import normalize_names, amenity_ids
+from geo import encode, location_from
+from versions import bump_version
+from facets import facet_keys, adjust_facet_counts
+
+REQUIRED_FIELDS = ('title', 'description', 'address', 'city', 'state',
+                   'zip_code', 'property_type', 'bedrooms', 'bathrooms', 'price_per_month')
+TEXT_FIELDS = ('title', 'description', 'address', 'city', 'state', 'zip_code', 'property_type')
+INTEGER_FIELDS = ('bedrooms', 'square_feet')
+FLOAT_FIELDS = ('bathrooms', 'price_per_month')
+
+# Separator for list values (amenities, images) inside a CSV cell
+CSV_LIST_SEPARATOR = '|'
+
+IMPORT_FORMATS = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+}
+
+
+def _number(data, field, kind):
+    value = data.get(field)
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f'{field} must be a number')
+    try:
+        number = kind(value)
+    except (TypeError, ValueError):
+        # Accept whole-number floats such as "2.0" for integer fields
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'{field} must be a number')
+        if kind is int and not number.is_integer():
+            raise ValueError(f'{field} must be a whole number')
+        number = kind(number)
+    if number < 0:
+        raise ValueError(f'{field} must not be negative')
+    return number
+
+
+def property_values(data):
+    """Validate a property payload, returning (column values, amenity names)
+
+    Shared by create_property and the bulk import so both accept the same rows.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('property must be an object')
+    for field in REQUIRED_FIELDS:
+        if data.get(field) is None:
+            raise ValueError(f'{field} is required')
+    values = {field: str(data[field]) for field in TEXT_FIELDS}
+    for field in INTEGER_FIELDS:
+        values[field] = _number(data, field, int)
+    for field in FLOAT_FIELDS:
+        values[field] = _number(data, field, float)
+
+    images = data.get('images') or []
+    if not isinstance(images, list) or not all(isinstance(image, str) for image in images):
+        raise ValueError('images must be a list of strings')
+    values['images'] = json.dumps(images)
+
+    latitude, longitude = location_from(data)
+    values['latitude'] = latitude
+    values['longitude'] = longitude
+    values['geohash'] = encode(latitude, longitude) if latitude is not None else None
+
+    return values, normalize_names(data.get('amenities') or [])
+
+
+def import_format(mimetype, requested=None):
+    """The import format for a request, from ?format= or its Content-Type"""
+    fmt = requested or IMPORT_FORMATS.get(mimetype)
+    if fmt not in ('csv', 'ndjson'):
+        raise ValueError('Upload CSV (text/csv) or NDJSON (application/x-ndjson)')
+    return fmt
+
+
+def _text_stream(stream):
+    if not isinstance(stream, io.BufferedIOBase):
+        stream = io.BufferedReader(stream)
+    # utf-8-sig drops the byte order mark spreadsheet exports often start with
+    return io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+
+def _csv_record(row):
+    record = {key.strip(): value.strip() for key, value in row.items()
+              if key and value is not None and value.strip()}
+    for field in ('amenities', 'images'):
+        if field in record:
+            record[field] = [part.strip() for part in record[field].split(CSV_LIST_SEPARATOR)
+                             if part.strip()]
+    return record
+
+
+def read_records(stream, fmt):
+    """Parse an upload incrementally, yielding (line, record, error) one row at a time"""
+    text = _text_stream(stream)
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        try:
+            for row in reader:
+                if None in row:
+                    yield reader.line_num, None, 'Row has more columns than the header'
+                else:
+                    yield reader.line_num, _csv_record(row), None
+        except (csv.Error, UnicodeDecodeError) as e:
+            yield reader.line_num, None, f'Unreadable CSV: {e}'
+        return
+
+    line_number = 0
+    try:
+        for line_number, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line), None
+            except ValueError as e:
+                yield line_number, None, f'Invalid JSON: {e}'
+    except UnicodeDecodeError as e:
+        yield line_number + 1, None, f'Unreadable upload: {e}'
+
+
+class ImportResult:
+    """Running totals for a bulk import; keeps at most max_errors error details"""
+
+    def __init__(self, max_errors):
+        self.max_errors = max_errors
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def fail(self, line, error):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'error': error})
+
+    def to_dict(self):
+        return {
+            'imported': self.imported,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+        }
+
+
+def _insert_rows(owner_id, rows):
+    """Insert validated rows and their amenity links with one statement per table"""
+    ids = amenity_ids(name for _, _, names in rows for name in names)
+    property_ids = db.session.scalars(
+        insert(Property).returning(Property.id, sort_by_parameter_order=True),
+        [dict(values, owner_id=owner_id) for _, values, _ in rows]
+    ).all()
+    links = [{'property_id': property_id, 'amenity_id': ids[name]}
+             for property_id, (_, _, names) in zip(property_ids, rows) for name in names]
+    if links:
+        db.session.execute(insert(property_amenities), links)
+    # Core inserts skip the before_flush hooks, so bump the listing version
+    # and facet counts here
+    bump_version(db.session.connection(), Property.__tablename__)
+    adjust_facet_counts(db.session.connection(),
+                        Counter(key for _, values, _ in rows for key in facet_keys(values)))
+
+
+def _flush_batch(owner_id, rows, result):
+    try:
+        _insert_rows(owner_id, rows)
+        db.session.commit()
+        result.imported += len(rows)
+        return
+    except SQLAlchemyError:
+        db.session.rollback()
+    # Retry row by row so one bad row doesn't sink the rest of the batch
+    for row in rows:
+        try:
+            _insert_rows(owner_id, [row])
+            db.session.commit()
+            result.imported += 1
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            result.fail(row[0], f'Database error: {getattr(e, "orig", e)}')
+
+
+def import_properties(owner_id, records, batch_size, max_errors):
+    """Validate and insert streamed records in batches of batch_size
+
+    Each batch is committed on its own, so memory stays bounded by the batch
+    size however long the upload is, and invalid rows are reported without
+    rejecting the rows around them.
+    """
+    result = ImportResult(max_errors)
+    batch = []
+    for line, record, error in records:
+        if error is None:
+            try:
+                values, names = property_values(record)
+                batch.append((line, values, names))
+            except ValueError as e:
+                error = str(e)
+        if error is not None:
+            result.fail(line, error)
+        if len(batch) >= batch_size:
+            _flush_batch(owner_id, batch, result)
+            batch = []
+    if batch:
+        _flush_batch(owner_id, batch, result)
+    return result
@@ -0,0 +1,158 @@
+import json
+import logging
+import time
+from collections import Counter
+from flask import current_app, g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from models import db
+
+# Slow request and slow query records, one JSON object per line
+slow_log = logging.getLogger('novella.slow')
+
+# Repeated statements listed in a slow request record
+SLOW_LOG_TOP_STATEMENTS = 5
+
+
+class RequestTimings:
+    """SQL statement count and time spent in the database and in JSON encoding for one request"""
+
+    __slots__ = ('started', 'queries', 'db_seconds', 'serialize_seconds', 'statements')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.statements = Counter()
+
+
+def _current_timings():
+    return g.get('request_timings') if has_request_context() else None
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """JSON provider that adds encoding time to the current request's timings"""
+
+    def dumps(self, obj, **kwargs):
+        timings = _current_timings()
+        if timings is None:
+            return super().dumps(obj, **kwargs)
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            timings.serialize_seconds += time.perf_counter() - started
+
+
+def _sql(statement):
+    return ' '.join(statement.split())[:current_app.config['SLOW_LOG_MAX_SQL']]
+
+
+def _log(record):
+    slow_log.warning(json.dumps(record, default=str))
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_timings() is not None:
+        conn.info['query_started'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = _current_timings()
+    started = conn.info.pop('query_started', None)
+    if timings is None or started is None:
+        return
+    elapsed = time.perf_counter() - started
+    timings.queries += 1
+    timings.db_seconds += elapsed
+    timings.statements[statement] += 1
+
+    config = current_app.config
+    if elapsed * 1000 >= config['SLOW_QUERY_MS']:
+        record = {
+            'event': 'slow_query',
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'duration_ms': round(elapsed * 1000, 2),
+            'sql': _sql(statement),
+        }
+        if config['SLOW_LOG_PARAMETERS']:
+            record['parameters'] = repr(parameters)[:config['SLOW_LOG_MAX_SQL']]
+        _log(record)
+
+
+class SQLInstrumentation:
+    """Per-request SQL statement counts and timings, reported as Server-Timing
+
+    Requests slower than SLOW_REQUEST_MS or issuing at least
+    SLOW_REQUEST_QUERIES statements are logged with their most repeated SQL,
+    which is how N+1 loops show up; single statements slower than
+    SLOW_QUERY_MS are logged on their own. When SQL_INSTRUMENTATION_ENABLED is
+    off nothing is registered, so there is no per-request or per-query cost.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Register the hooks; call after db.init_app so the engines exist"""
+        app.config.setdefault('SQL_INSTRUMENTATION_ENABLED', False)
+        app.config.setdefault('SLOW_REQUEST_MS', 500)
+        app.config.setdefault('SLOW_REQUEST_QUERIES', 50)
+        app.config.setdefault('SLOW_QUERY_MS', 100)
+        app.config.setdefault('SLOW_LOG_MAX_SQL', 2000)
+        app.config.setdefault('SLOW_LOG_PARAMETERS', False)
+        if not app.config['SQL_INSTRUMENTATION_ENABLED']:
+            return
+
+        if app.config.get('SLOW_LOG_PATH') and not slow_log.handlers:
+            handler = logging.FileHandler(app.config['SLOW_LOG_PATH'])
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            slow_log.addHandler(handler)
+
+        app.json = TimedJSONProvider(app)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+        with app.app_context():
+            for engine in db.engines.values():
+                if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+                    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+                    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+    def _start_request(self):
+        g.request_timings = RequestTimings()
+
+    def _finish_request(self, response):
+        timings = g.pop('request_timings', None)
+        if timings is None:
+            return response
+        total_ms = (time.perf_counter() - timings.started) * 1000
+        db_ms = timings.db_seconds * 1000
+        serialize_ms = timings.serialize_seconds * 1000
+        response.headers.add('Server-Timing',
+                             f'db;dur={db_ms:.2f};desc="{timings.queries} queries", '
+                             f'serialize;dur={serialize_ms:.2f}, total;dur={total_ms:.2f}')
+
+        config = current_app.config
+        if total_ms >= config['SLOW_REQUEST_MS'] or timings.queries >= config['SLOW_REQUEST_QUERIES']:
+            _log({
+                'event': 'slow_request',
+                'method': request.method,
+                'path': request.full_path.rstrip('?'),
+                'endpoint': request.endpoint,
+                'status': response.status_code,
+                'total_ms': round(total_ms, 2),
+                'db_ms': round(db_ms, 2),
+                'serialize_ms': round(serialize_ms, 2),
+                'queries': timings.queries,
+                'top_statements': [{'count': count, 'sql': _sql(statement)} for statement, count
+                                   in timings.statements.most_common(SLOW_LOG_TOP_STATEMENTS)],
+            })
+        return response
+
+
+sql_instrumentation = SQLInstrumentation()
@@ -0,0 +1,357 @@
+import glob
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from flask import Response, current_app, g, request, jsonify
+from sqlalchemy import event
+from models import db
+
+# Seconds; request and bcrypt latencies fall in these buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Every exported metric: name -> (type, help)
+METRICS = {
+    'novella_http_requests_total': (
+        'counter', 'HTTP requests by endpoint, method and status code'),
+    'novella_http_request_duration_seconds': (
+        'histogram', 'Time to produce an HTTP response, by endpoint and method'),
+    'novella_http_requests_in_flight': (
+        'gauge', 'HTTP requests being handled, by endpoint'),
+    'novella_db_pool_checkouts_total': (
+        'counter', 'Connections checked out of the database pool'),
+    'novella_db_pool_connects_total': (
+        'counter', 'New database connections opened by the pool'),
+    'novella_db_pool_checked_out': (
+        'gauge', 'Database connections currently checked out'),
+    'novella_db_pool_idle': (
+        'gauge', 'Database connections idle in the pool'),
+    'novella_db_pool_overflow': (
+        'gauge', 'Connections open beyond the pool size (negative while the pool is filling)'),
+    'novella_password_hash_seconds': (
+        'histogram', 'Time for a bcrypt hash or verify, including the wait for a pool worker'),
+    'novella_password_pool_rejections_total': (
+        'counter', 'Password operations turned away because the bcrypt pool was full'),
+}
+
+# Gauges of dead worker processes are dropped; counters and histograms are kept
+ARCHIVE_FILE = 'archive.json'
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ProcessMetrics:
+    """This process's metric values, flushed to its own file in the collector directory"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def add(self, name, value, **labels):
+        key = (name, _key(labels))
+        with self.lock:
+            self.gauges[key] = self.gauges.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.gauges[(name, _key(labels))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, _key(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                # Per-bucket counts (the last is +Inf), then the sum
+                histogram = self.histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            histogram[bisect_left(self.buckets, value)] += 1
+            histogram[-1] += value
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'buckets': list(self.buckets),
+                'counters': [[name, list(labels), value]
+                             for (name, labels), value in self.counters.items()],
+                'gauges': [[name, list(labels), value]
+                           for (name, labels), value in self.gauges.items()],
+                'histograms': [[name, list(labels), list(values)]
+                               for (name, labels), values in self.histograms.items()],
+            }
+
+
+def _merge(totals, snapshot, include_gauges):
+    for name, labels, value in snapshot['counters']:
+        key = (name, tuple(map(tuple, labels)))
+        totals['counters'][key] = totals['counters'].get(key, 0) + value
+    if include_gauges:
+        for name, labels, value in snapshot['gauges']:
+            key = (name, tuple(map(tuple, labels)))
+            totals['gauges'][key] = totals['gauges'].get(key, 0) + value
+    for name, labels, values in snapshot['histograms']:
+        key = (name, tuple(map(tuple, labels)))
+        if snapshot['buckets'] != totals['buckets'] and totals['buckets'] is not None:
+            continue  # written with other buckets; can't be added up
+        totals['buckets'] = snapshot['buckets']
+        existing = totals['histograms'].get(key)
+        totals['histograms'][key] = ([a + b for a, b in zip(existing, values)]
+                                     if existing else list(values))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def operator_authorized():
+    """Whether the request may read operator endpoints: METRICS_TOKEN as a Bearer token, if set"""
+    token = current_app.config['METRICS_TOKEN']
+    return not token or request.headers.get('Authorization') == f'Bearer {token}'
+
+
+def render(totals):
+    """Prometheus text exposition format for merged totals"""
+    lines = []
+    series = {'counter': totals['counters'], 'gauge': totals['gauges'],
+              'histogram': totals['histograms']}
+    for name, (kind, help_text) in METRICS.items():
+        rows = sorted((labels, value) for (metric, labels), value in series[kind].items()
+                      if metric == name)
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in rows:
+            if kind != 'histogram':
+                lines.append(f'{name}{_labels(labels)} {_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(list(totals['buckets']) + [math.inf], value[:-1]):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(labels, [("le", _number(bound))])} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {_number(value[-1])}')
+            lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsCollector:
+    """Opt-in Prometheus /metrics endpoint that adds up every worker process
+
+    Each process keeps its metrics in memory and writes them to its own file
+    in METRICS_DIR at most every METRICS_FLUSH_SECONDS; /metrics adds up the
+    files of all processes. Counters and histograms of exited processes are
+    folded into an archive file so totals never go backwards; their gauges are
+    dropped. Clear METRICS_DIR on deploy to start from zero.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.values = ProcessMetrics()
+        self.directory = None
+        self.flush_seconds = 1.0
+        self._flushed = 0.0
+        self._flush_lock = threading.Lock()
+        self._engines = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Register the hooks and the endpoint; call after db.init_app so the engines exist"""
+        app.config.setdefault('METRICS_ENABLED', False)
+        app.config.setdefault('METRICS_PATH', '/metrics')
+        app.config.setdefault('METRICS_DIR', None)
+        app.config.setdefault('METRICS_FLUSH_SECONDS', 1.0)
+        app.config.setdefault('METRICS_TOKEN', None)
+        self.enabled = app.config['METRICS_ENABLED']
+        if not self.enabled:
+            return
+
+        self.values = ProcessMetrics()
+        self.directory = app.config['METRICS_DIR'] or os.path.join(app.instance_path, 'metrics')
+        os.makedirs(self.directory, exist_ok=True)
+        self.flush_seconds = app.config['METRICS_FLUSH_SECONDS']
+
+        app.before_request(self._start_request)
+        app.after_request(self._record_response)
+        app.teardown_request(self._finish_request)
+        app.add_url_rule(app.config['METRICS_PATH'], 'metrics', self.metrics_view)
+
+        with app.app_context():
+            self._engines = {bind or 'default': engine for bind, engine in db.engines.items()}
+        for bind, engine in self._engines.items():
+            event.listen(engine, 'checkout', lambda *args, bind=bind: self.values.inc(
+                'novella_db_pool_checkouts_total', bind=bind))
+            event.listen(engine, 'connect', lambda *args, bind=bind: self.values.inc(
+                'novella_db_pool_connects_total', bind=bind))
+
+    # Recording
+
+    def observe_password(self, operation, seconds):
+        if self.enabled:
+            self.values.observe('novella_password_hash_seconds', seconds, operation=operation)
+
+    def count_password_rejection(self, operation):
+        if self.enabled:
+            self.values.inc('novella_password_pool_rejections_total', operation=operation)
+
+    def _start_request(self):
+        if request.endpoint == 'metrics':
+            return
+        g.metrics_started = time.perf_counter()
+        g.metrics_endpoint = request.endpoint or 'unmatched'
+        self.values.add('novella_http_requests_in_flight', 1, endpoint=g.metrics_endpoint)
+
+    def _record_response(self, response):
+        started = g.get('metrics_started')
+        if started is not None:
+            endpoint = g.metrics_endpoint
+            self.values.observe('novella_http_request_duration_seconds',
+                                time.perf_counter() - started, endpoint=endpoint,
+                                method=request.method)
+            self.values.inc('novella_http_requests_total', endpoint=endpoint,
+                            method=request.method, status=str(response.status_code))
+        return response
+
+    def _finish_request(self, exc):
+        endpoint = g.pop('metrics_endpoint', None)
+        if endpoint is not None:
+            self.values.add('novella_http_requests_in_flight', -1, endpoint=endpoint)
+        if time.monotonic() - self._flushed >= self.flush_seconds:
+            self.flush()
+
+    # Collecting
+
+    def _sample_pools(self):
+        for bind, engine in self._engines.items():
+            pool = engine.pool
+            for name, method in (('novella_db_pool_checked_out', 'checkedout'),
+                                 ('novella_db_pool_idle', 'checkedin'),
+                                 ('novella_db_pool_overflow', 'overflow')):
+                if hasattr(pool, method):
+                    self.values.set(name, getattr(pool, method)(), bind=bind)
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f'process-{pid}.json')
+
+    def flush(self):
+        """Write this process's values to its file, replacing it atomically"""
+        if not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            self._sample_pools()
+            path = self._path(os.getpid())
+            temporary = f'{path}.{threading.get_ident()}.tmp'
+            with open(temporary, 'w') as f:
+                json.dump(dict(self.values.snapshot(), pid=os.getpid()), f)
+            os.replace(temporary, path)
+            self._flushed = time.monotonic()
+        finally:
+            self._flush_lock.release()
+
+    def collect(self):
+        """Add up the values of every process that has written to the directory"""
+        self.flush()
+        totals = {'buckets': None, 'counters': {}, 'gauges': {}, 'histograms': {}}
+        archive_path = os.path.join(self.directory, ARCHIVE_FILE)
+        dead = []
+        for path in glob.glob(os.path.join(self.directory, 'process-*.json')):
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue  # removed by another collector, or mid-replace
+            alive = _pid_alive(snapshot['pid'])
+            _merge(totals, snapshot, include_gauges=alive)
+            if not alive:
+                dead.append((path, snapshot))
+        try:
+            with open(archive_path) as f:
+                _merge(totals, json.load(f), include_gauges=False)
+        except (OSError, ValueError):
+            pass
+        if dead:
+            self._archive(archive_path, dead)
+        return totals
+
+    def _archive(self, archive_path, dead):
+        """Fold exited processes into the archive so their files can go"""
+        lock_path = os.path.join(self.directory, 'archive.lock')
+        try:
+            # A lock left behind by a process that died while archiving
+            if time.time() - os.path.getmtime(lock_path) > 60:
+                os.remove(lock_path)
+        except OSError:
+            pass
+        try:
+            lock = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return  # another process is archiving; try again next time
+        try:
+            totals = {'buckets': None, 'counters': {}, 'gauges': {}, 'histograms': {}}
+            try:
+                with open(archive_path) as f:
+                    _merge(totals, json.load(f), include_gauges=False)
+            except (OSError, ValueError):
+                pass
+            for path, snapshot in dead:
+                if os.path.exists(path):
+                    _merge(totals, snapshot, include_gauges=False)
+            archive = {
+                'buckets': totals['buckets'] or list(self.values.buckets),
+                'counters': [[name, list(labels), value]
+                             for (name, labels), value in totals['counters'].items()],
+                'gauges': [],
+                'histograms': [[name, list(labels), values]
+                               for (name, labels), values in totals['histograms'].items()],
+            }
+            temporary = f'{archive_path}.{os.getpid()}.tmp'
+            with open(temporary, 'w') as f:
+                json.dump(archive, f)
+            os.replace(temporary, archive_path)
+            for path, _ in dead:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        finally:
+            os.close(lock)
+            os.remove(lock_path)
+
+    def metrics_view(self):
+        if not operator_authorized():
+            return jsonify({'error': 'Unauthorized'}), 401
+        return Response(render(self.collect()), mimetype='text/plain; version=0.0.4')
+
+
+metrics = MetricsCollector()
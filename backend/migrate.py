@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Schema migration command for the Novella API
+Applies pending migrations without starting the API, e.g. as a deploy step
+before the workers restart with MIGRATE_ON_STARTUP=false.
+
+Run with: python migrate.py [status|upgrade] [--config production] [--to VERSION]
+"""
+
+import argparse
+import logging
+import sys
+from flask import Flask
+from config import config
+from models import db
+from sqlite_pragmas import install_sqlite_pragmas
+from migrations import MIGRATIONS, LATEST_VERSION, current_version, migrate
+
+
+def offline_app(config_name):
+    """An app with only the database configured: no blueprints, no startup migration"""
+    app = Flask(__name__)
+    app.config.from_object(config[config_name])
+    db.init_app(app)
+    with app.app_context():
+        install_sqlite_pragmas(db.engine, app.config['SQLITE_PRAGMAS'])
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('command', nargs='?', choices=('status', 'upgrade'), default='status')
+    parser.add_argument('--config', default='default', choices=sorted(config))
+    parser.add_argument('--to', type=int, default=LATEST_VERSION, help='stop after this migration')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    with offline_app(args.config).app_context():
+        version = current_version()
+        if args.command == 'status':
+            for number, description, _ in MIGRATIONS:
+                print(f"{'applied' if number <= version else 'pending'}  {number:3d}  {description}")
+            print(f"Database at version {version}, latest is {LATEST_VERSION}")
+            return 0
+        settings = config[args.config]
+        applied = migrate(target=args.to, wait_timeout=settings.MIGRATION_WAIT_TIMEOUT,
+                          stale_after=settings.MIGRATION_LOCK_TIMEOUT)
+        print(f"Applied {len(applied)} migration(s); database at version {current_version()}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,178 @@
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import inspect, select, update
+from sqlalchemy.exc import IntegrityError, OperationalError, ProgrammingError
+from models import db, SchemaVersion
+from schema import create_baseline_schema
+from search import ensure_search_index
+from amenities import migrate_legacy_amenities
+from versions import ensure_version_rows
+from facets import ensure_facet_counts
+from analytics import ensure_owner_analytics
+
+logger = logging.getLogger('novella.migrations')
+
+
+def _add_column(table, name, ddl):
+    """ALTER TABLE table ADD COLUMN name ddl, unless the table already has it
+
+    Databases whose tables were created from the models, e.g. by db.create_all()
+    or by migration 1 before its DDL was frozen, can have the column already.
+    """
+    if name in {column['name'] for column in inspect(db.engine).get_columns(table)}:
+        return
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql(f'ALTER TABLE {table} ADD COLUMN {name} {ddl}')
+
+
+def add_row_versions():
+    for table in ('properties', 'bookings'):
+        _add_column(table, 'version', 'INTEGER NOT NULL DEFAULT 1')
+
+
+def add_token_versions():
+    _add_column('users', 'token_version', 'INTEGER NOT NULL DEFAULT 0')
+
+
+def index_bookings_by_end_date():
+    """Availability checks seek approved bookings by end date instead of start date"""
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql('CREATE INDEX IF NOT EXISTS ix_bookings_property_status_end '
+                             'ON bookings (property_id, status, end_date, start_date)')
+        conn.exec_driver_sql('DROP INDEX IF EXISTS ix_bookings_property_status_dates')
+
+
+# Applied in order; each runs once per database. Append new steps, never
+# renumber or edit applied ones. Migration 1-6 are the checks every worker used
+# to run on startup, so they are safe on databases created before versioning.
+MIGRATIONS = (
+    (1, 'Create the baseline tables, columns and indexes', create_baseline_schema),
+    (2, 'Full-text search index', ensure_search_index),
+    (3, 'Move legacy amenities into property_amenities', migrate_legacy_amenities),
+    (4, 'Table version rows', ensure_version_rows),
+    (5, 'Stored facet counts', ensure_facet_counts),
+    (6, 'Owner booking analytics', ensure_owner_analytics),
+    (7, 'Row versions on properties and bookings', add_row_versions),
+    (8, 'Token versions on users', add_token_versions),
+    (9, 'Index approved bookings by end date for availability checks', index_bookings_by_end_date),
+)
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# How often a worker waiting on another's migration checks back
+LOCK_POLL_SECONDS = 0.5
+
+
+class MigrationPending(RuntimeError):
+    """The database is behind the code and migrating on startup is turned off"""
+
+
+def current_version():
+    """Last applied migration, 0 for a database that has never been migrated"""
+    try:
+        return db.session.scalar(select(SchemaVersion.version).where(SchemaVersion.id == 1)) or 0
+    except (OperationalError, ProgrammingError):
+        # No schema_version table yet
+        db.session.rollback()
+        return 0
+
+
+def pending_migrations(version=None):
+    """Migrations newer than version (default: the database's)"""
+    if version is None:
+        version = current_version()
+    return [migration for migration in MIGRATIONS if migration[0] > version]
+
+
+def _lock_owner():
+    return f'{socket.gethostname()}:{os.getpid()}'[:100]
+
+
+def _acquire_lock(owner, stale_after):
+    """Take the migration lock, or return False if another process holds it
+
+    The conditional UPDATE is atomic in every database, so exactly one worker
+    wins; a lock older than stale_after seconds is taken over.
+    """
+    try:
+        SchemaVersion.__table__.create(db.engine, checkfirst=True)
+    except (OperationalError, ProgrammingError):
+        # Another worker created it between the check and the CREATE
+        pass
+    try:
+        db.session.add(SchemaVersion(id=1, version=0))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+    now = datetime.utcnow()
+    result = db.session.execute(
+        update(SchemaVersion)
+        .where(SchemaVersion.id == 1,
+               (SchemaVersion.locked_at.is_(None))
+               | (SchemaVersion.locked_at < now - timedelta(seconds=stale_after)))
+        .values(locked_by=owner, locked_at=now))
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def _record(version, owner):
+    db.session.execute(
+        update(SchemaVersion).where(SchemaVersion.id == 1, SchemaVersion.locked_by == owner)
+        .values(version=version, locked_at=datetime.utcnow(), updated_at=datetime.utcnow()))
+    db.session.commit()
+
+
+def _release_lock(owner):
+    db.session.rollback()
+    db.session.execute(
+        update(SchemaVersion).where(SchemaVersion.id == 1, SchemaVersion.locked_by == owner)
+        .values(locked_by=None, locked_at=None))
+    db.session.commit()
+
+
+def migrate(target=LATEST_VERSION, wait_timeout=600, stale_after=300):
+    """Apply pending migrations up to target under the migration lock
+
+    Workers that lose the race wait up to wait_timeout seconds for the winner
+    and then re-check, so a migration never runs twice. A lock not refreshed
+    for stale_after seconds belongs to a dead worker and is taken over; how
+    long this call is willing to wait has no bearing on that. Returns the
+    migrations this call applied.
+    """
+    owner = _lock_owner()
+    deadline = time.monotonic() + wait_timeout
+    while not _acquire_lock(owner, stale_after):
+        if current_version() >= target:
+            return []
+        if time.monotonic() > deadline:
+            raise RuntimeError('Timed out waiting for the schema migration lock')
+        time.sleep(LOCK_POLL_SECONDS)
+
+    applied = []
+    try:
+        for version, description, step in pending_migrations():
+            if version > target:
+                break
+            started = time.perf_counter()
+            step()
+            _record(version, owner)
+            logger.info('Applied migration %d (%s) in %.2fs', version, description,
+                        time.perf_counter() - started)
+            applied.append((version, description))
+    finally:
+        _release_lock(owner)
+    return applied
+
+
+def check_schema(app):
+    """Startup check: one query when the schema is current, else migrate or refuse"""
+    version = current_version()
+    if version >= LATEST_VERSION:
+        return []
+    if not app.config['MIGRATE_ON_STARTUP']:
+        raise MigrationPending(f'Database schema is at version {version}, the code needs '
+                               f'{LATEST_VERSION}; run "python migrate.py upgrade"')
+    return migrate(wait_timeout=app.config['MIGRATION_WAIT_TIMEOUT'],
+                   stale_after=app.config['MIGRATION_LOCK_TIMEOUT'])
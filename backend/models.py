@@ -1,7 +1,18 @@
+import json
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from replica import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+# Keys of the full Property and Booking dictionaries
+PROPERTY_DICT_FIELDS = ('id', 'owner_id', 'title', 'description', 'address', 'city', 'state',
+                        'zip_code', 'property_type', 'bedrooms', 'bathrooms', 'square_feet',
+                        'price_per_month', 'is_available', 'latitude', 'longitude', 'amenities',
+                        'images', 'created_at', 'version')
+BOOKING_DICT_FIELDS = ('id', 'property_id', 'renter_id', 'start_date', 'end_date', 'total_price',
+                       'status', 'message', 'created_at', 'version')
 
 
 class User(db.Model):
@@ -15,6 +26,8 @@ class User(db.Model):
     last_name = db.Column(db.String(50), nullable=False)
     phone = db.Column(db.String(20))
     user_type = db.Column(db.String(20), nullable=False)  # 'owner' or 'renter'
+    # Embedded in access tokens; bumping it revokes every token issued before
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -38,9 +51,42 @@ class User(db.Model):
         }
 
 
+# Association table linking properties to their amenities
+property_amenities = db.Table(
+    'property_amenities',
+    db.Column('property_id', db.Integer, db.ForeignKey('properties.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('amenity_id', db.Integer, db.ForeignKey('amenities.id'), primary_key=True),
+    # Amenity filters resolve amenity -> properties
+    db.Index('ix_property_amenities_amenity', 'amenity_id', 'property_id')
+)
+
+
+class Amenity(db.Model):
+    """Amenity model, shared by all properties that offer it"""
+    __tablename__ = 'amenities'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<Amenity {self.name}>'
+
+
 class Property(db.Model):
     """Property model for rental listings"""
     __tablename__ = 'properties'
+    __table_args__ = (
+        # Public listing: available properties by newest, by price, by type or city
+        db.Index('ix_properties_available_created', 'is_available', 'created_at', 'id'),
+        db.Index('ix_properties_available_price', 'is_available', 'price_per_month', 'id'),
+        db.Index('ix_properties_available_type_price', 'is_available', 'property_type', 'price_per_month'),
+        db.Index('ix_properties_available_city_price', 'is_available', 'city', 'price_per_month'),
+        # Map and "near me" search: geohash prefix ranges
+        db.Index('ix_properties_geohash', 'geohash'),
+        # Owner listing
+        db.Index('ix_properties_owner_created', 'owner_id', 'created_at', 'id'),
+        db.Index('ix_properties_owner_price', 'owner_id', 'price_per_month', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     owner_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -56,44 +102,104 @@ class Property(db.Model):
     square_feet = db.Column(db.Integer)
     price_per_month = db.Column(db.Float, nullable=False)
     is_available = db.Column(db.Boolean, default=True)
-    amenities = db.Column(db.Text)  # JSON string of amenities
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geohash = db.Column(db.String(12))  # derived from latitude/longitude for spatial lookups
     images = db.Column(db.Text)  # JSON string of image URLs
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Bumped on every update; ORM updates only match the version they loaded
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    
+    __mapper_args__ = {'version_id_col': version}
     
     # Relationships
     bookings = db.relationship('Booking', backref='property', lazy=True, cascade='all, delete-orphan')
+    amenities = db.relationship('Amenity', secondary=property_amenities, lazy='selectin',
+                                order_by='Amenity.name')
     
     def __repr__(self):
         return f'<Property {self.title}>'
     
-    def to_dict(self):
-        """Convert property object to dictionary"""
-        import json
-        return {
-            'id': self.id,
-            'owner_id': self.owner_id,
-            'title': self.title,
-            'description': self.description,
-            'address': self.address,
-            'city': self.city,
-            'state': self.state,
-            'zip_code': self.zip_code,
-            'property_type': self.property_type,
-            'bedrooms': self.bedrooms,
-            'bathrooms': self.bathrooms,
-            'square_feet': self.square_feet,
-            'price_per_month': self.price_per_month,
-            'is_available': self.is_available,
-            'amenities': json.loads(self.amenities) if self.amenities else [],
-            'images': json.loads(self.images) if self.images else [],
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+    def set_location(self, latitude, longitude):
+        """Set coordinates and the geohash derived from them"""
+        from geo import encode
+        self.latitude = latitude
+        self.longitude = longitude
+        self.geohash = encode(latitude, longitude) if latitude is not None else None
+    
+    def to_dict(self, fields=None):
+        """Convert property object to dictionary, optionally only the given fields
+        
+        Only the requested fields are read, so columns deferred with load_only
+        stay unloaded and images are decoded only when asked for.
+        """
+        if fields is None:
+            fields = PROPERTY_DICT_FIELDS
+        data = {}
+        for field in fields:
+            if field == 'amenities':
+                data[field] = [amenity.name for amenity in self.amenities]
+            elif field == 'images':
+                data[field] = json.loads(self.images) if self.images else []
+            elif field == 'image':
+                images = json.loads(self.images) if self.images else []
+                data[field] = images[0] if images else None
+            elif field == 'created_at':
+                data[field] = self.created_at.isoformat() if self.created_at else None
+            else:
+                data[field] = getattr(self, field)
+        return data
+
+
+class TableVersion(db.Model):
+    """Per-table change counter, bumped in the same transaction as every write"""
+    __tablename__ = 'table_versions'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<TableVersion {self.name}={self.version}>'
+
+
+class SchemaVersion(db.Model):
+    """Single row holding the last applied migration and the migration lock"""
+    __tablename__ = 'schema_version'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<SchemaVersion {self.version}>'
+
+
+class FacetCount(db.Model):
+    """Precomputed facet counts over all available properties, kept current on every write"""
+    __tablename__ = 'facet_counts'
+    
+    facet = db.Column(db.String(30), primary_key=True)
+    value = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<FacetCount {self.facet}={self.value}: {self.count}>'
 
 
 class Booking(db.Model):
     """Booking model for rental reservations"""
     __tablename__ = 'bookings'
+    __table_args__ = (
+        # Bookings per property by date, and by status as the interval index for
+        # availability checks: the approved bookings still running after a date
+        db.Index('ix_bookings_property_start', 'property_id', 'start_date'),
+        db.Index('ix_bookings_property_status_end', 'property_id', 'status', 'end_date', 'start_date'),
+        # Renter listing
+        db.Index('ix_bookings_renter_created', 'renter_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     property_id = db.Column(db.Integer, db.ForeignKey('properties.id'), nullable=False)
@@ -105,20 +211,55 @@ class Booking(db.Model):
     message = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Bumped on every update; ORM updates only match the version they loaded
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    
+    __mapper_args__ = {'version_id_col': version}
     
     def __repr__(self):
         return f'<Booking {self.id}>'
     
-    def to_dict(self):
-        """Convert booking object to dictionary"""
-        return {
-            'id': self.id,
-            'property_id': self.property_id,
-            'renter_id': self.renter_id,
-            'start_date': self.start_date.isoformat() if self.start_date else None,
-            'end_date': self.end_date.isoformat() if self.end_date else None,
-            'total_price': self.total_price,
-            'status': self.status,
-            'message': self.message,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+    def to_dict(self, fields=None):
+        """Convert booking object to dictionary, optionally only the given fields"""
+        if fields is None:
+            fields = BOOKING_DICT_FIELDS
+        data = {}
+        for field in fields:
+            value = getattr(self, field)
+            if field in ('start_date', 'end_date', 'created_at'):
+                value = value.isoformat() if value else None
+            data[field] = value
+        return data
+
+
+class PropertyBookingStats(db.Model):
+    """Running booking totals per property, for the owner dashboard"""
+    __tablename__ = 'property_booking_stats'
+    
+    property_id = db.Column(db.Integer, db.ForeignKey('properties.id', ondelete='CASCADE'), primary_key=True)
+    owner_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    pending = db.Column(db.Integer, nullable=False, default=0)
+    approved = db.Column(db.Integer, nullable=False, default=0)
+    rejected = db.Column(db.Integer, nullable=False, default=0)
+    cancelled = db.Column(db.Integer, nullable=False, default=0)
+    approved_revenue = db.Column(db.Float, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<PropertyBookingStats {self.property_id}>'
+
+
+class PropertyMonthlyStats(db.Model):
+    """Approved nights and revenue per property and calendar month, for the owner dashboard"""
+    __tablename__ = 'property_monthly_stats'
+    __table_args__ = (
+        db.Index('ix_property_monthly_stats_owner_month', 'owner_id', 'month'),
+    )
+    
+    property_id = db.Column(db.Integer, db.ForeignKey('properties.id', ondelete='CASCADE'), primary_key=True)
+    month = db.Column(db.String(7), primary_key=True)  # 'YYYY-MM'
+    owner_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    occupied_nights = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<PropertyMonthlyStats {self.property_id} {self.month}>'
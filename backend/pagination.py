@@ -0,0 +1,136 @@
+import base64
+import json
+from datetime import date, datetime
+from flask import current_app, request
+from sqlalchemy import and_, or_
+from cache import TTLCache
+
+
+class PaginationError(ValueError):
+    """Raised when limit, sort or cursor query parameters are invalid"""
+
+
+class Sort:
+    """A keyset sort order seeking on (column, tiebreaker)
+
+    A computed sort key (e.g. a relevance score) is fetched alongside each
+    row with add_columns, and its python_type must be given explicitly.
+    """
+
+    def __init__(self, name, column, tiebreaker, descending=False, computed=False,
+                 python_type=None):
+        self.name = name
+        self.column = column
+        self.tiebreaker = tiebreaker
+        self.descending = descending
+        self.computed = computed
+        self.python_type = python_type or column.type.python_type
+
+    def order_by(self):
+        if self.descending:
+            return self.column.desc(), self.tiebreaker.desc()
+        return self.column.asc(), self.tiebreaker.asc()
+
+    def seek(self, value, last_id):
+        """Filter clause selecting rows strictly after (value, last_id)"""
+        if self.descending:
+            return or_(self.column < value,
+                       and_(self.column == value, self.tiebreaker < last_id))
+        return or_(self.column > value,
+                   and_(self.column == value, self.tiebreaker > last_id))
+
+    def key(self, row):
+        """Return the (sort value, id) pair of a fetched row"""
+        if self.computed:
+            item, value = row
+            return value, getattr(item, self.tiebreaker.key)
+        return getattr(row, self.column.key), getattr(row, self.tiebreaker.key)
+
+
+def _dump_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _load_value(sort, value):
+    python_type = sort.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return value
+
+
+def encode_cursor(sort, row):
+    """Build an opaque cursor token pointing just past row"""
+    value, last_id = sort.key(row)
+    payload = json.dumps({'s': sort.name, 'v': _dump_value(value), 'id': last_id},
+                         separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(sort, token):
+    """Decode a cursor token into a (value, id) seek position"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if payload['s'] != sort.name:
+            raise PaginationError('Cursor does not match the requested sort')
+        return _load_value(sort, payload['v']), int(payload['id'])
+    except PaginationError:
+        raise
+    except (ValueError, TypeError, KeyError):
+        raise PaginationError('Invalid cursor')
+
+
+def page_params(sorts, default_sort):
+    """Parse limit, cursor and sort from the current request"""
+    sort_name = request.args.get('sort', default_sort)
+    if sort_name not in sorts:
+        raise PaginationError(f'sort must be one of: {", ".join(sorts)}')
+    sort = sorts[sort_name]
+
+    max_limit = current_app.config['PAGE_SIZE_MAX']
+    limit = request.args.get('limit', current_app.config['PAGE_SIZE_DEFAULT'], type=int)
+    if limit is None or limit < 1:
+        raise PaginationError('limit must be a positive integer')
+    limit = min(limit, max_limit)
+
+    token = request.args.get('cursor')
+    cursor = decode_cursor(sort, token) if token else None
+    return sort, limit, cursor
+
+
+def paginate(query, sort, limit, cursor=None):
+    """Fetch one page of query seeking on sort, returning (items, next_cursor)"""
+    if sort.computed:
+        query = query.add_columns(sort.column)
+    if cursor is not None:
+        query = query.filter(sort.seek(*cursor))
+    rows = query.order_by(*sort.order_by()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(sort, rows[-1])
+    if sort.computed:
+        rows = [row[0] for row in rows]
+    return rows, next_cursor
+
+
+count_cache = TTLCache()
+
+PAGING_ARGS = ('limit', 'cursor', 'sort', 'include_count')
+
+
+def wants_count():
+    return request.args.get('include_count', '').lower() in ('1', 'true', 'yes')
+
+
+def cached_count(query, scope=None):
+    """Return the total row count for query, cached per endpoint and filter set"""
+    filters = tuple(sorted((k, v) for k, v in request.args.items(multi=True)
+                           if k not in PAGING_ARGS))
+    key = (request.endpoint, scope, filters)
+    ttl = current_app.config['COUNT_CACHE_TTL']
+    return count_cache.get_or_compute(key, ttl, lambda: query.order_by(None).count())
@@ -0,0 +1,98 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import bcrypt
+from metrics import metrics
+
+# bcrypt only looks at the first 72 bytes of a password
+BCRYPT_MAX_BYTES = 72
+
+
+class PoolSaturated(Exception):
+    """Raised when the password pool has no free worker or queue slot"""
+
+
+def _encode(password):
+    return password.encode('utf-8')[:BCRYPT_MAX_BYTES]
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(_encode(password), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _verify(password_hash, password):
+    try:
+        return bcrypt.checkpw(_encode(password), password_hash.encode('utf-8'))
+    except ValueError:
+        return False
+
+
+def hash_cost(password_hash):
+    """Read the cost factor out of a $2b$<cost>$... hash"""
+    try:
+        return int(password_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """Runs bcrypt hashing and verification on a bounded thread pool
+
+    bcrypt releases the GIL, so a few dedicated threads keep request threads
+    free for cheap endpoints during a login burst. At most `workers` hashes run
+    at once and `max_pending` more may wait; beyond that calls fail fast with
+    PoolSaturated instead of queueing.
+    """
+
+    def __init__(self, app=None):
+        self._executor = None
+        self._slots = None
+        self.rounds = 12
+        self.timeout = 10
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.rounds = app.config.setdefault('BCRYPT_LOG_ROUNDS', self.rounds)
+        self.timeout = app.config.setdefault('PASSWORD_POOL_TIMEOUT', self.timeout)
+        workers = app.config.setdefault('PASSWORD_POOL_WORKERS', 4)
+        max_pending = app.config.setdefault('PASSWORD_POOL_MAX_PENDING', 32)
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+
+    def _run(self, operation, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            metrics.count_password_rejection(operation)
+            raise PoolSaturated()
+        started = time.perf_counter()
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            result = future.result(timeout=self.timeout)
+        except TimeoutError:
+            metrics.count_password_rejection(operation)
+            raise PoolSaturated()
+        metrics.observe_password(operation, time.perf_counter() - started)
+        return result
+
+    def hash(self, password):
+        """Hash password at the configured cost"""
+        return self._run('hash', _hash, password, self.rounds)
+
+    def verify(self, password_hash, password):
+        """Check password against password_hash"""
+        return self._run('verify', _verify, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Whether password_hash was made with a different cost than configured"""
+        return hash_cost(password_hash) != self.rounds
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,31 @@
+from sqlalchemy.orm import contains_eager, joinedload
+from models import Booking, Property, User
+
+# The renter columns renter_summary reads
+RENTER_SUMMARY_COLUMNS = (User.first_name, User.last_name, User.email, User.phone)
+
+
+def renter_bookings_query(renter_id, with_property=True):
+    """Bookings made by a renter, with each booking's property joined in"""
+    query = Booking.query.filter(Booking.renter_id == renter_id)
+    if with_property:
+        query = query.options(joinedload(Booking.property))
+    return query
+
+
+def owner_bookings_query(owner_id):
+    """Bookings on an owner's properties, with property and renter joined in"""
+    return (Booking.query
+            .join(Booking.property)
+            .options(contains_eager(Booking.property),
+                     joinedload(Booking.renter).load_only(*RENTER_SUMMARY_COLUMNS))
+            .filter(Property.owner_id == owner_id))
+
+
+def renter_summary(renter):
+    """Renter contact details shown to property owners"""
+    return {
+        'name': f"{renter.first_name} {renter.last_name}",
+        'email': renter.email,
+        'phone': renter.phone
+    } if renter else None
@@ -0,0 +1,121 @@
+import threading
+import time
+from flask import current_app, g, has_request_context, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_sqlalchemy.session import Session
+
+# Bind key of the read replica engine
+REPLICA_BIND = 'replica'
+# Methods that never write, so they can be served from the replica
+READ_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+
+
+class RoutingSession(Session):
+    """Session that sends reads of replica-routed requests to the replica engine
+
+    Flushes always go to the primary, so a read request that does write
+    something still writes to the right database.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and has_request_context()
+                and g.get('use_replica')):
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class StickyWrites:
+    """Users who wrote recently, with the time until which they read from the primary"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._until = {}
+
+    def mark(self, user_id, seconds):
+        until = time.monotonic() + seconds
+        with self._lock:
+            self._until[user_id] = until
+            # Drop expired entries now and then so the map stays small
+            if len(self._until) > 10000:
+                now = time.monotonic()
+                self._until = {key: value for key, value in self._until.items() if value > now}
+
+    def is_sticky(self, user_id):
+        if user_id is None:
+            return False
+        with self._lock:
+            return self._until.get(user_id, 0) > time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            self._until.clear()
+
+
+def _caller():
+    """The user a request carries a valid token for, or None
+
+    Stickiness is keyed on the user alone: behind a proxy or NAT many clients
+    share one address, and one writer would pin them all to the primary.
+    """
+    try:
+        verify_jwt_in_request(optional=True)
+        return get_jwt_identity()
+    except Exception:
+        return None
+
+
+def _new_user(response):
+    """The user a successful anonymous write signed up (or logged in), from its response"""
+    if not response.is_json:
+        return None
+    user = (response.get_json(silent=True) or {}).get('user')
+    return user.get('id') if isinstance(user, dict) else None
+
+
+class ReplicaRouter:
+    """Routes read requests to a read replica bind, keeping recent writers on the primary
+
+    After a user writes, their reads stay on the primary for
+    REPLICA_STICKY_SECONDS so they see their own changes despite replication
+    lag. Stickiness is tracked per worker process.
+    """
+
+    def __init__(self):
+        self.sticky = StickyWrites()
+
+    def init_app(self, app):
+        """Add the replica bind to the app's config; call before db.init_app"""
+        url = app.config.get('REPLICA_DATABASE_URL')
+        if not url:
+            return
+        app.config['SQLALCHEMY_BINDS'] = dict(app.config.get('SQLALCHEMY_BINDS') or {},
+                                              **{REPLICA_BIND: url})
+        app.before_request(self._route_request)
+        app.after_request(self._record_write)
+
+    def _route_request(self):
+        g.caller = _caller()
+        g.use_replica = (request.method in READ_METHODS
+                         and not self.sticky.is_sticky(g.caller))
+
+    def route_batch(self, read_only):
+        """Route a batch of sub-requests as one request that does or doesn't write"""
+        g.read_only = read_only
+        if 'caller' in g:
+            g.use_replica = read_only and not self.sticky.is_sticky(g.caller)
+
+    def _record_write(self, response):
+        read_only = g.get('read_only', request.method in READ_METHODS)
+        if not read_only and response.status_code < 400:
+            user_id = g.caller if 'caller' in g else _caller()
+            if user_id is None:
+                user_id = _new_user(response)
+            if user_id is not None:
+                self.sticky.mark(user_id, current_app.config['REPLICA_STICKY_SECONDS'])
+        response.headers['X-DB-Route'] = 'replica' if g.get('use_replica') else 'primary'
+        return response
+
+
+replica_router = ReplicaRouter()
@@ -1,7 +1,9 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from app import db, bcrypt
+from flask_jwt_extended import get_jwt_identity
+from app import db
 from models import User
+from passwords import password_hasher, PoolSaturated
+from auth_tokens import issue_token, token_required, user_cache
 from email_validator import validate_email, EmailNotValidError
 
 auth_bp = Blueprint('auth', __name__)
@@ -40,7 +42,7 @@ def signup():
             return jsonify({'error': 'Password must be at least 6 characters long'}), 400
         
         # Hash password
-        password_hash = bcrypt.generate_password_hash(data['password']).decode('utf-8')
+        password_hash = password_hasher.hash(data['password'])
         
         # Create new user
         new_user = User(
@@ -55,8 +57,8 @@ def signup():
         db.session.add(new_user)
         db.session.commit()
         
-        # Create access token
-        access_token = create_access_token(identity=new_user.id)
+        # Create access token (the user type and token version ride along as claims)
+        access_token = issue_token(new_user)
         
         return jsonify({
             'message': 'User created successfully',
@@ -64,6 +66,9 @@ def signup():
             'user': new_user.to_dict()
         }), 201
         
+    except PoolSaturated:
+        db.session.rollback()
+        raise
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Server error: {str(e)}'}), 500
@@ -86,11 +91,19 @@ def login():
             return jsonify({'error': 'Invalid email or password'}), 401
         
         # Check password
-        if not bcrypt.check_password_hash(user.password_hash, data['password']):
+        if not password_hasher.verify(user.password_hash, data['password']):
             return jsonify({'error': 'Invalid email or password'}), 401
         
-        # Create access token
-        access_token = create_access_token(identity=user.id)
+        # Upgrade the stored hash if the configured cost factor changed
+        if password_hasher.needs_rehash(user.password_hash):
+            try:
+                user.password_hash = password_hasher.hash(data['password'])
+                db.session.commit()
+            except PoolSaturated:
+                pass
+        
+        # Create access token (the user type and token version ride along as claims)
+        access_token = issue_token(user)
         
         return jsonify({
             'message': 'Login successful',
@@ -98,29 +111,32 @@ def login():
             'user': user.to_dict()
         }), 200
         
+    except PoolSaturated:
+        db.session.rollback()
+        raise
     except Exception as e:
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
 
 @auth_bp.route('/me', methods=['GET'])
-@jwt_required()
+@token_required()
 def get_current_user():
     """Get current authenticated user's information"""
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = user_cache.get(current_user_id)
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        return jsonify({'user': user.to_dict()}), 200
+        return jsonify({'user': user.profile}), 200
         
     except Exception as e:
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
 
 @auth_bp.route('/update-profile', methods=['PUT'])
-@jwt_required()
+@token_required()
 def update_profile():
     """Update user profile information"""
     try:
@@ -141,6 +157,7 @@ def update_profile():
             user.phone = data['phone']
         
         db.session.commit()
+        user_cache.invalidate(user.id)
         
         return jsonify({
             'message': 'Profile updated successfully',
@@ -153,7 +170,7 @@ def update_profile():
 
 
 @auth_bp.route('/change-password', methods=['PUT'])
-@jwt_required()
+@token_required()
 def change_password():
     """Change user password"""
     try:
@@ -170,19 +187,27 @@ def change_password():
             return jsonify({'error': 'Current password and new password are required'}), 400
         
         # Check current password
-        if not bcrypt.check_password_hash(user.password_hash, data['current_password']):
+        if not password_hasher.verify(user.password_hash, data['current_password']):
             return jsonify({'error': 'Current password is incorrect'}), 401
         
         # Validate new password strength
         if len(data['new_password']) < 6:
             return jsonify({'error': 'New password must be at least 6 characters long'}), 400
         
-        # Update password
-        user.password_hash = bcrypt.generate_password_hash(data['new_password']).decode('utf-8')
+        # Update password and revoke every token issued before
+        user.password_hash = password_hasher.hash(data['new_password'])
+        user.token_version += 1
         db.session.commit()
+        user_cache.invalidate(user.id)
         
-        return jsonify({'message': 'Password changed successfully'}), 200
+        return jsonify({
+            'message': 'Password changed successfully',
+            'access_token': issue_token(user)
+        }), 200
         
+    except PoolSaturated:
+        db.session.rollback()
+        raise
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Server error: {str(e)}'}), 500
@@ -0,0 +1,102 @@
+from flask import Blueprint, current_app, g, request, jsonify
+from werkzeug.test import EnvironBuilder
+from app import db
+from replica import replica_router, READ_METHODS
+from auth_tokens import share_caller
+
+batch_bp = Blueprint('batch', __name__)
+
+BATCH_METHODS = frozenset({'GET', 'POST', 'PUT', 'PATCH', 'DELETE'})
+# Sub-response headers left out of the batch response
+SKIPPED_HEADERS = frozenset({'content-length'})
+
+
+class BatchError(ValueError):
+    """A malformed batch request"""
+
+
+def parse_batch(data, max_requests):
+    """Validate the sub-requests of a batch body; returns them with defaults filled in"""
+    items = data.get('requests') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        raise BatchError('requests must be a non-empty list')
+    if len(items) > max_requests:
+        raise BatchError(f'A batch holds at most {max_requests} requests')
+
+    parsed = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise BatchError(f'requests[{index}] must be an object')
+        method = str(item.get('method', 'GET')).upper()
+        path = item.get('path')
+        headers = item.get('headers') or {}
+        if method not in BATCH_METHODS:
+            raise BatchError(f'requests[{index}].method must be one of {", ".join(sorted(BATCH_METHODS))}')
+        if not isinstance(path, str) or not path.startswith('/api/'):
+            raise BatchError(f'requests[{index}].path must be an API path')
+        if path.split('?')[0].rstrip('/') == request.path.rstrip('/'):
+            raise BatchError(f'requests[{index}] cannot be another batch')
+        if not isinstance(headers, dict):
+            raise BatchError(f'requests[{index}].headers must be an object')
+        parsed.append({'id': item.get('id', index), 'method': method, 'path': path,
+                       'headers': headers, 'body': item.get('body')})
+    return parsed
+
+
+def run_subrequest(item):
+    """Dispatch one sub-request to its view inside the batch's app context
+
+    The app context, and with it g and the database session, is shared by
+    every sub-request. Request hooks only run for the batch itself.
+    """
+    app = current_app._get_current_object()
+    headers = {name: value for name, value in item['headers'].items()
+               if name.lower() != 'authorization'}
+    # Every sub-request acts as the batch's caller; views reuse the claims
+    # run_batch verified rather than decoding the header again
+    if 'Authorization' in request.headers:
+        headers['Authorization'] = request.headers['Authorization']
+    builder = EnvironBuilder(path=item['path'], method=item['method'], headers=headers,
+                             json=item['body'], environ_base={'REMOTE_ADDR': request.remote_addr})
+    with app.request_context(builder.get_environ()):
+        try:
+            response = app.make_response(app.dispatch_request())
+        except Exception as e:
+            try:
+                response = app.make_response(app.handle_user_exception(e))
+            except Exception as unhandled:
+                db.session.rollback()
+                response = app.make_response((jsonify({'error': f'Server error: {str(unhandled)}'}), 500))
+        body = (response.get_json(silent=True) if response.is_json
+                else response.get_data(as_text=True) or None)
+    return {
+        'id': item['id'],
+        'status': response.status_code,
+        'headers': {name: value for name, value in response.headers.items()
+                    if name.lower() not in SKIPPED_HEADERS},
+        'body': body,
+    }
+
+
+@batch_bp.route('', methods=['POST'])
+def run_batch():
+    """Run several API requests in one round trip, in order, as the same caller
+
+    Sub-requests are independent: each commits or fails on its own, and the
+    batch returns 200 with every sub-response once the batch itself is valid.
+    """
+    try:
+        items = parse_batch(request.get_json(silent=True), current_app.config['BATCH_MAX_REQUESTS'])
+    except BatchError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # A batch of reads is routed like a read, so it can be served by the replica
+    replica_router.route_batch(all(item['method'] in READ_METHODS for item in items))
+    # The token is decoded once for the batch, and sub-requests authorize from
+    # its claims and share the user cache, so the caller is looked up at most once
+    share_caller()
+    try:
+        responses = [run_subrequest(item) for item in items]
+    finally:
+        g.pop('shared_caller', None)
+    return jsonify({'responses': responses}), 200
@@ -1,47 +1,234 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, current_app, request, jsonify, stream_with_context
+from flask_jwt_extended import get_jwt_identity
 from app import db
 from models import Property, Booking, User
+from pagination import Sort, PaginationError, page_params, paginate, wants_count, cached_count
+from queries import renter_bookings_query, owner_bookings_query, renter_summary
+from search import search_properties
+from amenities import resolve_amenities, parse_amenity_filter, filter_by_amenities
+from cache import listing_cache, property_state
+from metrics import operator_authorized
+from versions import table_versions, make_etag, row_etag, not_modified, expected_version
+from availability import parse_date_range, filter_available, find_conflict, availability_calendar
+from geo import (parse_point, parse_bbox, filter_bbox, filter_radius, haversine_km,
+                 location_from, MAX_RADIUS_KM)
+from facets import stored_facets, query_facets
+from analytics import month_window, owner_analytics
+from fields import (PROPERTY_FIELDS, PROPERTY_SUMMARY_FIELDS, BOOKING_FIELDS, BOOKING_SUMMARY_FIELDS,
+                    FieldsError, parse_fields, property_options, booking_options)
+from models import PROPERTY_DICT_FIELDS
+from importer import property_values, import_format, read_records, import_properties
+from booking_status import parse_status_updates, update_booking_statuses
+from auth_tokens import role_required, token_required
+from exporter import (EXPORT_FORMATS, PROPERTY_COLUMNS, BOOKING_COLUMNS, export_format,
+                      owner_properties_export, owner_bookings_export, property_record,
+                      booking_record, stream_export)
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
+from sqlalchemy.orm.exc import StaleDataError
 
 rentals_bp = Blueprint('rentals', __name__)
 
+PROPERTY_SORTS = {
+    'newest': Sort('newest', Property.created_at, Property.id, descending=True),
+    'price_asc': Sort('price_asc', Property.price_per_month, Property.id),
+    'price_desc': Sort('price_desc', Property.price_per_month, Property.id, descending=True),
+}
+
+# Listing filter keys that only qualify another filter and never narrow a listing alone
+UNSCOPED_FILTER_KEYS = ('amenities_match', 'radius_km')
+
+BOOKING_SORTS = {
+    'newest': Sort('newest', Booking.created_at, Booking.id, descending=True),
+}
+
+
+@rentals_bp.errorhandler(PaginationError)
+@rentals_bp.errorhandler(FieldsError)
+def handle_pagination_error(e):
+    return jsonify({'error': str(e)}), 400
+
+
+def sort_columns(sort):
+    """Columns a page's sort key is read from, to load alongside a projection"""
+    return () if sort.computed else (sort.column,)
+
+
+def booking_data(booking, fields, property_fields):
+    """A booking's dictionary with its property and renter, limited to fields"""
+    data = booking.to_dict([field for field in fields if field in BOOKING_FIELDS])
+    if 'property' in fields:
+        data['property'] = booking.property.to_dict(property_fields) if booking.property else None
+    if 'renter' in fields:
+        data['renter'] = renter_summary(booking.renter)
+    return data
+
+
+def listing_filters(args):
+    """Parse the listing filters shared by /properties and /properties/facets"""
+    amenities_match = args.get('amenities_match', 'all')
+    if amenities_match not in ('all', 'any'):
+        raise ValueError('amenities_match must be "all" or "any"')
+    
+    radius_km = args.get('radius_km', 10, type=float)
+    if not 0 < radius_km <= MAX_RADIUS_KM:
+        raise ValueError(f'radius_km must be between 0 and {MAX_RADIUS_KM}')
+    
+    return {
+        'q': args.get('q'),
+        'city': args.get('city'),
+        'property_type': args.get('property_type'),
+        'min_price': args.get('min_price', type=float),
+        'max_price': args.get('max_price', type=float),
+        'bedrooms': args.get('bedrooms', type=int),
+        'amenities': parse_amenity_filter(args),
+        'amenities_match': amenities_match,
+        'available': parse_date_range(args, 'available_from', 'available_to'),
+        'near': parse_point(args['near'], 'near') if args.get('near') else None,
+        'radius_km': radius_km,
+        'bbox': parse_bbox(args['bbox']) if args.get('bbox') else None
+    }
+
+
+def listing_query(filters):
+    """Available properties matching filters, with the relevance and distance sort keys"""
+    query = Property.query.filter_by(is_available=True)
+    
+    # Keyword and city matching go through the full-text index
+    query, rank = search_properties(query, q=filters['q'], city=filters['city'])
+    
+    # Spatial filters go through the geohash index
+    if filters['bbox']:
+        query = filter_bbox(query, *filters['bbox'])
+    distance = None
+    if filters['near']:
+        query, distance = filter_radius(query, *filters['near'], filters['radius_km'])
+    
+    if filters['property_type']:
+        # Not filter_by, which would look on the last joined search/geohash subquery
+        query = query.filter(Property.property_type == filters['property_type'])
+    if filters['min_price']:
+        query = query.filter(Property.price_per_month >= filters['min_price'])
+    if filters['max_price']:
+        query = query.filter(Property.price_per_month <= filters['max_price'])
+    if filters['bedrooms']:
+        query = query.filter(Property.bedrooms >= filters['bedrooms'])
+    if filters['amenities']:
+        query = filter_by_amenities(query, filters['amenities'], filters['amenities_match'])
+    if filters['available']:
+        query = filter_available(query, *filters['available'])
+    
+    return query, rank, distance
+
+
+def listing_etag(filters):
+    """ETag for a listing-derived response, from the versions of the tables it reads"""
+    versioned_tables = ('properties', 'bookings') if filters['available'] else ('properties',)
+    return make_etag(versioned_tables, *table_versions(*versioned_tables))
+
 
 # ==================== Property Routes ====================
 
 @rentals_bp.route('/properties', methods=['GET'])
 def get_properties():
-    """Get all available properties with optional filters"""
+    """Get a page of available properties with optional filters and keyword search"""
     try:
-        # Get query parameters for filtering
-        city = request.args.get('city')
-        property_type = request.args.get('property_type')
-        min_price = request.args.get('min_price', type=float)
-        max_price = request.args.get('max_price', type=float)
-        bedrooms = request.args.get('bedrooms', type=int)
+        filters = listing_filters(request.args)
+        
+        # Answer conditional requests from the table versions alone
+        etag = listing_etag(filters)
+        response = not_modified(etag)
+        if response is not None:
+            return response
+        
+        # Serve popular filter combinations from the listing cache
+        cache_key = listing_cache.make_key(request.args) if listing_cache.enabled else None
+        if cache_key is not None:
+            cached = listing_cache.get(cache_key)
+            if cached is not None:
+                # Writes since then left this listing alone, so it keeps the ETag it was built under
+                body, cached_etag = cached
+                response = not_modified(cached_etag)
+                if response is None:
+                    response = current_app.response_class(body, mimetype='application/json')
+                    response.set_etag(cached_etag)
+                response.headers['X-Cache'] = 'HIT'
+                return response
         
         # Build query
-        query = Property.query.filter_by(is_available=True)
+        query, rank, distance = listing_query(filters)
+        
+        sorts, default_sort = dict(PROPERTY_SORTS), 'newest'
+        if rank is not None:
+            sorts['relevance'] = Sort('relevance', rank, Property.id, computed=True, python_type=float)
+            default_sort = 'relevance'
+        if distance is not None:
+            sorts['distance'] = Sort('distance', distance, Property.id, computed=True, python_type=float)
+            default_sort = 'distance'
+        sort, limit, cursor = page_params(sorts, default_sort)
+        fields = parse_fields(request.args, PROPERTY_FIELDS, PROPERTY_SUMMARY_FIELDS)
+        
+        # Only fetch the columns the requested fields (and sort key, distance) read
+        extra_columns = sort_columns(sort)
+        if filters['near']:
+            extra_columns += (Property.latitude, Property.longitude)
+        query = query.options(*property_options(fields, extra_columns))
+        
+        properties, next_cursor = paginate(query, sort, limit, cursor)
+        
+        properties_data = [prop.to_dict(fields) for prop in properties]
+        if filters['near']:
+            for prop, prop_dict in zip(properties, properties_data):
+                prop_dict['distance_km'] = round(haversine_km(
+                    *filters['near'], prop.latitude, prop.longitude), 3)
+        
+        response = {
+            'properties': properties_data,
+            'next_cursor': next_cursor
+        }
+        if wants_count():
+            response['count'] = cached_count(query)
+        
+        response = jsonify(response)
+        response.set_etag(etag)
+        if cache_key is not None:
+            listing_cache.set(cache_key, response.get_data(), etag, filters,
+                              [prop.id for prop in properties])
+            response.headers['X-Cache'] = 'MISS'
+        
+        return response, 200
+        
+    except PaginationError:
+        raise
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Server error: {str(e)}'}), 500
+
+
+@rentals_bp.route('/properties/facets', methods=['GET'])
+def get_property_facets():
+    """Get listing counts per city, property type, bedroom count and price bucket"""
+    try:
+        filters = listing_filters(request.args)
         
-        if city:
-            query = query.filter(Property.city.ilike(f'%{city}%'))
-        if property_type:
-            query = query.filter_by(property_type=property_type)
-        if min_price:
-            query = query.filter(Property.price_per_month >= min_price)
-        if max_price:
-            query = query.filter(Property.price_per_month <= max_price)
-        if bedrooms:
-            query = query.filter(Property.bedrooms >= bedrooms)
+        etag = listing_etag(filters)
+        response = not_modified(etag)
+        if response is not None:
+            return response
         
-        properties = query.all()
+        # The unfiltered sidebar reads the precomputed counts
+        if any(value for key, value in filters.items() if key not in UNSCOPED_FILTER_KEYS):
+            total, facets = query_facets(listing_query(filters)[0])
+        else:
+            total, facets = stored_facets()
         
-        return jsonify({
-            'properties': [prop.to_dict() for prop in properties],
-            'count': len(properties)
-        }), 200
+        response = jsonify({'total': total, 'facets': facets})
+        response.set_etag(etag)
+        return response, 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
@@ -50,78 +237,163 @@ def get_properties():
 def get_property(property_id):
     """Get a specific property by ID"""
     try:
-        property = Property.query.get(property_id)
+        # Check freshness from the property's version and owner's timestamp before loading rows
+        stamps = (db.session.query(Property.version, User.updated_at)
+                  .outerjoin(User, User.id == Property.owner_id)
+                  .filter(Property.id == property_id)
+                  .first())
+        
+        if not stamps:
+            return jsonify({'error': 'Property not found'}), 404
+        
+        fields = parse_fields(request.args, PROPERTY_FIELDS, PROPERTY_SUMMARY_FIELDS,
+                              default=PROPERTY_DICT_FIELDS)
+        
+        version, owner_updated_at = stamps
+        etag = row_etag(version, 'property', property_id, owner_updated_at)
+        response = not_modified(etag)
+        if response is not None:
+            return response
+        
+        property = (Property.query
+                    .options(*property_options(fields, (Property.owner_id,)))
+                    .get(property_id))
         
         if not property:
             return jsonify({'error': 'Property not found'}), 404
         
         # Include owner information
         owner = User.query.get(property.owner_id)
-        property_data = property.to_dict()
+        property_data = property.to_dict(fields)
         property_data['owner'] = {
             'name': f"{owner.first_name} {owner.last_name}",
             'phone': owner.phone
         } if owner else None
         
-        return jsonify({'property': property_data}), 200
+        response = jsonify({'property': property_data})
+        response.set_etag(etag)
+        return response, 200
+        
+    except FieldsError:
+        raise
+    except Exception as e:
+        return jsonify({'error': f'Server error: {str(e)}'}), 500
+
+
+@rentals_bp.route('/properties/<int:property_id>/availability', methods=['GET'])
+def get_property_availability(property_id):
+    """Get booked and free date ranges for a property (defaults to the next year)"""
+    try:
+        if not db.session.query(Property.id).filter_by(id=property_id).first():
+            return jsonify({'error': 'Property not found'}), 404
+        
+        window = parse_date_range(request.args, 'from', 'to')
+        if window is None:
+            today = datetime.utcnow().date()
+            window = (today, today + timedelta(days=365))
+        start_date, end_date = window
+        if (end_date - start_date).days > 3 * 366:
+            return jsonify({'error': 'Date range cannot exceed 3 years'}), 400
+        
+        booked, free = availability_calendar(property_id, start_date, end_date)
+        
+        return jsonify({
+            'property_id': property_id,
+            'from': start_date.isoformat(),
+            'to': end_date.isoformat(),
+            'booked': [{'start_date': s.isoformat(), 'end_date': e.isoformat()} for s, e in booked],
+            'available': [{'start_date': s.isoformat(), 'end_date': e.isoformat()} for s, e in free]
+        }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
 
 @rentals_bp.route('/properties', methods=['POST'])
-@jwt_required()
+@role_required('owner', 'Only owners can create property listings')
 def create_property():
     """Create a new property listing (owner only)"""
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
-        
-        if not user or user.user_type != 'owner':
-            return jsonify({'error': 'Only owners can create property listings'}), 403
-        
         data = request.get_json()
         
-        # Validate required fields
-        required_fields = ['title', 'description', 'address', 'city', 'state', 
-                          'zip_code', 'property_type', 'bedrooms', 'bathrooms', 'price_per_month']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({'error': f'{field} is required'}), 400
+        # Validate required fields (the same rules as the bulk import)
+        values, amenity_names = property_values(data)
         
         # Create new property
         new_property = Property(
             owner_id=current_user_id,
-            title=data['title'],
-            description=data['description'],
-            address=data['address'],
-            city=data['city'],
-            state=data['state'],
-            zip_code=data['zip_code'],
-            property_type=data['property_type'],
-            bedrooms=data['bedrooms'],
-            bathrooms=data['bathrooms'],
-            square_feet=data.get('square_feet'),
-            price_per_month=data['price_per_month'],
-            amenities=json.dumps(data.get('amenities', [])),
-            images=json.dumps(data.get('images', []))
+            amenities=resolve_amenities(amenity_names),
+            **values
         )
         
         db.session.add(new_property)
         db.session.commit()
+        listing_cache.invalidate_property(new_property.id, after=property_state(new_property))
         
         return jsonify({
             'message': 'Property created successfully',
             'property': new_property.to_dict()
         }), 201
         
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Server error: {str(e)}'}), 500
+
+
+@rentals_bp.route('/properties/import', methods=['POST'])
+@role_required('owner', 'Only owners can import property listings')
+def import_properties_upload():
+    """Bulk-create property listings from a streamed CSV or NDJSON upload (owner only)"""
+    try:
+        current_user_id = get_jwt_identity()
+        try:
+            fmt = import_format(request.mimetype, request.args.get('format'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 415
+        
+        # Release any user lookup's transaction before the batches start committing
+        db.session.commit()
+        
+        result = import_properties(current_user_id, read_records(request.stream, fmt),
+                                   current_app.config['IMPORT_BATCH_SIZE'],
+                                   current_app.config['IMPORT_MAX_ERRORS'])
+        if result.imported:
+            listing_cache.invalidate_all()
+        
+        return jsonify(dict(result.to_dict(), message='Import finished')), 200
+        
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
 
+def modified_response(name, version):
+    """409 for a write based on an outdated version of a row"""
+    return jsonify({'error': f'{name} was modified by another request', 'version': version}), 409
+
+
+def invalidate_status_changes(applied):
+    """Drop cached listings affected by (booking row, new status) changes"""
+    approved = {row.property_id for row, status in applied if status == 'approved'}
+    for property_id in approved:
+        listing_cache.invalidate_property(property_id)
+    freed = [row for row, status in applied if row.status == 'approved']
+    if freed:
+        states = {prop.id: property_state(prop) for prop in
+                  Property.query.filter(Property.id.in_({row.property_id for row in freed}))}
+        for row in freed:
+            listing_cache.invalidate_freed_dates(row.property_id, states[row.property_id],
+                                                 row.start_date, row.end_date)
+
+
 @rentals_bp.route('/properties/<int:property_id>', methods=['PUT'])
-@jwt_required()
+@token_required()
 def update_property(property_id):
     """Update a property listing (owner only)"""
     try:
@@ -134,7 +406,12 @@ def update_property(property_id):
         if property.owner_id != current_user_id:
             return jsonify({'error': 'You can only update your own properties'}), 403
         
+        version = expected_version()
+        if version is not None and version != property.version:
+            return modified_response('Property', property.version)
+        
         data = request.get_json()
+        before = property_state(property)
         
         # Update fields
         updatable_fields = ['title', 'description', 'address', 'city', 'state', 
@@ -145,25 +422,38 @@ def update_property(property_id):
             if field in data:
                 setattr(property, field, data[field])
         
+        if 'latitude' in data or 'longitude' in data:
+            property.set_location(*location_from(data))
         if 'amenities' in data:
-            property.amenities = json.dumps(data['amenities'])
+            property.amenities = resolve_amenities(data['amenities'])
         if 'images' in data:
             property.images = json.dumps(data['images'])
         
         db.session.commit()
+        listing_cache.invalidate_property(property.id, before=before, after=property_state(property))
         
         return jsonify({
             'message': 'Property updated successfully',
             'property': property.to_dict()
         }), 200
         
+    except StaleDataError:
+        # Another request updated the row between our read and write
+        db.session.rollback()
+        current = Property.query.get(property_id)
+        if not current:
+            return jsonify({'error': 'Property not found'}), 404
+        return modified_response('Property', current.version)
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
 
 @rentals_bp.route('/properties/<int:property_id>', methods=['DELETE'])
-@jwt_required()
+@token_required()
 def delete_property(property_id):
     """Delete a property listing (owner only)"""
     try:
@@ -176,8 +466,10 @@ def delete_property(property_id):
         if property.owner_id != current_user_id:
             return jsonify({'error': 'You can only delete your own properties'}), 403
         
+        before = property_state(property)
         db.session.delete(property)
         db.session.commit()
+        listing_cache.invalidate_property(property_id, before=before)
         
         return jsonify({'message': 'Property deleted successfully'}), 200
         
@@ -187,35 +479,73 @@ def delete_property(property_id):
 
 
 @rentals_bp.route('/my-properties', methods=['GET'])
-@jwt_required()
+@token_required()
 def get_my_properties():
-    """Get all properties owned by the current user"""
+    """Get a page of properties owned by the current user"""
     try:
+        sort, limit, cursor = page_params(PROPERTY_SORTS, 'newest')
+        fields = parse_fields(request.args, PROPERTY_FIELDS, PROPERTY_SUMMARY_FIELDS)
         current_user_id = get_jwt_identity()
-        properties = Property.query.filter_by(owner_id=current_user_id).all()
+        query = Property.query.filter_by(owner_id=current_user_id)
+        properties, next_cursor = paginate(
+            query.options(*property_options(fields, sort_columns(sort))), sort, limit, cursor)
         
-        return jsonify({
-            'properties': [prop.to_dict() for prop in properties],
-            'count': len(properties)
-        }), 200
+        response = {
+            'properties': [prop.to_dict(fields) for prop in properties],
+            'next_cursor': next_cursor
+        }
+        if wants_count():
+            response['count'] = cached_count(query, scope=current_user_id)
         
+        return jsonify(response), 200
+        
+    except (PaginationError, FieldsError):
+        raise
     except Exception as e:
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
 
+def export_response(statement, to_record, columns, name):
+    """Stream a statement's rows as an NDJSON or CSV attachment, per ?format="""
+    fmt = export_format(request.args.get('format'))
+    body = stream_export(statement, to_record, fmt, columns)
+    response = current_app.response_class(stream_with_context(body),
+                                          mimetype=EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename={name}.{fmt}'
+    return response
+
+
+@rentals_bp.route('/my-properties/export', methods=['GET'])
+@token_required()
+def export_my_properties():
+    """Stream every property owned by the current user as NDJSON or CSV"""
+    try:
+        current_user_id = get_jwt_identity()
+        return export_response(owner_properties_export(current_user_id), property_record,
+                               PROPERTY_COLUMNS, 'properties')
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@rentals_bp.route('/cache-stats', methods=['GET'])
+def get_cache_stats():
+    """Get listing cache hit/miss/eviction counters (operators only, when enabled)"""
+    if not current_app.config['LISTING_CACHE_STATS_ENABLED']:
+        return jsonify({'error': 'Not found'}), 404
+    if not operator_authorized():
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify({'cache': listing_cache.stats()}), 200
+
+
 # ==================== Booking Routes ====================
 
 @rentals_bp.route('/bookings', methods=['POST'])
-@jwt_required()
+@role_required('renter', 'Only renters can create bookings')
 def create_booking():
     """Create a new booking request (renter only)"""
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
-        
-        if not user or user.user_type != 'renter':
-            return jsonify({'error': 'Only renters can create bookings'}), 403
-        
         data = request.get_json()
         
         # Validate required fields
@@ -239,6 +569,9 @@ def create_booking():
         if start_date >= end_date:
             return jsonify({'error': 'End date must be after start date'}), 400
         
+        if find_conflict(property.id, start_date, end_date):
+            return jsonify({'error': 'Property is already booked for these dates'}), 409
+        
         # Calculate total price (simple calculation based on months)
         days = (end_date - start_date).days
         months = days / 30
@@ -270,103 +603,161 @@ def create_booking():
 
 
 @rentals_bp.route('/my-bookings', methods=['GET'])
-@jwt_required()
+@token_required()
 def get_my_bookings():
-    """Get all bookings made by the current user (renter)"""
+    """Get a page of bookings made by the current user (renter)"""
     try:
+        sort, limit, cursor = page_params(BOOKING_SORTS, 'newest')
+        fields = parse_fields(request.args, BOOKING_FIELDS + ('property',),
+                              BOOKING_SUMMARY_FIELDS + ('property',))
+        property_fields = parse_fields(request.args, PROPERTY_FIELDS, PROPERTY_SUMMARY_FIELDS,
+                                       key='property_fields')
         current_user_id = get_jwt_identity()
-        bookings = Booking.query.filter_by(renter_id=current_user_id).all()
+        query = renter_bookings_query(current_user_id, with_property='property' in fields)
         
-        # Include property details
-        bookings_data = []
-        for booking in bookings:
-            booking_dict = booking.to_dict()
-            property = Property.query.get(booking.property_id)
-            booking_dict['property'] = property.to_dict() if property else None
-            bookings_data.append(booking_dict)
+        options = booking_options(fields, sort_columns(sort))
+        if 'property' in fields:
+            options += property_options(property_fields, via=Booking.property)
+        bookings, next_cursor = paginate(query.options(*options), sort, limit, cursor)
         
-        return jsonify({
+        # Include property details (eager loaded with the bookings)
+        bookings_data = [booking_data(booking, fields, property_fields) for booking in bookings]
+        
+        response = {
             'bookings': bookings_data,
-            'count': len(bookings)
-        }), 200
+            'next_cursor': next_cursor
+        }
+        if wants_count():
+            response['count'] = cached_count(query, scope=current_user_id)
+        
+        return jsonify(response), 200
         
+    except (PaginationError, FieldsError):
+        raise
     except Exception as e:
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
 
 @rentals_bp.route('/property-bookings', methods=['GET'])
-@jwt_required()
+@role_required('owner', 'Only owners can view property bookings')
 def get_property_bookings():
-    """Get all bookings for properties owned by the current user (owner)"""
+    """Get a page of bookings for properties owned by the current user (owner)"""
     try:
+        sort, limit, cursor = page_params(BOOKING_SORTS, 'newest')
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
-        
-        if not user or user.user_type != 'owner':
-            return jsonify({'error': 'Only owners can view property bookings'}), 403
-        
-        # Get all properties owned by the user
-        properties = Property.query.filter_by(owner_id=current_user_id).all()
-        property_ids = [prop.id for prop in properties]
-        
-        # Get all bookings for these properties
-        bookings = Booking.query.filter(Booking.property_id.in_(property_ids)).all()
-        
-        # Include property and renter details
-        bookings_data = []
-        for booking in bookings:
-            booking_dict = booking.to_dict()
-            property = Property.query.get(booking.property_id)
-            renter = User.query.get(booking.renter_id)
-            
-            booking_dict['property'] = property.to_dict() if property else None
-            booking_dict['renter'] = {
-                'name': f"{renter.first_name} {renter.last_name}",
-                'email': renter.email,
-                'phone': renter.phone
-            } if renter else None
-            
-            bookings_data.append(booking_dict)
+        fields = parse_fields(request.args, BOOKING_FIELDS + ('property', 'renter'),
+                              BOOKING_SUMMARY_FIELDS + ('property', 'renter'))
+        property_fields = parse_fields(request.args, PROPERTY_FIELDS, PROPERTY_SUMMARY_FIELDS,
+                                       key='property_fields')
         
-        return jsonify({
+        # Get bookings for the user's properties in a single joined query
+        query = owner_bookings_query(current_user_id)
+        options = (booking_options(fields, sort_columns(sort))
+                   + property_options(property_fields, via=Booking.property))
+        bookings, next_cursor = paginate(query.options(*options), sort, limit, cursor)
+        
+        # Include property and renter details (eager loaded with the bookings)
+        bookings_data = [booking_data(booking, fields, property_fields) for booking in bookings]
+        
+        response = {
             'bookings': bookings_data,
-            'count': len(bookings)
-        }), 200
+            'next_cursor': next_cursor
+        }
+        if wants_count():
+            response['count'] = cached_count(query, scope=current_user_id)
         
+        return jsonify(response), 200
+        
+    except (PaginationError, FieldsError):
+        raise
     except Exception as e:
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
 
-@rentals_bp.route('/bookings/<int:booking_id>/status', methods=['PUT'])
-@jwt_required()
-def update_booking_status(booking_id):
-    """Update booking status (owner only)"""
+@rentals_bp.route('/property-bookings/export', methods=['GET'])
+@role_required('owner', 'Only owners can export property bookings')
+def export_property_bookings():
+    """Stream every booking for properties owned by the current user as NDJSON or CSV"""
     try:
         current_user_id = get_jwt_identity()
-        booking = Booking.query.get(booking_id)
+        return export_response(owner_bookings_export(current_user_id), booking_record,
+                               BOOKING_COLUMNS, 'bookings')
         
-        if not booking:
-            return jsonify({'error': 'Booking not found'}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@rentals_bp.route('/owner-analytics', methods=['GET'])
+@role_required('owner', 'Only owners can view analytics')
+def get_owner_analytics():
+    """Get booking counts, revenue and monthly occupancy for the current owner's properties"""
+    try:
+        current_user_id = get_jwt_identity()
+        start, end = month_window(request.args, datetime.utcnow().date())
         
-        # Check if current user owns the property
-        property = Property.query.get(booking.property_id)
-        if not property or property.owner_id != current_user_id:
-            return jsonify({'error': 'You can only update bookings for your own properties'}), 403
+        return jsonify(owner_analytics(current_user_id, start, end)), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Server error: {str(e)}'}), 500
+
+
+@rentals_bp.route('/bookings/<int:booking_id>/status', methods=['PUT'])
+@token_required()
+def update_booking_status(booking_id):
+    """Update booking status (owner only), optionally only at the If-Match version"""
+    try:
+        current_user_id = get_jwt_identity()
         data = request.get_json()
         
-        if 'status' not in data:
+        if not data or 'status' not in data:
             return jsonify({'error': 'Status is required'}), 400
         
-        if data['status'] not in ['pending', 'approved', 'rejected', 'cancelled']:
-            return jsonify({'error': 'Invalid status'}), 400
+        # The bulk path's conditional UPDATE keeps concurrent approvals from overlapping
+        (result,), applied = update_booking_statuses(current_user_id, [{
+            'booking_id': booking_id, 'status': data['status'], 'version': expected_version()
+        }])
+        if not result['success']:
+            error = {'error': result['error']}
+            if 'version' in result:
+                error['version'] = result['version']
+            return jsonify(error), result['code']
         
-        booking.status = data['status']
-        db.session.commit()
+        invalidate_status_changes(applied)
         
         return jsonify({
             'message': 'Booking status updated successfully',
-            'booking': booking.to_dict()
+            'booking': Booking.query.get(booking_id).to_dict()
+        }), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Server error: {str(e)}'}), 500
+
+
+@rentals_bp.route('/bookings/status', methods=['PUT'])
+@token_required()
+def update_booking_statuses_bulk():
+    """Update the status of many bookings at once, reporting each one (owner only)"""
+    try:
+        current_user_id = get_jwt_identity()
+        try:
+            items = parse_status_updates(request.get_json(silent=True),
+                                         current_app.config['BULK_STATUS_MAX_ITEMS'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        results, applied = update_booking_statuses(current_user_id, items)
+        invalidate_status_changes(applied)
+        
+        return jsonify({
+            'message': 'Booking statuses updated',
+            'updated': len(applied),
+            'failed': sum(not result['success'] for result in results),
+            'results': results
         }), 200
         
     except Exception as e:
@@ -0,0 +1,153 @@
+from sqlalchemy import (MetaData, Table, Column, ForeignKey, Index, Integer, String, Text, Float,
+                        Boolean, Date, DateTime, inspect)
+from sqlalchemy.schema import CreateColumn
+from models import db
+
+# The schema as it stood when versioned migrations were introduced, which
+# migration 1 creates. Frozen: later changes are migrations of their own, and
+# the models are never read here, so migration 1 does the same thing whichever
+# code version runs it. schema_version belongs to the migration lock.
+baseline = MetaData()
+
+Table(
+    'users', baseline,
+    Column('id', Integer, primary_key=True),
+    Column('email', String(120), unique=True, nullable=False, index=True),
+    Column('password_hash', String(255), nullable=False),
+    Column('first_name', String(50), nullable=False),
+    Column('last_name', String(50), nullable=False),
+    Column('phone', String(20)),
+    Column('user_type', String(20), nullable=False),
+    Column('created_at', DateTime),
+    Column('updated_at', DateTime),
+)
+
+Table(
+    'properties', baseline,
+    Column('id', Integer, primary_key=True),
+    Column('owner_id', Integer, ForeignKey('users.id'), nullable=False),
+    Column('title', String(200), nullable=False),
+    Column('description', Text, nullable=False),
+    Column('address', String(255), nullable=False),
+    Column('city', String(100), nullable=False),
+    Column('state', String(100), nullable=False),
+    Column('zip_code', String(20), nullable=False),
+    Column('property_type', String(50), nullable=False),
+    Column('bedrooms', Integer, nullable=False),
+    Column('bathrooms', Float, nullable=False),
+    Column('square_feet', Integer),
+    Column('price_per_month', Float, nullable=False),
+    Column('is_available', Boolean),
+    Column('latitude', Float),
+    Column('longitude', Float),
+    Column('geohash', String(12)),
+    Column('images', Text),
+    Column('created_at', DateTime),
+    Column('updated_at', DateTime),
+    Index('ix_properties_available_created', 'is_available', 'created_at', 'id'),
+    Index('ix_properties_available_price', 'is_available', 'price_per_month', 'id'),
+    Index('ix_properties_available_type_price', 'is_available', 'property_type', 'price_per_month'),
+    Index('ix_properties_available_city_price', 'is_available', 'city', 'price_per_month'),
+    Index('ix_properties_geohash', 'geohash'),
+    Index('ix_properties_owner_created', 'owner_id', 'created_at', 'id'),
+    Index('ix_properties_owner_price', 'owner_id', 'price_per_month', 'id'),
+)
+
+Table(
+    'amenities', baseline,
+    Column('id', Integer, primary_key=True),
+    Column('name', String(100), unique=True, nullable=False, index=True),
+)
+
+Table(
+    'property_amenities', baseline,
+    Column('property_id', Integer, ForeignKey('properties.id', ondelete='CASCADE'), primary_key=True),
+    Column('amenity_id', Integer, ForeignKey('amenities.id'), primary_key=True),
+    Index('ix_property_amenities_amenity', 'amenity_id', 'property_id'),
+)
+
+Table(
+    'bookings', baseline,
+    Column('id', Integer, primary_key=True),
+    Column('property_id', Integer, ForeignKey('properties.id'), nullable=False),
+    Column('renter_id', Integer, ForeignKey('users.id'), nullable=False),
+    Column('start_date', Date, nullable=False),
+    Column('end_date', Date, nullable=False),
+    Column('total_price', Float, nullable=False),
+    Column('status', String(20)),
+    Column('message', Text),
+    Column('created_at', DateTime),
+    Column('updated_at', DateTime),
+    Index('ix_bookings_property_start', 'property_id', 'start_date'),
+    Index('ix_bookings_property_status_dates', 'property_id', 'status', 'start_date', 'end_date'),
+    Index('ix_bookings_renter_created', 'renter_id', 'created_at', 'id'),
+)
+
+Table(
+    'table_versions', baseline,
+    Column('name', String(50), primary_key=True),
+    Column('version', Integer, nullable=False),
+)
+
+Table(
+    'facet_counts', baseline,
+    Column('facet', String(30), primary_key=True),
+    Column('value', String(100), primary_key=True),
+    Column('count', Integer, nullable=False),
+)
+
+Table(
+    'property_booking_stats', baseline,
+    Column('property_id', Integer, ForeignKey('properties.id', ondelete='CASCADE'), primary_key=True),
+    Column('owner_id', Integer, ForeignKey('users.id'), nullable=False, index=True),
+    Column('pending', Integer, nullable=False),
+    Column('approved', Integer, nullable=False),
+    Column('rejected', Integer, nullable=False),
+    Column('cancelled', Integer, nullable=False),
+    Column('approved_revenue', Float, nullable=False),
+)
+
+Table(
+    'property_monthly_stats', baseline,
+    Column('property_id', Integer, ForeignKey('properties.id', ondelete='CASCADE'), primary_key=True),
+    Column('month', String(7), primary_key=True),
+    Column('owner_id', Integer, ForeignKey('users.id'), nullable=False),
+    Column('occupied_nights', Integer, nullable=False),
+    Column('revenue', Float, nullable=False),
+    Index('ix_property_monthly_stats_owner_month', 'owner_id', 'month'),
+)
+
+
+def add_missing_columns(metadata):
+    """Add columns of metadata's tables that existing tables lack
+
+    Columns must be nullable or have a server default to fill existing rows.
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    with db.engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {col['name'] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if not column.nullable and column.server_default is None:
+                    raise RuntimeError(f'Cannot add NOT NULL column {table.name}.{column.name}')
+                ddl = CreateColumn(column).compile(dialect=conn.dialect)
+                conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {ddl}')
+
+
+def create_baseline_schema():
+    """Migration 1: create the baseline tables and indexes
+
+    Databases created before migrations were versioned already have some or
+    all of them, possibly from older code; they get what they are missing.
+    """
+    baseline.create_all(db.engine)
+    add_missing_columns(baseline)
+    # create_all skips existing tables, so add indexes they were created without
+    for table in baseline.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
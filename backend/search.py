@@ -0,0 +1,119 @@
+import re
+from sqlalchemy import DDL, event, func, literal_column, select, table, column, text, or_
+from models import db, Property
+
+# Columns covered by the full-text index
+SEARCH_COLUMNS = ('title', 'description', 'address', 'city')
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# SQLite: an external-content FTS5 table over properties, kept in sync by triggers
+_FTS_COLUMNS = ', '.join(SEARCH_COLUMNS)
+_FTS_NEW = ', '.join(f'new.{name}' for name in SEARCH_COLUMNS)
+_FTS_OLD = ', '.join(f'old.{name}' for name in SEARCH_COLUMNS)
+
+SQLITE_FTS_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS properties_fts USING fts5("
+    f"{_FTS_COLUMNS}, content='properties', content_rowid='id', "
+    f"tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS properties_fts_ai AFTER INSERT ON properties BEGIN "
+    f"INSERT INTO properties_fts(rowid, {_FTS_COLUMNS}) VALUES (new.id, {_FTS_NEW}); END",
+    f"CREATE TRIGGER IF NOT EXISTS properties_fts_ad AFTER DELETE ON properties BEGIN "
+    f"INSERT INTO properties_fts(properties_fts, rowid, {_FTS_COLUMNS}) "
+    f"VALUES ('delete', old.id, {_FTS_OLD}); END",
+    f"CREATE TRIGGER IF NOT EXISTS properties_fts_au AFTER UPDATE OF {_FTS_COLUMNS} ON properties BEGIN "
+    f"INSERT INTO properties_fts(properties_fts, rowid, {_FTS_COLUMNS}) "
+    f"VALUES ('delete', old.id, {_FTS_OLD}); "
+    f"INSERT INTO properties_fts(rowid, {_FTS_COLUMNS}) VALUES (new.id, {_FTS_NEW}); END",
+]
+
+# PostgreSQL: a GIN index over the same tsvector expression used at query time
+PG_TSVECTOR = ("to_tsvector('english', coalesce(title, '') || ' ' || coalesce(description, '') "
+               "|| ' ' || coalesce(address, '') || ' ' || coalesce(city, ''))")
+
+POSTGRES_FTS_DDL = [
+    f"CREATE INDEX IF NOT EXISTS ix_properties_search ON properties USING GIN ({PG_TSVECTOR})",
+]
+
+for statement in SQLITE_FTS_DDL:
+    event.listen(Property.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+for statement in POSTGRES_FTS_DDL:
+    event.listen(Property.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+event.listen(Property.__table__, 'before_drop',
+             DDL('DROP TABLE IF EXISTS properties_fts').execute_if(dialect='sqlite'))
+
+properties_fts = table('properties_fts', column('rowid'))
+
+
+def ensure_search_index():
+    """Create the full-text index on an existing database, backfilling it if new"""
+    dialect = db.engine.dialect.name
+    with db.engine.begin() as conn:
+        if dialect == 'sqlite':
+            exists = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'properties_fts'"
+            )).first()
+            for statement in SQLITE_FTS_DDL:
+                conn.execute(text(statement))
+            if not exists:
+                conn.execute(text("INSERT INTO properties_fts(properties_fts) VALUES ('rebuild')"))
+        elif dialect == 'postgresql':
+            for statement in POSTGRES_FTS_DDL:
+                conn.execute(text(statement))
+
+
+def tokenize(value):
+    """Split user input into plain word tokens"""
+    return _TOKEN_RE.findall(value or '')
+
+
+def _fts5_terms(tokens):
+    # Quote every token so FTS5 operators in user input are matched literally,
+    # and prefix-match each one for search-as-you-type
+    return ' AND '.join('"{}"*'.format(token.replace('"', '""')) for token in tokens)
+
+
+def search_properties(query, q=None, city=None):
+    """Restrict a Property query to full-text matches of q and city
+
+    Returns (query, rank) where rank is a relevance expression to sort on
+    (lower is better), or None when no keyword search was applied.
+    """
+    q_tokens = tokenize(q)
+    city_tokens = tokenize(city)
+    if not q_tokens and not city_tokens:
+        return query, None
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        clauses = []
+        if q_tokens:
+            clauses.append(f'({_fts5_terms(q_tokens)})')
+        if city_tokens:
+            clauses.append(f'city : ({_fts5_terms(city_tokens)})')
+        matches = (select(properties_fts.c.rowid.label('id'),
+                          func.bm25(literal_column('properties_fts')).label('rank'))
+                   .where(literal_column('properties_fts').op('MATCH')(' AND '.join(clauses)))
+                   # Materialized so the index is searched once; as a plain subquery
+                   # SQLite may re-run the MATCH for every candidate property
+                   .cte('fts_matches').prefix_with('MATERIALIZED'))
+        query = query.join(matches, Property.id == matches.c.id)
+        return query, (matches.c.rank if q_tokens else None)
+
+    if city:
+        query = query.filter(Property.city.ilike(f'%{city}%'))
+    if not q_tokens:
+        return query, None
+
+    if dialect == 'postgresql':
+        tsquery = func.to_tsquery('english', ' & '.join(f'{token}:*' for token in q_tokens))
+        vector = literal_column(PG_TSVECTOR)
+        query = query.filter(vector.op('@@')(tsquery))
+        return query, -func.ts_rank_cd(vector, tsquery)
+
+    # Other databases: no inverted index available, fall back to substring matching
+    for token in q_tokens:
+        pattern = f'%{token}%'
+        query = query.filter(or_(*(getattr(Property, name).ilike(pattern)
+                                   for name in SEARCH_COLUMNS)))
+    return query, None
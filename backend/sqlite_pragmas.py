@@ -0,0 +1,41 @@
+import re
+from sqlalchemy import event
+
+NAME_RE = re.compile(r'^[a-z_]+$')
+VALUE_RE = re.compile(r'^-?\w+$')
+
+
+def pragma_statements(pragmas):
+    """PRAGMA statements for a {name: value} mapping, in order"""
+    statements = []
+    for name, value in pragmas.items():
+        value = str(value)
+        # PRAGMA values can't be bound as parameters, so only allow plain words and numbers
+        if not NAME_RE.match(name) or not VALUE_RE.match(value):
+            raise ValueError(f'Invalid SQLite PRAGMA {name}={value}')
+        statements.append(f'PRAGMA {name}={value}')
+    return statements
+
+
+def install_sqlite_pragmas(engine, pragmas):
+    """Run pragmas on every new connection the engine opens, if it is SQLite"""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+    statements = pragma_statements(pragmas)
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+    # Connections opened before the listener existed don't have the pragmas
+    engine.dispose()
+
+
+def current_pragmas(connection, names):
+    """The values names are set to on a connection, for checking a profile took effect"""
+    return {name: connection.exec_driver_sql(f'PRAGMA {name}').scalar() for name in names}
@@ -0,0 +1,175 @@
+import json
+import random
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, insert, select
+from models import db, User, Property, Booking, property_amenities
+from amenities import amenity_ids
+from geo import encode
+from passwords import password_hasher
+from versions import VERSIONED_MODELS, bump_version
+from facets import rebuild_facet_counts
+from analytics import rebuild_owner_analytics
+
+# Password every synthetic user signs in with
+SYNTHETIC_PASSWORD = 'password123'
+# Share of users who are owners; the rest are renters
+OWNER_SHARE = 0.2
+# Rows per INSERT batch
+SEED_BATCH_SIZE = 5000
+
+CITIES = (
+    ('Nairobi', 'Nairobi', -1.2864, 36.8172), ('Mombasa', 'Mombasa', -4.0435, 39.6682),
+    ('Austin', 'TX', 30.2672, -97.7431), ('Denver', 'CO', 39.7392, -104.9903),
+    ('Seattle', 'WA', 47.6062, -122.3321), ('Boston', 'MA', 42.3601, -71.0589),
+    ('Chicago', 'IL', 41.8781, -87.6298), ('Miami', 'FL', 25.7617, -80.1918),
+    ('Portland', 'OR', 45.5152, -122.6784), ('Atlanta', 'GA', 33.7490, -84.3880),
+    ('London', 'London', 51.5072, -0.1276), ('Lisbon', 'Lisboa', 38.7223, -9.1393),
+)
+PROPERTY_TYPES = ('apartment', 'house', 'condo', 'studio', 'townhouse')
+AMENITIES = ('wifi', 'parking', 'pool', 'gym', 'laundry', 'air conditioning', 'heating',
+             'balcony', 'garden', 'pet friendly', 'dishwasher', 'elevator')
+ADJECTIVES = ('Sunny', 'Quiet', 'Spacious', 'Modern', 'Cozy', 'Bright', 'Charming', 'Renovated')
+FEATURES = ('garden', 'view', 'terrace', 'loft', 'courtyard', 'fireplace', 'skylight', 'patio')
+BOOKING_STATUS_WEIGHTS = (('pending', 2), ('approved', 5), ('rejected', 2), ('cancelled', 1))
+# Bookings are laid out one after another per property from this date
+BOOKINGS_START = date(2024, 1, 1)
+
+
+def _batches(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= SEED_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _insert(table, rows):
+    count = 0
+    for batch in _batches(rows):
+        db.session.execute(insert(table), batch)
+        count += len(batch)
+    return count
+
+
+def _user_rows(count, first_id, password_hash, owner_count, created):
+    for index in range(count):
+        user_id = first_id + index
+        yield {
+            'id': user_id,
+            'email': f'user{user_id}@example.com',
+            'password_hash': password_hash,
+            'first_name': 'Synthetic',
+            'last_name': f'User{user_id}',
+            'phone': f'555-{user_id % 10000:04d}',
+            'user_type': 'owner' if index < owner_count else 'renter',
+            'created_at': created,
+            'updated_at': created,
+        }
+
+
+def _property_rows(rng, count, first_id, owner_ids, now):
+    for index in range(count):
+        city, state, latitude, longitude = rng.choice(CITIES)
+        latitude += rng.uniform(-0.2, 0.2)
+        longitude += rng.uniform(-0.2, 0.2)
+        bedrooms = rng.randint(0, 5)
+        created = now - timedelta(minutes=rng.randrange(2 * 365 * 24 * 60))
+        property_id = first_id + index
+        yield {
+            'id': property_id,
+            'owner_id': rng.choice(owner_ids),
+            'title': f'{rng.choice(ADJECTIVES)} {bedrooms} bedroom {rng.choice(FEATURES)} home',
+            'description': f'{rng.choice(ADJECTIVES)} place near the {rng.choice(FEATURES)} '
+                           f'in {city}. Listing {property_id}.',
+            'address': f'{rng.randint(1, 999)} {rng.choice(FEATURES).title()} Street',
+            'city': city,
+            'state': state,
+            'zip_code': f'{rng.randint(10000, 99999)}',
+            'property_type': rng.choice(PROPERTY_TYPES),
+            'bedrooms': bedrooms,
+            'bathrooms': rng.choice((1, 1.5, 2, 2.5, 3)),
+            'square_feet': rng.randint(300, 4000),
+            'price_per_month': float(rng.randrange(300, 6000, 25)),
+            'is_available': rng.random() < 0.9,
+            'latitude': latitude,
+            'longitude': longitude,
+            'geohash': encode(latitude, longitude),
+            'images': json.dumps([f'https://example.com/images/{property_id}-{n}.jpg'
+                                  for n in range(rng.randint(1, 4))]),
+            'created_at': created,
+            'updated_at': created,
+        }
+
+
+def _amenity_rows(rng, property_ids, amenity_id_by_name):
+    names = list(amenity_id_by_name)
+    for property_id in property_ids:
+        for name in rng.sample(names, rng.randint(0, 5)):
+            yield {'property_id': property_id, 'amenity_id': amenity_id_by_name[name]}
+
+
+def _booking_rows(rng, count, property_prices, renter_ids, now):
+    statuses = [status for status, _ in BOOKING_STATUS_WEIGHTS]
+    weights = [weight for _, weight in BOOKING_STATUS_WEIGHTS]
+    property_ids = list(property_prices)
+    # Spread bookings evenly, back to back, so no property is double booked
+    next_start = {}
+    for index in range(count):
+        property_id = property_ids[index % len(property_ids)]
+        start = next_start.get(property_id, BOOKINGS_START) + timedelta(days=rng.randint(0, 20))
+        end = start + timedelta(days=rng.randint(7, 120))
+        next_start[property_id] = end
+        yield {
+            'property_id': property_id,
+            'renter_id': rng.choice(renter_ids),
+            'start_date': start,
+            'end_date': end,
+            'total_price': round(property_prices[property_id] * (end - start).days / 30, 2),
+            'status': rng.choices(statuses, weights)[0],
+            'message': 'Synthetic booking request',
+            'created_at': now,
+            'updated_at': now,
+        }
+
+
+def generate_dataset(users, properties, bookings, seed=0):
+    """Bulk insert a reproducible synthetic dataset on top of whatever is there
+
+    Rows go in with Core executemany INSERTs in batches of SEED_BATCH_SIZE, then
+    the summary tables maintained by flush hooks (facet counts, booking stats)
+    are rebuilt once. Returns the number of rows inserted per table.
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    owner_count = max(1, int(users * OWNER_SHARE))
+    first_user = (db.session.scalar(select(func.max(User.id))) or 0) + 1
+    first_property = (db.session.scalar(select(func.max(Property.id))) or 0) + 1
+
+    # One hash shared by every user; hashing each would dominate the seed time
+    password_hash = password_hasher.hash(SYNTHETIC_PASSWORD)
+    counts = {'users': _insert(User, _user_rows(users, first_user, password_hash,
+                                                 owner_count, now))}
+    owner_ids = list(range(first_user, first_user + owner_count))
+    renter_ids = list(range(first_user + owner_count, first_user + users)) or owner_ids
+
+    counts['properties'] = _insert(Property, _property_rows(rng, properties, first_property,
+                                                            owner_ids, now))
+    property_ids = range(first_property, first_property + properties)
+    counts['property_amenities'] = _insert(
+        property_amenities, _amenity_rows(rng, property_ids, amenity_ids(AMENITIES)))
+
+    property_prices = dict(db.session.execute(
+        select(Property.id, Property.price_per_month).where(Property.id >= first_property)).all())
+    counts['bookings'] = _insert(Booking, _booking_rows(rng, bookings, property_prices,
+                                                         renter_ids, now)) if property_prices else 0
+    # Core inserts skip the flush hooks, so bump the table versions here
+    for name in VERSIONED_MODELS.values():
+        bump_version(db.session.connection(), name)
+    db.session.commit()
+
+    rebuild_facet_counts()
+    rebuild_owner_analytics()
+    return counts
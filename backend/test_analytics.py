@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Owner analytics tests for the Novella API
+Run with: python -m unittest test_analytics
+"""
+
+import unittest
+from sqlalchemy import text
+from analytics import rebuild_owner_analytics
+from models import db
+from testing import AppTestCase
+
+
+class OwnerAnalyticsTest(AppTestCase):
+    """Booking writes keep the stats tables equal to a rebuild, split by calendar month"""
+
+    def setUp(self):
+        super().setUp()
+        owner_id, self.owner_headers = self.create_user('owner@test.com', 'owner')
+        _, self.renter_headers = self.create_user('renter@test.com', 'renter')
+        # 3000 a month is 100 a night under the booking price calculation
+        self.flat_id = self.create_property(owner_id, price_per_month=3000)
+        self.house_id = self.create_property(owner_id, price_per_month=3000)
+
+    def book(self, property_id, start_date, end_date):
+        response = self.client.post('/api/rentals/bookings', headers=self.renter_headers, json={
+            'property_id': property_id, 'start_date': start_date, 'end_date': end_date})
+        self.assertEqual(response.status_code, 201, response.get_json())
+        return response.get_json()['booking']['id']
+
+    def set_status(self, booking_id, status):
+        response = self.client.put(f'/api/rentals/bookings/{booking_id}/status',
+                                   json={'status': status}, headers=self.owner_headers)
+        self.assertEqual(response.status_code, 200, response.get_json())
+
+    def stats(self):
+        with self.app.app_context():
+            totals = db.session.execute(text(
+                'SELECT property_id, pending, approved, rejected, cancelled, round(approved_revenue, 6) '
+                'FROM property_booking_stats ORDER BY property_id')).all()
+            months = db.session.execute(text(
+                'SELECT property_id, month, occupied_nights, round(revenue, 6) '
+                'FROM property_monthly_stats ORDER BY property_id, month')).all()
+            return totals, months
+
+    def assert_stats_match_rebuild(self):
+        incremental = self.stats()
+        with self.app.app_context():
+            rebuild_owner_analytics()
+        self.assertEqual(self.stats(), incremental)
+        return incremental
+
+    def test_bookings_across_month_boundaries(self):
+        january = self.book(self.flat_id, '2025-01-20', '2025-02-10')
+        self.assert_stats_match_rebuild()
+        self.set_status(january, 'approved')
+        self.assert_stats_match_rebuild()
+
+        # Crosses the new year and spans all of January and February
+        winter = self.book(self.house_id, '2024-12-25', '2025-03-03')
+        self.set_status(winter, 'approved')
+        cancelled = self.book(self.flat_id, '2025-02-20', '2025-03-05')
+        self.set_status(cancelled, 'approved')
+        self.assert_stats_match_rebuild()
+        self.set_status(cancelled, 'cancelled')
+        rejected = self.book(self.house_id, '2025-03-10', '2025-04-02')
+        self.set_status(rejected, 'rejected')
+
+        totals, months = self.assert_stats_match_rebuild()
+        self.assertEqual(totals, [(self.flat_id, 0, 1, 0, 1, 2100.0),
+                                  (self.house_id, 0, 1, 1, 0, 6800.0)])
+        self.assertEqual(months, [
+            (self.flat_id, '2025-01', 12, 1200.0),
+            (self.flat_id, '2025-02', 9, 900.0),
+            (self.house_id, '2024-12', 7, 700.0),
+            (self.house_id, '2025-01', 31, 3100.0),
+            (self.house_id, '2025-02', 28, 2800.0),
+            (self.house_id, '2025-03', 2, 200.0),
+        ])
+
+    def test_unapproving_removes_the_months(self):
+        booking_id = self.book(self.flat_id, '2025-01-30', '2025-02-02')
+        self.set_status(booking_id, 'approved')
+        self.assertEqual(self.assert_stats_match_rebuild()[1], [(self.flat_id, '2025-01', 2, 200.0),
+                                                                (self.flat_id, '2025-02', 1, 100.0)])
+        self.set_status(booking_id, 'cancelled')
+        self.assertEqual(self.assert_stats_match_rebuild()[1], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
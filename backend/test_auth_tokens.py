@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Token claim and user cache tests for the Novella API
+Run with: python -m unittest test_auth_tokens
+"""
+
+import unittest
+from testing import AppTestCase
+
+
+class TokenClaimsTest(AppTestCase):
+    """Role checks read the token's claims; the caller's row comes from the user cache"""
+
+    def signup(self, email, user_type):
+        response = self.client.post('/api/auth/signup', json={
+            'email': email, 'password': 'secret1', 'first_name': 'Test',
+            'last_name': 'User', 'user_type': user_type})
+        self.assertEqual(response.status_code, 201, response.get_json())
+        return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+    def setUp(self):
+        super().setUp()
+        self.owner_headers = self.signup('owner@test.com', 'owner')
+        self.renter_headers = self.signup('renter@test.com', 'renter')
+
+    def test_authenticated_requests_skip_the_user_lookup(self):
+        self.client.get('/api/auth/me', headers=self.owner_headers)
+        with self.count_queries() as statements:
+            me = self.client.get('/api/auth/me', headers=self.owner_headers)
+            bookings = self.client.get('/api/rentals/property-bookings', headers=self.owner_headers)
+            forbidden = self.client.post('/api/rentals/properties', json={},
+                                         headers=self.renter_headers)
+        self.assertEqual(me.get_json()['user']['email'], 'owner@test.com')
+        self.assertEqual(bookings.status_code, 200)
+        self.assertEqual(forbidden.status_code, 403)
+        # The renter was not cached yet: revocation is checked with one lookup
+        self.assertEqual(self.user_lookups(statements), 1)
+
+    def test_password_change_revokes_earlier_tokens(self):
+        response = self.client.put('/api/auth/change-password', headers=self.owner_headers,
+                                   json={'current_password': 'secret1', 'new_password': 'secret2'})
+        self.assertEqual(response.status_code, 200)
+        new_headers = {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+        self.assertEqual(self.client.get('/api/auth/me', headers=self.owner_headers).status_code, 401)
+        self.assertEqual(self.client.get('/api/auth/me', headers=new_headers).status_code, 200)
+
+    def test_tokens_without_claims_are_checked_against_the_user(self):
+        renter_id, legacy_headers = self.create_user('legacy@test.com', 'renter')
+        response = self.client.post('/api/rentals/properties', json={}, headers=legacy_headers)
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get('/api/rentals/my-bookings', headers=legacy_headers)
+        self.assertEqual(response.status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
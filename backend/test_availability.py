@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Availability tests for the Novella API
+Run with: python -m unittest test_availability
+"""
+
+import unittest
+from datetime import date
+from availability import find_conflict
+from models import Booking
+from testing import AppTestCase
+
+
+class AvailabilityTest(AppTestCase):
+    """Approved bookings block their dates for bookings, approvals, listings and the calendar"""
+
+    def setUp(self):
+        super().setUp()
+        owner_id, self.owner_headers = self.create_user('owner@test.com', 'owner')
+        self.renter_id, self.renter_headers = self.create_user('renter@test.com', 'renter')
+        self.property_id = self.create_property(owner_id)
+
+    def add_booking(self, start_date, end_date, status='approved'):
+        return self.create_booking(self.property_id, self.renter_id, start_date, end_date, status)
+
+    def book(self, start_date, end_date):
+        return self.client.post('/api/rentals/bookings', headers=self.renter_headers, json={
+            'property_id': self.property_id, 'start_date': start_date, 'end_date': end_date})
+
+    def listed(self, available_from, available_to):
+        response = self.client.get('/api/rentals/properties', query_string={
+            'available_from': available_from, 'available_to': available_to})
+        self.assertEqual(response.status_code, 200, response.get_json())
+        return [prop['id'] for prop in response.get_json()['properties']] == [self.property_id]
+
+    def test_bookings_and_approvals_cannot_overlap_approved_dates(self):
+        self.add_booking(date(2025, 3, 1), date(2025, 4, 1))
+        self.add_booking(date(2025, 5, 1), date(2025, 5, 10))
+        for start, end in (('2025-03-15', '2025-03-20'), ('2025-02-01', '2025-03-02'),
+                           ('2025-03-31', '2025-05-02'), ('2025-01-01', '2025-12-31')):
+            self.assertEqual(self.book(start, end).status_code, 409, (start, end))
+        # Ranges are half open: a stay may start on the day another ends
+        self.assertEqual(self.book('2025-04-01', '2025-05-01').status_code, 201)
+
+        pending = self.add_booking(date(2025, 5, 5), date(2025, 6, 1), status='pending')
+        response = self.client.put(f'/api/rentals/bookings/{pending}/status',
+                                   json={'status': 'approved'}, headers=self.owner_headers)
+        self.assertEqual(response.status_code, 409)
+
+    def test_listing_available_window(self):
+        self.add_booking(date(2025, 6, 1), date(2025, 7, 1))
+        self.assertFalse(self.listed('2025-06-10', '2025-06-20'))
+        self.assertFalse(self.listed('2025-05-01', '2025-06-02'))
+        self.assertTrue(self.listed('2025-07-01', '2025-08-01'))
+        self.assertTrue(self.listed('2025-05-01', '2025-06-01'))
+        response = self.client.get('/api/rentals/properties', query_string={'available_from': '2025-06-01'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_calendar(self):
+        self.add_booking(date(2025, 6, 1), date(2025, 6, 10))
+        self.add_booking(date(2025, 6, 20), date(2025, 7, 5))
+        self.add_booking(date(2025, 6, 12), date(2025, 6, 15), status='pending')
+        response = self.client.get(f'/api/rentals/properties/{self.property_id}/availability',
+                                   query_string={'from': '2025-06-05', 'to': '2025-07-01'})
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual([(r['start_date'], r['end_date']) for r in data['booked']],
+                         [('2025-06-01', '2025-06-10'), ('2025-06-20', '2025-07-05')])
+        self.assertEqual([(r['start_date'], r['end_date']) for r in data['available']],
+                         [('2025-06-10', '2025-06-20')])
+        self.assertEqual(self.client.get('/api/rentals/properties/999999/availability').status_code, 404)
+        response = self.client.get(f'/api/rentals/properties/{self.property_id}/availability',
+                                   query_string={'from': '2025-07-01', 'to': '2025-06-01'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_legacy_overlapping_approvals_still_block_their_dates(self):
+        # Approved before overlaps were checked: a short stay inside a long one
+        long_stay = self.add_booking(date(2025, 1, 1), date(2025, 3, 1))
+        short_stay = self.add_booking(date(2025, 1, 10), date(2025, 1, 15))
+        self.add_booking(date(2025, 2, 20), date(2025, 4, 1))
+        with self.app.app_context():
+            self.assertEqual(find_conflict(self.property_id, date(2025, 2, 1), date(2025, 2, 5)).id,
+                             long_stay)
+            self.assertEqual(find_conflict(self.property_id, date(2025, 1, 11), date(2025, 1, 12),
+                                           exclude_id=long_stay).id, short_stay)
+            self.assertEqual(Booking.query.filter_by(status='approved').count(), 3)
+        self.assertEqual(self.book('2025-02-01', '2025-02-05').status_code, 409)
+        self.assertFalse(self.listed('2025-02-01', '2025-02-05'))
+        self.assertTrue(self.listed('2025-04-01', '2025-05-01'))
+        response = self.client.get(f'/api/rentals/properties/{self.property_id}/availability',
+                                   query_string={'from': '2025-01-01', 'to': '2025-05-01'})
+        self.assertEqual([(r['start_date'], r['end_date']) for r in response.get_json()['available']],
+                         [('2025-04-01', '2025-05-01')])
+
+if __name__ == '__main__':
+    unittest.main()
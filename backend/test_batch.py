@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Batch endpoint tests for the Novella API
+Run with: python -m unittest test_batch
+"""
+
+import unittest
+from unittest import mock
+from flask_jwt_extended import view_decorators
+from models import db, User
+from auth_tokens import issue_token, user_cache
+from passwords import password_hasher
+from testing import AppTestCase
+
+
+class BatchRequestTest(AppTestCase):
+    """POST /api/batch runs dashboard calls in one round trip as one caller"""
+
+    DASHBOARD = [
+        {'id': 'me', 'method': 'GET', 'path': '/api/auth/me'},
+        {'id': 'properties', 'method': 'GET', 'path': '/api/rentals/my-properties?limit=5'},
+        {'id': 'bookings', 'method': 'GET', 'path': '/api/rentals/property-bookings'},
+    ]
+
+    def setUp(self):
+        super().setUp()
+        owner_id, self.owner_headers = self.create_user('owner@test.com', 'owner')
+        renter_id, _ = self.create_user('renter@test.com', 'renter')
+        self.create_bookings([self.create_property(owner_id)], [renter_id], 3)
+
+    def test_matches_separate_requests_with_fewer_statements(self):
+        separate = {}
+        user_cache.clear()
+        with self.count_queries() as separate_statements:
+            for item in self.DASHBOARD:
+                response = self.client.get(item['path'], headers=self.owner_headers)
+                separate[item['id']] = (response.status_code, response.get_json())
+
+        user_cache.clear()
+        with self.count_queries() as batch_statements:
+            response = self.client.post('/api/batch', json={'requests': self.DASHBOARD},
+                                        headers=self.owner_headers)
+        self.assertEqual(response.status_code, 200)
+        results = response.get_json()['responses']
+        self.assertEqual([result['id'] for result in results], ['me', 'properties', 'bookings'])
+        for result in results:
+            self.assertEqual((result['status'], result['body']), separate[result['id']])
+            self.assertEqual(result['headers']['Content-Type'], 'application/json')
+        # The owner is looked up once for the whole batch
+        self.assertEqual(self.user_lookups(batch_statements), 1)
+        self.assertLessEqual(len(batch_statements), len(separate_statements))
+
+    def test_token_is_decoded_once(self):
+        decode_token = mock.Mock(wraps=view_decorators.decode_token)
+        with mock.patch.object(view_decorators, 'decode_token', decode_token):
+            response = self.client.post('/api/batch', json={'requests': self.DASHBOARD},
+                                        headers=self.owner_headers)
+        self.assertEqual([result['status'] for result in response.get_json()['responses']],
+                         [200, 200, 200])
+        self.assertEqual(decode_token.call_count, 1)
+
+    def test_password_change_revokes_the_token_for_later_sub_requests(self):
+        with self.app.app_context():
+            owner = User.query.filter_by(email='owner@test.com').one()
+            owner.password_hash = password_hasher.hash('secret1')
+            db.session.commit()
+            headers = {'Authorization': f'Bearer {issue_token(owner)}'}
+        response = self.client.post('/api/batch', headers=headers, json={'requests': [
+            {'method': 'PUT', 'path': '/api/auth/change-password',
+             'body': {'current_password': 'secret1', 'new_password': 'secret2'}},
+            {'method': 'GET', 'path': '/api/auth/me'},
+        ]})
+        self.assertEqual([result['status'] for result in response.get_json()['responses']],
+                         [200, 401])
+
+    def test_writes_are_seen_by_later_sub_requests(self):
+        response = self.client.post('/api/batch', headers=self.owner_headers, json={'requests': [
+            {'method': 'PUT', 'path': '/api/auth/update-profile', 'body': {'first_name': 'Batched'}},
+            {'method': 'GET', 'path': '/api/auth/me'},
+        ]})
+        first, second = response.get_json()['responses']
+        self.assertEqual(first['status'], 200, first['body'])
+        self.assertEqual(second['body']['user']['first_name'], 'Batched')
+
+    def test_sub_requests_fail_independently(self):
+        response = self.client.post('/api/batch', json={'requests': [
+            {'method': 'GET', 'path': '/api/auth/me'},
+            {'method': 'GET', 'path': '/api/rentals/properties'},
+            {'method': 'GET', 'path': '/api/rentals/no-such-route'},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        statuses = [result['status'] for result in response.get_json()['responses']]
+        self.assertEqual(statuses, [401, 200, 404])
+
+    def test_rejects_malformed_batches(self):
+        for body in ({}, {'requests': []}, {'requests': [{'path': 'http://example.com/'}]},
+                     {'requests': [{'method': 'TRACE', 'path': '/api/auth/me'}]},
+                     {'requests': [{'method': 'POST', 'path': '/api/batch'}]},
+                     {'requests': [{'path': '/api/auth/me'}] * 21}):
+            response = self.client.post('/api/batch', json=body, headers=self.owner_headers)
+            self.assertEqual(response.status_code, 400, body)
+
+
+if __name__ == '__main__':
+    unittest.main()
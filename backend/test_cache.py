@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Listing cache tests for the Novella API
+Run with: python -m unittest test_cache
+"""
+
+import time
+import unittest
+from datetime import date
+from cache import ListingCache, ENTRY_OVERHEAD, TTLCache, listing_cache, property_matches
+from models import db, Property
+from testing import AppTestCase
+
+
+def state(**values):
+    """A property_state() snapshot with defaults for the fields a test doesn't set"""
+    return dict({'id': 1, 'is_available': True, 'property_type': 'apartment',
+                 'price_per_month': 1000, 'bedrooms': 2, 'amenities': {'wifi'},
+                 'city_tokens': ['nairobi'], 'text_tokens': ['sunny', 'flat', 'nairobi']}, **values)
+
+
+class TTLCacheTest(unittest.TestCase):
+    """The TTL cache behind the count and user caches"""
+
+    def setUp(self):
+        self.cache = TTLCache(max_entries=2)
+        self.computed = []
+
+    def get(self, key, ttl=60, value='value'):
+        def compute():
+            self.computed.append(key)
+            return value
+        return self.cache.get_or_compute(key, ttl, compute)
+
+    def test_computes_once_per_ttl(self):
+        self.assertEqual(self.get('a'), 'value')
+        self.assertEqual(self.get('a', value='changed'), 'value')
+        self.get('expired', ttl=0)
+        self.get('expired', ttl=0)
+        self.assertEqual(self.computed, ['a', 'expired', 'expired'])
+
+    def test_does_not_cache_missing_values(self):
+        self.assertIsNone(self.get('a', value=None))
+        self.assertEqual(self.get('a'), 'value')
+        self.assertEqual(self.computed, ['a', 'a'])
+
+    def test_invalidate_drops_one_key(self):
+        self.get('a')
+        self.get('b')
+        self.cache.invalidate('a')
+        self.get('a')
+        self.get('b')
+        self.assertEqual(self.computed, ['a', 'b', 'a'])
+
+    def test_full_cache_purges_expired_entries_first(self):
+        self.get('live')
+        self.get('expired', ttl=0)
+        self.get('new')
+        self.get('live')
+        self.assertEqual(self.computed, ['live', 'expired', 'new'])
+        # Nothing had expired, so the whole cache was dropped
+        self.get('newer')
+        self.get('live')
+        self.assertEqual(self.computed[3:], ['newer', 'live'])
+
+
+class ListingCacheTest(unittest.TestCase):
+    """Matching, LRU eviction under the byte bound, and counters"""
+
+    def setUp(self):
+        self.cache = ListingCache()
+
+    def add(self, key, filters=None, property_ids=(), size=100):
+        self.cache.set(key, b'x' * size, f'"{key}"', filters or {}, property_ids)
+
+    def test_property_matches(self):
+        prop = state()
+        self.assertTrue(property_matches({}, prop))
+        self.assertTrue(property_matches({'city': 'nair', 'q': 'sunny', 'max_price': 1000,
+                                          'amenities': ['wifi'], 'bedrooms': 2}, prop))
+        for filters in ({'city': 'mombasa'}, {'q': 'dark'}, {'property_type': 'house'},
+                        {'min_price': 1001}, {'bedrooms': 3}, {'amenities': ['wifi', 'pool']}):
+            self.assertFalse(property_matches(filters, prop), filters)
+        self.assertTrue(property_matches({'amenities': ['wifi', 'pool'], 'amenities_match': 'any'}, prop))
+        self.assertFalse(property_matches({}, state(is_available=False)))
+        self.assertFalse(property_matches({}, None))
+
+    def test_invalidate_property_keeps_unrelated_entries(self):
+        self.add('listed', {'city': 'mombasa'}, property_ids=[1])
+        self.add('old_state', {'property_type': 'apartment'})
+        self.add('new_state', {'property_type': 'house'})
+        self.add('unrelated', {'property_type': 'villa'}, property_ids=[2])
+        dropped = self.cache.invalidate_property(1, before=state(), after=state(property_type='house'))
+        self.assertEqual(dropped, 3)
+        self.assertIsNone(self.cache.get('listed'))
+        self.assertIsNone(self.cache.get('old_state'))
+        self.assertIsNone(self.cache.get('new_state'))
+        self.assertIsNotNone(self.cache.get('unrelated'))
+        self.assertEqual(self.cache.invalidations, 3)
+
+    def test_invalidate_freed_dates_only_drops_overlapping_windows(self):
+        june, august = (date(2025, 6, 1), date(2025, 7, 1)), (date(2025, 8, 1), date(2025, 9, 1))
+        self.add('june', {'available': june})
+        self.add('june_houses', {'available': june, 'property_type': 'house'})
+        self.add('august', {'available': august})
+        self.add('undated', {})
+        self.cache.invalidate_freed_dates(1, state(), date(2025, 6, 10), date(2025, 6, 20))
+        self.assertEqual([key for key in ('june', 'june_houses', 'august', 'undated')
+                          if self.cache.get(key) is not None], ['june_houses', 'august', 'undated'])
+
+    def test_evicts_least_recently_used_within_max_bytes(self):
+        entry_size = 100 + ENTRY_OVERHEAD
+        self.cache.max_bytes = 3 * entry_size
+        for key in ('a', 'b', 'c'):
+            self.add(key)
+        self.cache.get('a')
+        self.add('d')
+        self.assertLessEqual(self.cache.bytes, self.cache.max_bytes)
+        self.assertEqual(self.cache.bytes, 3 * entry_size)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.evictions, 1)
+        for key in ('a', 'c', 'd'):
+            self.assertIsNotNone(self.cache.get(key))
+
+        # Entries over the per-entry bound are never stored
+        self.cache.max_entry_bytes = entry_size - 1
+        self.add('large')
+        self.assertIsNone(self.cache.get('large'))
+        self.assertEqual(self.cache.bytes, 3 * entry_size)
+
+    def test_counts_hits_misses_and_expirations(self):
+        self.add('fresh')
+        self.cache.ttl = 0
+        self.add('expired')
+        self.cache.get('fresh')
+        self.cache.get('expired')
+        self.cache.get('missing')
+        self.assertEqual((self.cache.hits, self.cache.misses, self.cache.expirations), (1, 2, 1))
+        self.assertEqual(self.cache.bytes, 100 + ENTRY_OVERHEAD)
+
+
+class ListingCacheInvalidationTest(AppTestCase):
+    """Property and booking writes drop only the cached listings they affect; the rest keep serving"""
+
+    def setUp(self):
+        super().setUp()
+        owner_id, self.headers = self.create_user('owner@test.com', 'owner')
+        self.renter_id, _ = self.create_user('renter@test.com', 'renter')
+        self.property_id = self.create_property(owner_id, title='Sunny flat')
+
+    def cache_listings(self, *queries):
+        for query in queries:
+            response = self.client.get('/api/rentals/properties', query_string=query)
+            self.assertEqual(response.headers['X-Cache'], 'MISS')
+
+    def served_from_cache(self, *queries):
+        """The queries whose listing is answered from the cache"""
+        return [query for query in queries if self.client.get(
+            '/api/rentals/properties', query_string=query).headers['X-Cache'] == 'HIT']
+
+    def listed(self, query):
+        response = self.client.get('/api/rentals/properties', query_string=query)
+        return [prop['id'] for prop in response.get_json()['properties']]
+
+    def test_update_drops_affected_listings(self):
+        apartments, houses, mombasa = ({'property_type': 'apartment'}, {'property_type': 'house'},
+                                       {'city': 'Mombasa'})
+        self.cache_listings(apartments, houses, mombasa)
+        response = self.client.put(f'/api/rentals/properties/{self.property_id}',
+                                   json={'property_type': 'house'}, headers=self.headers)
+        self.assertEqual(response.status_code, 200, response.get_json())
+        self.assertEqual(self.served_from_cache(apartments, houses, mombasa), [mombasa])
+        self.assertEqual(self.listed(houses), [self.property_id])
+        self.assertEqual(self.listed(apartments), [])
+
+    def test_create_drops_matching_listings(self):
+        nairobi, villas, cheap = {'city': 'Nairobi'}, {'property_type': 'villa'}, {'max_price': '500'}
+        self.cache_listings(nairobi, villas, cheap)
+        response = self.client.post('/api/rentals/properties', headers=self.headers, json={
+            'title': 'Villa', 'description': 'A villa', 'address': '2 Main St', 'city': 'Nairobi',
+            'state': 'Nairobi', 'zip_code': '00100', 'property_type': 'villa', 'bedrooms': 4,
+            'bathrooms': 3, 'price_per_month': 5000})
+        self.assertEqual(response.status_code, 201, response.get_json())
+        self.assertEqual(self.served_from_cache(nairobi, villas, cheap), [cheap])
+        self.assertEqual(len(self.listed(nairobi)), 2)
+
+    def test_delete_drops_listings_containing_it(self):
+        nairobi, villas = {'city': 'Nairobi'}, {'property_type': 'villa'}
+        self.cache_listings(nairobi, villas)
+        response = self.client.delete(f'/api/rentals/properties/{self.property_id}',
+                                      headers=self.headers)
+        self.assertEqual(response.status_code, 200, response.get_json())
+        self.assertEqual(self.served_from_cache(nairobi, villas), [villas])
+        self.assertEqual(self.listed(nairobi), [])
+
+    def test_approval_drops_listings_containing_the_property(self):
+        booking_id = self.create_booking(self.property_id, self.renter_id, date(2025, 6, 1),
+                                         date(2025, 7, 1))
+        june = {'available_from': '2025-06-10', 'available_to': '2025-06-20'}
+        villas = dict(june, property_type='villa')
+        self.cache_listings(june, villas)
+        response = self.client.put(f'/api/rentals/bookings/{booking_id}/status',
+                                   json={'status': 'approved'}, headers=self.headers)
+        self.assertEqual(response.status_code, 200, response.get_json())
+        self.assertEqual(self.served_from_cache(june, villas), [villas])
+        self.assertEqual(self.listed(june), [])
+
+    def test_unapproval_drops_listings_for_the_freed_dates(self):
+        booking_id = self.create_booking(self.property_id, self.renter_id, date(2025, 6, 1),
+                                         date(2025, 7, 1), status='approved')
+        june = {'available_from': '2025-06-10', 'available_to': '2025-06-20'}
+        june_houses = dict(june, property_type='house')
+        self.cache_listings(june, june_houses)
+        response = self.client.put(f'/api/rentals/bookings/{booking_id}/status',
+                                   json={'status': 'cancelled'}, headers=self.headers)
+        self.assertEqual(response.status_code, 200, response.get_json())
+        self.assertEqual(self.served_from_cache(june, june_houses), [june_houses])
+        self.assertEqual(self.listed(june), [self.property_id])
+
+    def test_unrelated_write_keeps_serving_cached_listings(self):
+        villas = self.client.get('/api/rentals/properties', query_string={'property_type': 'villa'})
+        self.assertEqual(villas.headers['X-Cache'], 'MISS')
+        self.cache_listings({'property_type': 'apartment'})
+        response = self.client.put(f'/api/rentals/properties/{self.property_id}',
+                                   json={'price_per_month': 1500}, headers=self.headers)
+        self.assertEqual(response.status_code, 200, response.get_json())
+
+        response = self.client.get('/api/rentals/properties', query_string={'property_type': 'villa'})
+        self.assertEqual(response.headers['X-Cache'], 'HIT')
+        self.assertEqual(response.headers['ETag'], villas.headers['ETag'])
+        response = self.client.get('/api/rentals/properties', query_string={'property_type': 'villa'},
+                                   headers={'If-None-Match': villas.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get('/api/rentals/properties', query_string={'property_type': 'apartment'})
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+        self.assertEqual(response.get_json()['properties'][0]['price_per_month'], 1500)
+
+    def test_write_from_another_worker_is_served_until_the_ttl(self):
+        listing_cache.ttl = 0.2
+        self.cache_listings({})
+        # Written outside this process's request path, so nothing invalidated the cache
+        with self.app.app_context():
+            db.session.get(Property, self.property_id).price_per_month = 1500
+            db.session.commit()
+        response = self.client.get('/api/rentals/properties')
+        self.assertEqual(response.headers['X-Cache'], 'HIT')
+        self.assertEqual(response.get_json()['properties'][0]['price_per_month'], 1000)
+        time.sleep(0.25)
+        response = self.client.get('/api/rentals/properties')
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+        self.assertEqual(response.get_json()['properties'][0]['price_per_month'], 1500)
+
+    def test_stats_are_only_served_to_operators(self):
+        self.assertEqual(self.client.get('/api/rentals/cache-stats').status_code, 404)
+        self.app.config.update(LISTING_CACHE_STATS_ENABLED=True, METRICS_TOKEN='secret')
+        for headers in ({}, self.headers):
+            response = self.client.get('/api/rentals/cache-stats', headers=headers)
+            self.assertEqual(response.status_code, 401)
+        response = self.client.get('/api/rentals/cache-stats',
+                                   headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('hits', response.get_json()['cache'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Concurrent write tests for the Novella API
+Many threads write to the same rows at once through the test client, against
+a SQLite file in WAL mode as in production.
+Run with: python -m unittest test_concurrency
+"""
+
+import threading
+import unittest
+from datetime import date, timedelta
+from config import ProductionConfig
+from models import db, Property, Booking
+from testing import AppTestCase
+
+THREADS = 12
+
+
+def run_together(target, count=THREADS):
+    """Run target(index) on count threads released at the same moment"""
+    barrier = threading.Barrier(count)
+    errors = []
+
+    def run(index):
+        try:
+            barrier.wait()
+            target(index)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(60)
+    if errors:
+        raise errors[0]
+
+
+class ConcurrentWritesTest(AppTestCase):
+    """Row versions and guarded approvals keep concurrent writers from losing updates"""
+
+    database_file = True
+    settings = {'SQLITE_PRAGMAS': ProductionConfig.SQLITE_PRAGMAS, 'LISTING_CACHE_ENABLED': False}
+
+    def setUp(self):
+        super().setUp()
+        owner_id, self.headers = self.create_user('owner@test.com', 'owner')
+        self.renter_id, _ = self.create_user('renter@test.com', 'renter')
+        self.property_id = self.create_property(owner_id)
+
+    def add_bookings(self, count):
+        """count pending bookings that all overlap one another"""
+        with self.app.app_context():
+            bookings = [Booking(property_id=self.property_id, renter_id=self.renter_id,
+                                start_date=date(2025, 6, 1) + timedelta(days=index),
+                                end_date=date(2025, 7, 1) + timedelta(days=index),
+                                total_price=1000) for index in range(count)]
+            db.session.add_all(bookings)
+            db.session.commit()
+            return [booking.id for booking in bookings]
+
+    def approved(self):
+        with self.app.app_context():
+            return Booking.query.filter_by(property_id=self.property_id, status='approved').count()
+
+    def test_no_double_approval(self):
+        booking_ids = self.add_bookings(THREADS)
+        statuses = [None] * THREADS
+
+        def approve(index):
+            response = self.app.test_client().put(
+                f'/api/rentals/bookings/{booking_ids[index]}/status',
+                json={'status': 'approved'}, headers=self.headers)
+            statuses[index] = response.status_code
+
+        run_together(approve)
+        self.assertEqual(sorted(statuses), [200] + [409] * (THREADS - 1))
+        self.assertEqual(self.approved(), 1)
+
+    def test_no_double_approval_in_bulk(self):
+        booking_ids = self.add_bookings(THREADS * 2)
+
+        def approve(index):
+            # Each request approves two overlapping bookings of its own; the
+            # second always fails the in-request check
+            response = self.app.test_client().put('/api/rentals/bookings/status', json={'updates': [
+                {'booking_id': booking_ids[2 * index], 'status': 'approved'},
+                {'booking_id': booking_ids[2 * index + 1], 'status': 'approved'},
+            ]}, headers=self.headers)
+            self.assertEqual(response.status_code, 200)
+
+        run_together(approve)
+        self.assertEqual(self.approved(), 1)
+
+    def test_if_match_prevents_lost_updates(self):
+        rounds = 3
+
+        def increment(index):
+            client = self.app.test_client()
+            done = 0
+            while done < rounds:
+                read = client.get(f'/api/rentals/properties/{self.property_id}')
+                prop = read.get_json()['property']
+                response = client.put(f'/api/rentals/properties/{self.property_id}',
+                                      json={'price_per_month': prop['price_per_month'] + 1},
+                                      headers=dict(self.headers, **{'If-Match': read.headers['ETag']}))
+                if response.status_code == 200:
+                    done += 1
+                else:
+                    self.assertEqual(response.status_code, 409, response.get_json())
+
+        run_together(increment)
+        with self.app.app_context():
+            prop = db.session.get(Property, self.property_id)
+            self.assertEqual(prop.price_per_month, 1000 + THREADS * rounds)
+            self.assertEqual(prop.version, 1 + THREADS * rounds)
+
+    def test_stale_if_match_is_rejected(self):
+        url = f'/api/rentals/properties/{self.property_id}'
+        client = self.app.test_client()
+        response = client.put(url, json={'title': 'Renamed'},
+                              headers=dict(self.headers, **{'If-Match': '"1"'}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['property']['version'], 2)
+        response = client.put(url, json={'title': 'Stale'},
+                              headers=dict(self.headers, **{'If-Match': '"1"'}))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.get_json()['version'], 2)
+
+    def test_detail_etag_is_the_if_match_validator(self):
+        url = f'/api/rentals/properties/{self.property_id}'
+        client = self.app.test_client()
+        etag = client.get(url).headers['ETag']
+        self.assertTrue(etag.startswith('"1-'), etag)
+        self.assertEqual(client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+        response = client.put(url, json={'title': 'Renamed'},
+                              headers=dict(self.headers, **{'If-Match': etag}))
+        self.assertEqual(response.status_code, 200)
+        response = client.put(url, json={'title': 'Stale'},
+                              headers=dict(self.headers, **{'If-Match': etag}))
+        self.assertEqual(response.status_code, 409)
+        read = client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(read.status_code, 200)
+        self.assertTrue(read.headers['ETag'].startswith('"2-'), read.headers['ETag'])
+        response = client.put(url, json={'title': 'Fresh'},
+                              headers=dict(self.headers, **{'If-Match': read.headers['ETag']}))
+        self.assertEqual(response.status_code, 200)
+        response = client.put(url, json={'title': 'Bad'},
+                              headers=dict(self.headers, **{'If-Match': '"not-a-version"'}))
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Streaming export tests for the Novella API
+Run with: python -m unittest test_exporter
+"""
+
+import csv
+import io
+import json
+import unittest
+from datetime import date, timedelta
+from amenities import resolve_amenities
+from exporter import EXPORT_YIELD_PER
+from models import db, Booking, Property
+from testing import AppTestCase
+
+# Enough rows to span several database cursor batches
+ROWS = 2 * EXPORT_YIELD_PER + 500
+
+
+class ExporterTest(AppTestCase):
+    """NDJSON and CSV exports of an owner's properties and bookings"""
+
+    def setUp(self):
+        super().setUp()
+        self.owner_id, self.headers = self.create_user('owner@test.com', 'owner')
+        self.other_owner_id, self.other_headers = self.create_user('other@test.com', 'owner')
+        self.renter_id, _ = self.create_user('renter@test.com', 'renter')
+
+    def add_properties(self, owner_id, count):
+        with self.app.app_context():
+            properties = [Property(owner_id=owner_id, title=f'Flat {i}', description='A flat',
+                                   address=f'{i} Main St', city='Nairobi', state='Nairobi',
+                                   zip_code='00100', property_type='apartment', bedrooms=2,
+                                   bathrooms=1, price_per_month=1000 + i) for i in range(count)]
+            db.session.add_all(properties)
+            db.session.commit()
+            return [prop.id for prop in properties]
+
+    def export(self, path, fmt, headers=None):
+        response = self.client.get(path, query_string={'format': fmt},
+                                   headers=headers or self.headers)
+        self.assertEqual(response.status_code, 200)
+        body = response.get_data(as_text=True)
+        if fmt == 'csv':
+            return list(csv.DictReader(io.StringIO(body)))
+        return [json.loads(line) for line in body.splitlines()]
+
+    def test_property_exports_contain_every_row(self):
+        property_ids = self.add_properties(self.owner_id, ROWS)
+        self.add_properties(self.other_owner_id, 3)
+        for fmt in ('ndjson', 'csv'):
+            records = self.export('/api/rentals/my-properties/export', fmt)
+            self.assertEqual([int(record['id']) for record in records], property_ids, fmt)
+            self.assertEqual(records[-1]['title'], f'Flat {ROWS - 1}')
+
+    def test_booking_exports_contain_every_row(self):
+        property_ids = self.add_properties(self.owner_id, 2)
+        other_property_id, = self.add_properties(self.other_owner_id, 1)
+        with self.app.app_context():
+            bookings = [Booking(property_id=property_id, renter_id=self.renter_id,
+                                start_date=date(2025, 1, 1) + timedelta(days=i),
+                                end_date=date(2025, 1, 2) + timedelta(days=i), total_price=100)
+                        for property_id in property_ids + [other_property_id]
+                        for i in range(ROWS // 2)]
+            db.session.add_all(bookings)
+            db.session.commit()
+            expected = sorted(booking.id for booking in bookings
+                              if booking.property_id != other_property_id)
+        for fmt in ('ndjson', 'csv'):
+            records = self.export('/api/rentals/property-bookings/export', fmt)
+            self.assertEqual(sorted(int(record['id']) for record in records), expected, fmt)
+            self.assertEqual(records[0]['renter_email'], 'renter@test.com')
+
+    def test_csv_export_imports_back(self):
+        cottage_id = self.create_property(
+            self.owner_id, title='Garden cottage', square_feet=900, latitude=-1.29, longitude=36.82,
+            images='["https://img/1.jpg", "https://img/2.jpg"]')
+        self.create_property(self.owner_id, title='Loft, "top floor"', description='Line one\nline two')
+        with self.app.app_context():
+            db.session.get(Property, cottage_id).amenities = resolve_amenities(['wifi', 'parking'])
+            db.session.commit()
+
+        response = self.client.get('/api/rentals/my-properties/export', query_string={'format': 'csv'},
+                                   headers=self.headers)
+        response = self.client.post('/api/rentals/properties/import', data=response.get_data(),
+                                    content_type='text/csv', headers=self.other_headers)
+        self.assertEqual(response.status_code, 200, response.get_json())
+        self.assertEqual((response.get_json()['imported'], response.get_json()['failed']), (2, 0))
+
+        def listing(headers):
+            records = self.export('/api/rentals/my-properties/export', 'ndjson', headers)
+            for record in records:
+                for key in ('id', 'owner_id', 'created_at', 'updated_at', 'version'):
+                    record.pop(key, None)
+                record['amenities'] = sorted(record['amenities'])
+            return records
+
+        exported = listing(self.headers)
+        self.assertEqual(len(exported), 2)
+        self.assertEqual(exported[0]['amenities'], ['parking', 'wifi'])
+        self.assertEqual(listing(self.other_headers), exported)
+
+
+if __name__ == '__main__':
+    unittest.main()
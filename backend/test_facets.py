@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Stored facet count tests for the Novella API
+Run with: python -m unittest test_facets
+"""
+
+import unittest
+from facets import rebuild_facet_counts
+from models import db, FacetCount
+from testing import AppTestCase
+
+
+class FacetCountsTest(AppTestCase):
+    """Writes keep facet_counts equal to a rebuild from the properties table"""
+
+    def setUp(self):
+        super().setUp()
+        owner_id, self.headers = self.create_user('owner@test.com', 'owner')
+        self.property_id = self.create_property(owner_id)
+
+    def assert_counts_match_rebuild(self):
+        with self.app.app_context():
+            stored = {(row.facet, row.value): row.count for row in FacetCount.query}
+            rebuild_facet_counts()
+            rebuilt = {(row.facet, row.value): row.count for row in FacetCount.query}
+            db.session.remove()
+        self.assertEqual(stored, rebuilt)
+        return stored
+
+    def post(self, **values):
+        response = self.client.post('/api/rentals/properties', headers=self.headers, json=dict({
+            'title': 'House', 'description': 'A house', 'address': '2 Main St', 'city': 'Mombasa',
+            'state': 'Mombasa', 'zip_code': '80100', 'property_type': 'house', 'bedrooms': 3,
+            'bathrooms': 2, 'price_per_month': 2500}, **values))
+        self.assertEqual(response.status_code, 201, response.get_json())
+        return response.get_json()['property']['id']
+
+    def put(self, property_id, **values):
+        response = self.client.put(f'/api/rentals/properties/{property_id}', json=values,
+                                   headers=self.headers)
+        self.assertEqual(response.status_code, 200, response.get_json())
+
+    def test_create(self):
+        self.post()
+        counts = self.assert_counts_match_rebuild()
+        self.assertEqual(counts[('city', 'Mombasa')], 1)
+        self.assertEqual(counts[('price', '2000-3000')], 1)
+
+    def test_updates(self):
+        house_id = self.post()
+        for values in ({'city': 'Kisumu'}, {'property_type': 'villa'}, {'bedrooms': 5},
+                       {'price_per_month': 400}, {'price_per_month': 6000},
+                       {'is_available': False}, {'city': 'Nakuru', 'price_per_month': 900},
+                       {'is_available': True}):
+            self.put(house_id, **values)
+            self.assert_counts_match_rebuild()
+        counts = self.assert_counts_match_rebuild()
+        self.assertEqual(counts[('city', 'Nakuru')], 1)
+        self.assertNotIn(('city', 'Kisumu'), counts)
+        self.assertEqual(counts[('price', '500-1000')], 1)
+
+    def test_unlisted_property_changes_nothing(self):
+        self.put(self.property_id, is_available=False)
+        before = self.assert_counts_match_rebuild()
+        self.put(self.property_id, city='Kisumu', price_per_month=5000)
+        self.assertEqual(self.assert_counts_match_rebuild(), before)
+        self.assertEqual(before, {})
+
+    def test_delete(self):
+        house_id = self.post()
+        for property_id in (house_id, self.property_id):
+            response = self.client.delete(f'/api/rentals/properties/{property_id}',
+                                          headers=self.headers)
+            self.assertEqual(response.status_code, 200, response.get_json())
+            self.assert_counts_match_rebuild()
+        self.assertEqual(self.assert_counts_match_rebuild(), {})
+
+    def test_bulk_import(self):
+        self.app.config['IMPORT_BATCH_SIZE'] = 2
+        upload = '\n'.join(
+            ['title,description,address,city,state,zip_code,property_type,bedrooms,bathrooms,price_per_month']
+            + [f'Flat {i},A flat,{i} Main St,{city},Kenya,00100,{kind},{i % 4 + 1},1,{price}'
+               for i, (city, kind, price) in enumerate([('Nairobi', 'apartment', 800),
+                                                        ('Mombasa', 'house', 1200),
+                                                        ('Kisumu', 'apartment', 3100),
+                                                        ('Nairobi', 'studio', 450),
+                                                        ('Nakuru', 'house', 7000)])]
+            + ['Bad row,missing,fields'])
+        response = self.client.post('/api/rentals/properties/import', data=upload,
+                                    content_type='text/csv', headers=self.headers)
+        self.assertEqual(response.status_code, 200, response.get_json())
+        self.assertEqual((response.get_json()['imported'], response.get_json()['failed']), (5, 1))
+        counts = self.assert_counts_match_rebuild()
+        self.assertEqual(counts[('city', 'Nairobi')], 3)
+        self.assertEqual(counts[('property_type', 'apartment')], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Sparse fieldset (fields=) tests for the Novella API
+Run with: python -m unittest test_fields
+"""
+
+import unittest
+from datetime import date
+from amenities import resolve_amenities
+from models import db, Property
+from testing import AppTestCase
+
+
+class FieldsTest(AppTestCase):
+    """fields= picks both the JSON keys returned and the columns selected"""
+
+    settings = {'LISTING_CACHE_ENABLED': False}
+
+    def setUp(self):
+        super().setUp()
+        self.owner_id, self.owner_headers = self.create_user('owner@test.com', 'owner')
+        renter_id, _ = self.create_user('renter@test.com', 'renter')
+        self.property_id = self.create_property(
+            self.owner_id, images='["https://img/1.jpg", "https://img/2.jpg"]')
+        with self.app.app_context():
+            db.session.get(Property, self.property_id).amenities = resolve_amenities(['wifi'])
+            db.session.commit()
+        self.create_booking(self.property_id, renter_id, date(2025, 6, 1), date(2025, 7, 1))
+
+    def get(self, path, **query):
+        with self.count_queries() as statements:
+            response = self.client.get(path, query_string=query, headers=self.owner_headers)
+        return response, statements
+
+    @staticmethod
+    def selecting(statements, table):
+        """The statements that read rows from table"""
+        return [statement for statement in statements
+                if statement.lstrip().startswith('SELECT') and f'FROM {table}' in statement]
+
+    @staticmethod
+    def amenity_loads(statements):
+        return [statement for statement in statements if 'amenities.name' in statement]
+
+    def test_listing_selects_only_the_requested_columns(self):
+        response, statements = self.get('/api/rentals/properties', fields='id,title,price_per_month')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.get_json()['properties'][0]), {'id', 'title', 'price_per_month'})
+        select, = self.selecting(statements, 'properties')
+        self.assertIn('properties.title', select)
+        for column in ('description', 'address', 'images', 'latitude'):
+            self.assertNotIn(f'properties.{column}', select)
+
+    def test_images_and_amenities_load_only_when_requested(self):
+        response, statements = self.get('/api/rentals/my-properties', fields='id,title')
+        self.assertEqual(response.get_json()['properties'], [{'id': self.property_id, 'title': 'Flat'}])
+        self.assertNotIn('properties.images', self.selecting(statements, 'properties')[0])
+        self.assertEqual(self.amenity_loads(statements), [])
+
+        response, statements = self.get('/api/rentals/my-properties', fields='id,image,amenities')
+        self.assertEqual(response.get_json()['properties'], [
+            {'id': self.property_id, 'image': 'https://img/1.jpg', 'amenities': ['wifi']}])
+        self.assertIn('properties.images', self.selecting(statements, 'properties')[0])
+        self.assertEqual(len(self.amenity_loads(statements)), 1)
+
+        # The summary default shows the first image but no amenities
+        response, statements = self.get('/api/rentals/my-properties')
+        prop, = response.get_json()['properties']
+        self.assertEqual(prop['image'], 'https://img/1.jpg')
+        self.assertNotIn('amenities', prop)
+        self.assertEqual(self.amenity_loads(statements), [])
+
+    def test_single_property_and_bookings(self):
+        response, statements = self.get(f'/api/rentals/properties/{self.property_id}', fields='title')
+        self.assertEqual(set(response.get_json()['property']), {'title', 'owner'})
+        self.assertNotIn('properties.description', ''.join(self.selecting(statements, 'properties')))
+
+        response, statements = self.get('/api/rentals/property-bookings', fields='id,status')
+        booking, = response.get_json()['bookings']
+        self.assertEqual(set(booking), {'id', 'status'})
+        select, = self.selecting(statements, 'bookings')
+        self.assertIn('bookings.status', select)
+        self.assertNotIn('bookings.message', select)
+        self.assertNotIn('bookings.total_price', select)
+
+    def test_unknown_fields_are_rejected(self):
+        for path, query in (('/api/rentals/properties', {'fields': 'id,password_hash'}),
+                            ('/api/rentals/my-properties', {'fields': 'titel'}),
+                            (f'/api/rentals/properties/{self.property_id}', {'fields': 'owner_id,secret'}),
+                            ('/api/rentals/property-bookings', {'fields': 'id,nope'}),
+                            ('/api/rentals/property-bookings', {'property_fields': 'nope'})):
+            response = self.client.get(path, query_string=query, headers=self.owner_headers)
+            self.assertEqual(response.status_code, 400, (path, query))
+            self.assertIn('Unknown', response.get_json()['error'])
+
+
+if __name__ == '__main__':
+    unittest.main()
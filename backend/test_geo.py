@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Geo search tests for the Novella API
+Run with: python -m unittest test_geo
+"""
+
+import random
+import unittest
+from geo import MAX_COVER_CELLS, cover, encode, radius_bbox
+from testing import AppTestCase
+
+
+class CoverTest(unittest.TestCase):
+    """Geohash covers stay within the cell cap and contain every point of the box"""
+
+    def test_cover_is_capped_and_complete(self):
+        rng = random.Random(1)
+        boxes = [(-1.3, 36.8, -1.2, 36.9), (-1.3, 36.8, -1.29999, 36.80001), (-60, -170, 70, 170),
+                 (-90, -180, 90, 180), (10, -180, 10.5, 180), (-89, 0, 89, 0.001)]
+        for min_lat, min_lon, max_lat, max_lon in boxes:
+            cells = cover(min_lat, min_lon, max_lat, max_lon)
+            self.assertLessEqual(len(cells), MAX_COVER_CELLS, (min_lat, min_lon, max_lat, max_lon))
+            for _ in range(200):
+                point = rng.uniform(min_lat, max_lat), rng.uniform(min_lon, max_lon)
+                geohash = encode(*point)
+                self.assertTrue(any(geohash.startswith(cell) for cell in cells), point)
+
+    def test_radius_box_wraps_at_the_antimeridian(self):
+        min_lat, min_lon, max_lat, max_lon = radius_bbox(0, 179.9, 50)
+        self.assertGreater(min_lon, max_lon)
+        self.assertAlmostEqual(min_lon, 179.9 - 50 / 111.32)
+        self.assertAlmostEqual(max_lon, 179.9 + 50 / 111.32 - 360)
+        # Reaching a pole spans every longitude
+        self.assertEqual(radius_bbox(89.9, 10, 50)[1::2], (-180.0, 180.0))
+
+
+class GeoSearchTest(AppTestCase):
+    """near/radius_km and bbox listings through the geohash index"""
+
+    def setUp(self):
+        super().setUp()
+        self.owner_id, _ = self.create_user('owner@test.com', 'owner')
+
+    def place(self, title, latitude, longitude):
+        return self.create_property(self.owner_id, title=title, latitude=latitude,
+                                    longitude=longitude, geohash=encode(latitude, longitude))
+
+    def listing(self, **query):
+        response = self.client.get('/api/rentals/properties', query_string=query)
+        self.assertEqual(response.status_code, 200, response.get_json())
+        return response.get_json()['properties']
+
+    def test_radius_results_are_ordered_by_distance(self):
+        # Around Nairobi CBD (-1.2864, 36.8172)
+        for title, latitude, longitude in (('far', -1.2864, 36.9072), ('near', -1.2864, 36.8222),
+                                           ('middle', -1.3264, 36.8172), ('outside', -1.2864, 37.1)):
+            self.place(title, latitude, longitude)
+        results = self.listing(near='-1.2864,36.8172', radius_km=15)
+        self.assertEqual([prop['title'] for prop in results], ['near', 'middle', 'far'])
+        distances = [prop['distance_km'] for prop in results]
+        self.assertEqual(distances, sorted(distances))
+        self.assertAlmostEqual(distances[0], 0.556, places=2)
+        self.assertTrue(all(distance <= 15 for distance in distances))
+
+        # Paging keeps the distance order
+        first = self.client.get('/api/rentals/properties', query_string={
+            'near': '-1.2864,36.8172', 'radius_km': 15, 'limit': 2}).get_json()
+        rest = self.listing(near='-1.2864,36.8172', radius_km=15, cursor=first['next_cursor'])
+        self.assertEqual([prop['title'] for prop in first['properties'] + rest],
+                         ['near', 'middle', 'far'])
+
+    def test_bbox_crossing_the_antimeridian(self):
+        for title, latitude, longitude in (('fiji', -17.7, 178.0), ('samoa', -13.8, -172.1),
+                                           ('nairobi', -1.3, 36.8), ('alaska', 60.0, -175.0)):
+            self.place(title, latitude, longitude)
+        results = self.listing(bbox='170,-20,-170,0')
+        self.assertEqual(sorted(prop['title'] for prop in results), ['fiji', 'samoa'])
+
+    def test_radius_crossing_the_antimeridian(self):
+        for title, latitude, longitude in (('east', 0, 179.9), ('west', 0, -179.95),
+                                           ('far_west', 0, -179.0), ('far_east', 0, 178.0)):
+            self.place(title, latitude, longitude)
+        results = self.listing(near='0,179.95', radius_km=50)
+        self.assertEqual([prop['title'] for prop in results], ['east', 'west'])
+        self.assertAlmostEqual(results[1]['distance_km'], 11.1, places=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Bulk property import tests for the Novella API
+Run with: python -m unittest test_importer
+"""
+
+import json
+import unittest
+from sqlalchemy import event
+from importer import import_properties
+from models import db, Property
+from testing import AppTestCase
+
+HEADER = 'title,description,address,city,state,zip_code,property_type,bedrooms,bathrooms,price_per_month'
+
+
+def csv_row(title, **values):
+    row = dict({'description': 'A flat', 'address': '1 Main St', 'city': 'Nairobi',
+                'state': 'Nairobi', 'zip_code': '00100', 'property_type': 'apartment',
+                'bedrooms': '2', 'bathrooms': '1', 'price_per_month': '1000'}, **values)
+    return ','.join([title] + [row[column] for column in HEADER.split(',')[1:]])
+
+
+def record(title, **values):
+    return dict({'title': title, 'description': 'A flat', 'address': '1 Main St',
+                 'city': 'Nairobi', 'state': 'Nairobi', 'zip_code': '00100',
+                 'property_type': 'apartment', 'bedrooms': 2, 'bathrooms': 1,
+                 'price_per_month': 1000}, **values)
+
+
+class ImporterTest(AppTestCase):
+    """CSV and NDJSON uploads through POST /api/rentals/properties/import"""
+
+    def setUp(self):
+        super().setUp()
+        self.owner_id, self.headers = self.create_user('owner@test.com', 'owner')
+
+    def upload(self, body, content_type='text/csv'):
+        response = self.client.post('/api/rentals/properties/import', data=body,
+                                    content_type=content_type, headers=self.headers)
+        self.assertEqual(response.status_code, 200, response.get_json())
+        return response.get_json()
+
+    def titles(self):
+        with self.app.app_context():
+            return sorted(title for title, in db.session.query(Property.title))
+
+    def test_csv_errors_are_reported_by_line(self):
+        result = self.upload('\n'.join([
+            HEADER,
+            csv_row('Good 1'),
+            csv_row('No bedrooms', bedrooms=''),
+            csv_row('Bad price', price_per_month='cheap'),
+            csv_row('Good 2'),
+            csv_row('Too many columns') + ',extra',
+        ]))
+        self.assertEqual((result['imported'], result['failed']), (2, 3))
+        self.assertEqual(result['errors'], [
+            {'line': 3, 'error': 'bedrooms is required'},
+            {'line': 4, 'error': 'price_per_month must be a number'},
+            {'line': 6, 'error': 'Row has more columns than the header'},
+        ])
+        self.assertFalse(result['errors_truncated'])
+        self.assertEqual(self.titles(), ['Good 1', 'Good 2'])
+
+    def test_ndjson_errors_are_reported_by_line(self):
+        result = self.upload('\n'.join([
+            json.dumps(record('Good 1')),
+            '',
+            '{not json',
+            json.dumps(record('Negative', bedrooms=-1)),
+            json.dumps(['not', 'an', 'object']),
+            json.dumps(record('Good 2')),
+        ]), content_type='application/x-ndjson')
+        self.assertEqual((result['imported'], result['failed']), (2, 3))
+        self.assertEqual([error['line'] for error in result['errors']], [3, 4, 5])
+        self.assertTrue(result['errors'][0]['error'].startswith('Invalid JSON'))
+        self.assertEqual(result['errors'][1]['error'], 'bedrooms must not be negative')
+        self.assertEqual(result['errors'][2]['error'], 'property must be an object')
+
+    def test_errors_are_truncated_at_max_errors(self):
+        self.app.config['IMPORT_MAX_ERRORS'] = 3
+        result = self.upload('\n'.join([HEADER] + [csv_row(f'Bad {i}', bedrooms='many')
+                                                   for i in range(10)] + [csv_row('Good')]))
+        self.assertEqual((result['imported'], result['failed']), (1, 10))
+        self.assertEqual([error['line'] for error in result['errors']], [2, 3, 4])
+        self.assertTrue(result['errors_truncated'])
+
+    def test_each_batch_commits_on_its_own(self):
+        self.app.config['IMPORT_BATCH_SIZE'] = 2
+        with self.app.app_context():
+            commits = []
+
+            def listener(conn):
+                commits.append(conn)
+
+            event.listen(db.engine, 'commit', listener)
+            try:
+                result = self.upload('\n'.join([HEADER] + [csv_row(f'Flat {i}') for i in range(5)]))
+            finally:
+                event.remove(db.engine, 'commit', listener)
+        self.assertEqual(result['imported'], 5)
+        # Two full batches and the remainder, after the commit releasing the user lookup
+        self.assertEqual(len(commits), 4)
+
+    def test_rows_committed_before_a_failure_are_kept(self):
+        def records():
+            for i in range(5):
+                yield i + 1, record(f'Flat {i}'), None
+            raise ConnectionError('upload interrupted')
+
+        with self.app.app_context():
+            with self.assertRaises(ConnectionError):
+                import_properties(self.owner_id, records(), batch_size=2, max_errors=10)
+            db.session.rollback()
+        # The third batch was still being read; the first two were committed
+        self.assertEqual(self.titles(), ['Flat 0', 'Flat 1', 'Flat 2', 'Flat 3'])
+
+    def test_csv_lists_split_on_pipes(self):
+        result = self.upload('\n'.join([
+            HEADER + ',amenities,images',
+            csv_row('Flat') + ',WiFi | Parking||pool ,https://img/1.jpg|https://img/2.jpg',
+        ]))
+        self.assertEqual(result['imported'], 1)
+        with self.app.app_context():
+            prop = Property.query.one()
+            self.assertEqual(sorted(amenity.name for amenity in prop.amenities),
+                             ['parking', 'pool', 'wifi'])
+            self.assertEqual(json.loads(prop.images), ['https://img/1.jpg', 'https://img/2.jpg'])
+
+
+if __name__ == '__main__':
+    unittest.main()
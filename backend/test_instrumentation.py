@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+SQL instrumentation tests for the Novella API
+Run with: python -m unittest test_instrumentation
+"""
+
+import json
+import re
+import unittest
+from app import create_app
+from testing import AppTestCase
+
+
+class SQLInstrumentationTest(AppTestCase):
+    """Server-Timing reports the statements a request ran; slow requests are logged"""
+
+    settings = {'SQL_INSTRUMENTATION_ENABLED': True}
+
+    def setUp(self):
+        super().setUp()
+        owner_id, self.owner_headers = self.create_user('owner@test.com', 'owner')
+        renter_id, _ = self.create_user('renter@test.com', 'renter')
+        self.create_bookings([self.create_property(owner_id)], [renter_id], 5)
+
+    def test_server_timing_counts_statements(self):
+        with self.count_queries() as statements:
+            response = self.client.get('/api/rentals/property-bookings', headers=self.owner_headers)
+        timing = response.headers['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries", serialize;dur=[\d.]+, total;dur=[\d.]+')
+        self.assertEqual(int(re.search(r'"(\d+) queries"', timing).group(1)), len(statements))
+
+    def test_slow_request_log_lists_repeated_statements(self):
+        self.app.config['SLOW_REQUEST_QUERIES'] = 1
+        with self.assertLogs('novella.slow', 'WARNING') as logs:
+            self.client.get('/api/rentals/property-bookings', headers=self.owner_headers)
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record['event'], 'slow_request')
+        self.assertEqual(record['endpoint'], 'rentals.get_property_bookings')
+        self.assertGreaterEqual(record['queries'], 1)
+        self.assertIn('SELECT', record['top_statements'][0]['sql'])
+
+    def test_disabled_by_default(self):
+        response = create_app('testing').test_client().get('/api/rentals/properties')
+        self.assertNotIn('Server-Timing', response.headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
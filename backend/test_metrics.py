@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Metrics endpoint tests for the Novella API
+Run with: python -m unittest test_metrics
+"""
+
+import multiprocessing
+import re
+import shutil
+import tempfile
+import unittest
+from app import create_app
+from config import config
+from metrics import metrics
+from testing import testing_config
+
+
+def metrics_app(directory):
+    return create_app(testing_config('metrics-testing', METRICS_ENABLED=True, METRICS_DIR=directory,
+                                     METRICS_FLUSH_SECONDS=0))
+
+
+def worker(directory, requests, ready, done):
+    """Another WSGI worker process: serve some requests, then wait to be told to exit"""
+    client = metrics_app(directory).test_client()
+    for _ in range(requests):
+        client.get('/api/rentals/properties')
+    metrics.flush()
+    ready.set()
+    done.wait(30)
+
+
+def sample(body, name, **labels):
+    """Value of the series name{labels} in a scrape, or None"""
+    for line in body.splitlines():
+        match = re.match(r'^(\w+)(?:\{(.*)\})? (\S+)$', line)
+        if not match or match.group(1) != name:
+            continue
+        found = dict(re.findall(r'(\w+)="([^"]*)"', match.group(2) or ''))
+        if all(found.get(key) == value for key, value in labels.items()):
+            return float(match.group(3))
+    return None
+
+
+class MetricsTest(unittest.TestCase):
+    """/metrics reports per-endpoint series summed over every worker process"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='novella-metrics-')
+        self.app = metrics_app(self.directory)
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        config.pop('metrics-testing', None)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def scrape(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        return response.get_data(as_text=True)
+
+    def test_request_series(self):
+        for _ in range(3):
+            self.client.get('/api/rentals/properties')
+        self.client.get('/api/rentals/properties/999999')
+        body = self.scrape()
+
+        self.assertEqual(sample(body, 'novella_http_requests_total', endpoint='rentals.get_properties',
+                                method='GET', status='200'), 3)
+        self.assertEqual(sample(body, 'novella_http_requests_total', endpoint='rentals.get_property',
+                                status='404'), 1)
+        self.assertEqual(sample(body, 'novella_http_request_duration_seconds_count',
+                                endpoint='rentals.get_properties'), 3)
+        self.assertEqual(sample(body, 'novella_http_request_duration_seconds_bucket',
+                                endpoint='rentals.get_properties', le='+Inf'), 3)
+        self.assertEqual(sample(body, 'novella_http_requests_in_flight',
+                                endpoint='rentals.get_properties'), 0)
+        self.assertGreater(sample(body, 'novella_db_pool_checkouts_total', bind='default'), 0)
+        self.assertIn('# TYPE novella_http_request_duration_seconds histogram', body)
+
+    def test_password_timing(self):
+        self.client.post('/api/auth/signup', json={
+            "email": "metrics@example.com", "password": "password123", "first_name": "Metrics",
+            "last_name": "Test", "user_type": "renter"
+        })
+        self.client.post('/api/auth/login', json={"email": "metrics@example.com",
+                                                  "password": "password123"})
+        body = self.scrape()
+        self.assertEqual(sample(body, 'novella_password_hash_seconds_count', operation='hash'), 1)
+        self.assertEqual(sample(body, 'novella_password_hash_seconds_count', operation='verify'), 1)
+
+    def test_token_required_when_configured(self):
+        self.app.config['METRICS_TOKEN'] = 'secret'
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_adds_up_worker_processes(self):
+        self.client.get('/api/rentals/properties')
+        context = multiprocessing.get_context('spawn')
+        ready, done = context.Event(), context.Event()
+        process = context.Process(target=worker, args=(self.directory, 4, ready, done))
+        process.start()
+        try:
+            self.assertTrue(ready.wait(60))
+            body = self.scrape()
+            self.assertEqual(sample(body, 'novella_http_requests_total',
+                                    endpoint='rentals.get_properties', status='200'), 5)
+        finally:
+            done.set()
+            process.join(30)
+
+        # Counters of an exited worker are kept
+        body = self.scrape()
+        self.assertEqual(sample(body, 'novella_http_requests_total',
+                                endpoint='rentals.get_properties', status='200'), 5)
+        self.assertEqual(sample(body, 'novella_http_request_duration_seconds_count',
+                                endpoint='rentals.get_properties'), 5)
+        body = self.scrape()
+        self.assertEqual(sample(body, 'novella_http_requests_total',
+                                endpoint='rentals.get_properties', status='200'), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
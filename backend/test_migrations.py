@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Schema migration tests for the Novella API
+Run with: python -m unittest test_migrations
+"""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime
+from sqlalchemy import event, inspect, text, update
+from app import create_app
+from config import config
+from models import db, SchemaVersion
+from migrations import LATEST_VERSION, MigrationPending, current_version, migrate
+from migrate import offline_app
+from testing import testing_config
+
+
+def migrations_app(path, **settings):
+    return create_app(testing_config('migrations-testing', path, **settings))
+
+
+def run_migrate(path, results):
+    """Another process migrating the same database; reports how many steps it applied"""
+    with offline_app(testing_config('migrations-testing', path)).app_context():
+        results.put(len(migrate()))
+
+
+class MigrationsTest(unittest.TestCase):
+    """Startup applies pending migrations once, then only checks the version"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='novella-migrations-')
+        self.path = os.path.join(self.directory, 'novella.db')
+
+    def tearDown(self):
+        config.pop('migrations-testing', None)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def dispose(self, app):
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+    def test_fresh_database_is_migrated(self):
+        app = migrations_app(self.path)
+        with app.app_context():
+            self.assertEqual(current_version(), LATEST_VERSION)
+            tables = set(inspect(db.engine).get_table_names())
+            self.assertTrue({'users', 'properties', 'properties_fts', 'schema_version'} <= tables)
+            self.assertIsNone(db.session.get(SchemaVersion, 1).locked_by)
+        self.dispose(app)
+
+    def test_migrations_build_the_schema_the_models_declare(self):
+        def schema(app):
+            with app.app_context():
+                inspector = inspect(db.engine)
+                tables = {}
+                for table in db.metadata.sorted_tables:
+                    columns = {(column['name'], str(column['type']), column['nullable'])
+                               for column in inspector.get_columns(table.name)}
+                    indexes = {(index['name'], tuple(index['column_names']), bool(index['unique']))
+                               for index in inspector.get_indexes(table.name)}
+                    tables[table.name] = columns, indexes
+            self.dispose(app)
+            return tables
+
+        migrated = schema(migrations_app(self.path))
+        declared = offline_app(testing_config('migrations-testing',
+                                              os.path.join(self.directory, 'declared.db')))
+        with declared.app_context():
+            db.create_all()
+        self.assertEqual(migrated, schema(declared))
+
+    def test_current_schema_costs_one_query(self):
+        self.dispose(migrations_app(self.path))
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.Engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            self.dispose(migrations_app(self.path))
+        finally:
+            event.remove(db.Engine, 'before_cursor_execute', before_cursor_execute)
+        self.assertEqual(len(statements), 1, statements)
+        self.assertIn('schema_version', statements[0])
+
+    def test_pre_versioning_database_is_adopted(self):
+        app = migrations_app(self.path)
+        with app.app_context():
+            db.session.execute(text('DROP TABLE schema_version'))
+            db.session.execute(text(
+                "INSERT INTO users (email, password_hash, first_name, last_name, user_type) "
+                "VALUES ('old@example.com', 'x', 'Old', 'User', 'owner')"))
+            db.session.commit()
+        self.dispose(app)
+
+        app = migrations_app(self.path)
+        with app.app_context():
+            self.assertEqual(current_version(), LATEST_VERSION)
+            self.assertEqual(db.session.execute(text('SELECT count(*) FROM users')).scalar(), 1)
+        self.dispose(app)
+
+    def test_later_migrations_add_their_columns(self):
+        app = migrations_app(self.path)
+        with app.app_context():
+            # A database last migrated before row and token versions existed
+            for table, column in (('properties', 'version'), ('bookings', 'version'),
+                                  ('users', 'token_version')):
+                db.session.execute(text(f'ALTER TABLE {table} DROP COLUMN {column}'))
+            db.session.execute(text(
+                "INSERT INTO users (email, password_hash, first_name, last_name, user_type) "
+                "VALUES ('old@example.com', 'x', 'Old', 'User', 'owner')"))
+            db.session.execute(text('DROP INDEX ix_bookings_property_status_end'))
+            db.session.execute(text('CREATE INDEX ix_bookings_property_status_dates '
+                                    'ON bookings (property_id, status, start_date, end_date)'))
+            db.session.execute(update(SchemaVersion).values(version=6))
+            db.session.commit()
+            self.assertEqual([version for version, _ in migrate()], list(range(7, LATEST_VERSION + 1)))
+            columns = {table: {column['name'] for column in inspect(db.engine).get_columns(table)}
+                       for table in ('properties', 'bookings', 'users')}
+            self.assertIn('version', columns['properties'])
+            self.assertIn('version', columns['bookings'])
+            self.assertIn('token_version', columns['users'])
+            self.assertEqual(db.session.execute(text('SELECT token_version FROM users')).scalar(), 0)
+            indexes = {index['name'] for index in inspect(db.engine).get_indexes('bookings')}
+            self.assertIn('ix_bookings_property_status_end', indexes)
+            self.assertNotIn('ix_bookings_property_status_dates', indexes)
+        self.dispose(app)
+
+    def test_startup_refuses_pending_when_auto_migrate_is_off(self):
+        with self.assertRaises(MigrationPending):
+            migrations_app(self.path, MIGRATE_ON_STARTUP=False)
+
+    def test_waits_for_lock_held_by_another_worker(self):
+        app = migrations_app(self.path)
+        with app.app_context():
+            db.session.execute(update(SchemaVersion).values(
+                locked_by='other:1', locked_at=datetime.utcnow()))
+            db.session.commit()
+            # The holder finished the migrations, so there is nothing left to do
+            self.assertEqual(migrate(wait_timeout=5), [])
+
+            db.session.execute(update(SchemaVersion).values(
+                version=0, locked_by='other:1', locked_at=datetime.utcnow()))
+            db.session.commit()
+            # The holder never finishes: its lock goes stale and is taken over
+            started = time.monotonic()
+            self.assertEqual(len(migrate(wait_timeout=5, stale_after=1)), LATEST_VERSION)
+            self.assertGreaterEqual(time.monotonic() - started, 1)
+            self.assertEqual(current_version(), LATEST_VERSION)
+        self.dispose(app)
+
+    def test_short_wait_does_not_take_over_a_live_lock(self):
+        app = migrations_app(self.path)
+        with app.app_context():
+            db.session.execute(update(SchemaVersion).values(
+                version=0, locked_by='other:1', locked_at=datetime.utcnow()))
+            db.session.commit()
+            with self.assertRaises(RuntimeError):
+                migrate(wait_timeout=1, stale_after=300)
+            lock = db.session.get(SchemaVersion, 1)
+            db.session.refresh(lock)
+            self.assertEqual((lock.version, lock.locked_by), (0, 'other:1'))
+        self.dispose(app)
+
+    def test_concurrent_workers_migrate_once(self):
+        context = multiprocessing.get_context('spawn')
+        results = context.Queue()
+        workers = [context.Process(target=run_migrate, args=(self.path, results)) for _ in range(3)]
+        for worker in workers:
+            worker.start()
+        applied = [results.get(timeout=60) for _ in workers]
+        for worker in workers:
+            worker.join(30)
+        self.assertEqual(sorted(applied), [0, 0, LATEST_VERSION])
+
+
+if __name__ == '__main__':
+    unittest.main()
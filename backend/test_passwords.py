@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Password hashing pool tests for the Novella API
+Run with: python -m unittest test_passwords
+"""
+
+import threading
+import time
+import unittest
+from unittest import mock
+from app import create_app
+from config import config
+from models import db, User
+import passwords
+from passwords import PoolSaturated, hash_cost, password_hasher
+from testing import AppTestCase, testing_config
+
+CREDENTIALS = {'email': 'renter@test.com', 'password': 'secret123'}
+
+
+class PasswordPoolTest(AppTestCase):
+    """A saturated pool answers 503 with Retry-After; changed costs rehash on login"""
+
+    database_file = True
+    settings = {'PASSWORD_POOL_WORKERS': 1, 'PASSWORD_POOL_MAX_PENDING': 0,
+                'PASSWORD_POOL_TIMEOUT': 1}
+
+    def setUp(self):
+        super().setUp()
+        response = self.client.post('/api/auth/signup', json=dict(
+            CREDENTIALS, first_name='Test', last_name='Renter', user_type='renter'))
+        self.assertEqual(response.status_code, 201, response.get_json())
+        self.release = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+        config.pop('reconfigured-testing', None)
+        super().tearDown()
+
+    def reconfigure(self, **settings):
+        """Serve the same database from an app with settings changed, like a redeploy"""
+        self.app = create_app(testing_config('reconfigured-testing', self.path('novella.db'),
+                                             **dict(self.settings, **settings)))
+        self.client = self.app.test_client()
+
+    def login(self, client=None, **credentials):
+        return (client or self.client).post('/api/auth/login', json=dict(CREDENTIALS, **credentials))
+
+    def stored_hash(self):
+        with self.app.app_context():
+            return db.session.scalar(db.select(User.password_hash))
+
+    def occupy_pool(self):
+        """Start a login whose verification holds a pool worker until self.release is set"""
+        started = threading.Semaphore(0)
+        verify = passwords._verify
+
+        def blocking_verify(password_hash, password):
+            started.release()
+            self.release.wait(10)
+            return verify(password_hash, password)
+
+        patcher = mock.patch('passwords._verify', blocking_verify)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        results = []
+        thread = threading.Thread(target=lambda: results.append(self.login(self.app.test_client())))
+        thread.start()
+        self.assertTrue(started.acquire(timeout=5))
+        return thread, results
+
+    def test_saturated_pool_answers_503_with_retry_after(self):
+        thread, results = self.occupy_pool()
+        for request in (self.login, lambda: self.client.post('/api/auth/signup', json={
+                'email': 'new@test.com', 'password': 'secret123', 'first_name': 'New',
+                'last_name': 'User', 'user_type': 'renter'})):
+            started = time.monotonic()
+            response = request()
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.headers['Retry-After'], '1')
+            # Rejected without queueing behind the busy worker
+            self.assertLess(time.monotonic() - started, 0.5)
+
+        self.release.set()
+        thread.join(5)
+        self.assertEqual([response.status_code for response in results], [200])
+        self.assertEqual(self.login().status_code, 200)
+
+    def test_queued_call_times_out_with_503(self):
+        self.reconfigure(PASSWORD_POOL_MAX_PENDING=1)
+        thread, _ = self.occupy_pool()
+        started = time.monotonic()
+        response = self.login()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '1')
+        self.assertGreaterEqual(time.monotonic() - started, 1)
+        self.release.set()
+        thread.join(5)
+
+    def test_login_rehashes_after_the_cost_changes(self):
+        original = self.stored_hash()
+        self.assertEqual(hash_cost(original), self.app.config['BCRYPT_LOG_ROUNDS'])
+        rounds = self.app.config['BCRYPT_LOG_ROUNDS'] + 1
+        self.reconfigure(BCRYPT_LOG_ROUNDS=rounds)
+
+        self.assertEqual(self.login(password='wrong-password').status_code, 401)
+        self.assertEqual(self.stored_hash(), original)
+
+        self.assertEqual(self.login().status_code, 200)
+        rehashed = self.stored_hash()
+        self.assertEqual(hash_cost(rehashed), rounds)
+        self.assertNotEqual(rehashed, original)
+
+        # Already at the configured cost: nothing to do
+        self.assertEqual(self.login().status_code, 200)
+        self.assertEqual(self.stored_hash(), rehashed)
+
+    def test_login_succeeds_when_the_rehash_cannot_run(self):
+        original = self.stored_hash()
+        self.reconfigure(BCRYPT_LOG_ROUNDS=self.app.config['BCRYPT_LOG_ROUNDS'] + 1)
+        with mock.patch.object(password_hasher, 'hash', side_effect=PoolSaturated):
+            self.assertEqual(self.login().status_code, 200)
+        self.assertEqual(self.stored_hash(), original)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Query-count regression tests for the Novella API
+Run with: python -m unittest test_queries
+"""
+
+import unittest
+from datetime import date, datetime, timedelta
+from sqlalchemy import text
+from models import db, Property, Booking
+from versions import table_versions
+from analytics import rebuild_owner_analytics
+from pagination import count_cache
+from testing import AppTestCase
+
+
+class BookingListingQueryCountTest(AppTestCase):
+    """Booking listings must not issue one query per booking"""
+
+    def seed(self, bookings):
+        owner_id, owner_headers = self.create_user(f'owner{bookings}@test.com', 'owner')
+        renters = [self.create_user(f'renter{bookings}-{i}@test.com', 'renter') for i in range(3)]
+        property_ids = [self.create_property(owner_id) for _ in range(4)]
+        self.create_bookings(property_ids, [renter_id for renter_id, _ in renters], bookings)
+        return owner_headers, renters[0][1]
+
+    def statements_for(self, url, headers):
+        with self.count_queries() as statements:
+            response = self.client.get(url, headers=headers, query_string={'limit': 100})
+        self.assertEqual(response.status_code, 200, response.get_json())
+        return len(statements), len(response.get_json()['bookings'])
+
+    def test_property_bookings_query_count_is_constant(self):
+        owner_headers, _ = self.seed(3)
+        small, returned = self.statements_for('/api/rentals/property-bookings', owner_headers)
+        self.assertEqual(returned, 3)
+
+        owner_headers, _ = self.seed(60)
+        large, returned = self.statements_for('/api/rentals/property-bookings', owner_headers)
+        self.assertEqual(returned, 60)
+        self.assertEqual(small, large)
+        # user lookup, bookings joined with properties and renters (the default
+        # property summary leaves out amenities)
+        self.assertLessEqual(large, 2)
+
+    def test_my_bookings_query_count_is_constant(self):
+        _, renter_headers = self.seed(3)
+        small, returned = self.statements_for('/api/rentals/my-bookings', renter_headers)
+        self.assertEqual(returned, 1)
+
+        _, renter_headers = self.seed(60)
+        large, returned = self.statements_for('/api/rentals/my-bookings', renter_headers)
+        self.assertEqual(returned, 20)
+        self.assertEqual(small, large)
+        # bookings joined with properties
+        self.assertLessEqual(large, 1)
+
+
+
+class CursorPaginationTest(AppTestCase):
+    """Keyset pages walk a listing without gaps or repeats, even on tied sort keys"""
+
+    def setUp(self):
+        super().setUp()
+        self.owner_id, self.owner_headers = self.create_user('owner@test.com', 'owner')
+        self.renter_id, self.renter_headers = self.create_user('renter@test.com', 'renter')
+        created_at = datetime(2025, 1, 1)
+        count_cache.clear()
+        for i in range(25):
+            self.create_property(self.owner_id, title=f'Flat {i}',
+                                 property_type=('house', 'apartment')[i % 2],
+                                 price_per_month=100 * (i % 3 + 1), created_at=created_at)
+        with self.app.app_context():
+            self.properties = [(prop.price_per_month, prop.id) for prop in Property.query.all()]
+
+    def walk(self, url, key, headers=None, **params):
+        """Every page of url at limit=4; returns the ids in order and the number of pages"""
+        ids, pages, cursor = [], 0, None
+        while True:
+            query = dict(params, limit=4, **({'cursor': cursor} if cursor else {}))
+            response = self.client.get(url, query_string=query, headers=headers)
+            self.assertEqual(response.status_code, 200, response.get_json())
+            data = response.get_json()
+            ids += [item['id'] for item in data[key]]
+            pages += 1
+            cursor = data['next_cursor']
+            if cursor is None:
+                return ids, pages
+
+    def test_walks_tied_sort_keys(self):
+        ids, pages = self.walk('/api/rentals/properties', 'properties', sort='price_asc')
+        self.assertEqual(ids, [id_ for _, id_ in sorted(self.properties)])
+        self.assertEqual(pages, 7)
+        ids, _ = self.walk('/api/rentals/properties', 'properties', sort='price_desc')
+        self.assertEqual(ids, [id_ for _, id_ in sorted(self.properties,
+                                                         key=lambda p: (-p[0], -p[1]))])
+        # Every property was created at the same moment: newest falls back on id
+        ids, _ = self.walk('/api/rentals/properties', 'properties')
+        self.assertEqual(ids, sorted((id_ for _, id_ in self.properties), reverse=True))
+
+    def test_walks_bookings(self):
+        self.create_bookings([self.properties[0][1]], [self.renter_id], 10)
+        with self.app.app_context():
+            db.session.execute(text("UPDATE bookings SET created_at = '2025-01-01 00:00:00.000000'"))
+            db.session.commit()
+        ids, pages = self.walk('/api/rentals/my-bookings', 'bookings', self.renter_headers)
+        self.assertEqual(len(set(ids)), 10)
+        self.assertEqual(ids, sorted(ids, reverse=True))
+        self.assertEqual(pages, 3)
+
+    def test_rejects_cursor_for_another_sort(self):
+        response = self.client.get('/api/rentals/properties',
+                                   query_string={'sort': 'price_asc', 'limit': 4})
+        cursor = response.get_json()['next_cursor']
+        response = self.client.get('/api/rentals/properties',
+                                   query_string={'sort': 'price_desc', 'cursor': cursor})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('sort', response.get_json()['error'])
+        for params in ({'cursor': 'not-a-cursor'}, {'limit': 0}, {'sort': 'cheapest'}):
+            response = self.client.get('/api/rentals/properties', query_string=params)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_include_count(self):
+        response = self.client.get('/api/rentals/properties',
+                                   query_string={'limit': 4, 'include_count': 'true'})
+        self.assertEqual(response.get_json()['count'], 25)
+        response = self.client.get('/api/rentals/properties', query_string={
+            'limit': 4, 'include_count': 'true', 'property_type': 'apartment'})
+        self.assertEqual((len(response.get_json()['properties']), response.get_json()['count']), (4, 12))
+        response = self.client.get('/api/rentals/properties', query_string={'limit': 4})
+        self.assertNotIn('count', response.get_json())
+
+
+class BulkBookingStatusTest(AppTestCase):
+    """PUT /bookings/status checks and applies many changes with a fixed number of statements"""
+
+    def setUp(self):
+        super().setUp()
+        self.owner_id, self.owner_headers = self.create_user('owner@test.com', 'owner')
+        other_owner_id, _ = self.create_user('other@test.com', 'owner')
+        self.renter_id, _ = self.create_user('renter@test.com', 'renter')
+        self.property_id = self.create_property(self.owner_id)
+        self.other_property_id = self.create_property(other_owner_id)
+
+    def add_booking(self, property_id, start, days, status='pending'):
+        return self.create_booking(property_id, self.renter_id,
+                                   date(2025, 1, 1) + timedelta(days=start),
+                                   date(2025, 1, 1) + timedelta(days=start + days), status)
+
+    def update(self, updates):
+        with self.count_queries() as statements:
+            response = self.client.put('/api/rentals/bookings/status', json={'updates': updates},
+                                       headers=self.owner_headers)
+        self.assertEqual(response.status_code, 200, response.get_json())
+        return response.get_json(), len(statements)
+
+    def stats(self):
+        with self.app.app_context():
+            totals = db.session.execute(text(
+                'SELECT property_id, pending, approved, rejected, cancelled, approved_revenue '
+                'FROM property_booking_stats ORDER BY property_id')).all()
+            months = db.session.execute(text(
+                'SELECT property_id, month, occupied_nights, round(revenue, 6) '
+                'FROM property_monthly_stats ORDER BY property_id, month')).all()
+            return totals, months
+
+    def test_reports_each_item(self):
+        pending = self.add_booking(self.property_id, 0, 10)
+        other = self.add_booking(self.other_property_id, 0, 10)
+        data, _ = self.update([
+            {'booking_id': pending, 'status': 'approved'},
+            {'booking_id': other, 'status': 'approved'},
+            {'booking_id': 999999, 'status': 'approved'},
+            {'booking_id': pending, 'status': 'rejected'},
+            {'booking_id': pending + 1000, 'status': 'done'},
+        ])
+        self.assertEqual((data['updated'], data['failed']), (1, 4))
+        self.assertEqual([(result['success'], result.get('code')) for result in data['results']],
+                         [(True, None), (False, 403), (False, 404), (False, 400), (False, 400)])
+        self.assertEqual(data['results'][0]['previous_status'], 'pending')
+        with self.app.app_context():
+            self.assertEqual(db.session.get(Booking, pending).status, 'approved')
+            self.assertEqual(db.session.get(Booking, other).status, 'pending')
+
+    def test_statement_count_is_constant(self):
+        small = [self.add_booking(self.property_id, 100 * i, 10) for i in range(2)]
+        large = [self.add_booking(self.property_id, 1000 + 100 * i, 10) for i in range(30)]
+        # Approvals also write a stats row per month they cover, so reject here
+        _, few = self.update([{'booking_id': id_, 'status': 'rejected'} for id_ in small])
+        data, many = self.update([{'booking_id': id_, 'status': 'rejected'} for id_ in large])
+        self.assertEqual(data['updated'], 30)
+        self.assertEqual(few, many)
+
+    def test_overlaps_are_checked_within_the_request(self):
+        approved = self.add_booking(self.property_id, 0, 30, status='approved')
+        first = self.add_booking(self.property_id, 40, 20)
+        overlapping = self.add_booking(self.property_id, 50, 20)
+        replacing = self.add_booking(self.property_id, 10, 10)
+        data, _ = self.update([
+            {'booking_id': first, 'status': 'approved'},
+            {'booking_id': overlapping, 'status': 'approved'},
+            # Approving inside the old booking's dates is fine once it is cancelled
+            {'booking_id': replacing, 'status': 'approved'},
+            {'booking_id': approved, 'status': 'cancelled'},
+        ])
+        self.assertEqual([result.get('code') for result in data['results']], [None, 409, None, None])
+
+    def test_keeps_stats_and_versions_in_step(self):
+        ids = [self.add_booking(self.property_id, 40 * i, 35) for i in range(4)]
+        with self.app.app_context():
+            version, = table_versions('bookings')
+        self.update([{'booking_id': ids[0], 'status': 'approved'},
+                     {'booking_id': ids[1], 'status': 'approved'},
+                     {'booking_id': ids[2], 'status': 'rejected'}])
+        self.update([{'booking_id': ids[1], 'status': 'cancelled'}])
+        with self.app.app_context():
+            self.assertEqual(table_versions('bookings'), (version + 2,))
+        incremental = self.stats()
+        with self.app.app_context():
+            rebuild_owner_analytics()
+        self.assertEqual(self.stats(), incremental)
+
+
+if __name__ == '__main__':
+    unittest.main()
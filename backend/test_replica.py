@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Read replica routing tests for the Novella API
+Uses two SQLite files; "replication" is copying the primary file over the replica.
+Run with: python -m unittest test_replica
+"""
+
+import shutil
+import time
+import unittest
+from app import create_app
+from models import db
+from replica import replica_router
+from testing import AppTestCase
+
+PROPERTY = {
+    "title": "Replica Flat", "description": "A flat", "address": "1 Main St",
+    "city": "Nairobi", "state": "Nairobi", "zip_code": "00100",
+    "property_type": "apartment", "bedrooms": 2, "bathrooms": 1, "price_per_month": 1000
+}
+
+
+class ReplicaRoutingTest(AppTestCase):
+    """GET requests read from the replica unless the client wrote recently"""
+
+    database_file = True
+    settings = {'LISTING_CACHE_ENABLED': False, 'REPLICA_STICKY_SECONDS': 0.5}
+
+    def setUp(self):
+        replica_router.sticky.clear()
+        super().setUp()
+        self.owner = self.client_at('10.0.0.1')
+        self.visitor = self.client_at('10.0.0.2')
+        token = self.owner.post('/api/auth/signup', json={
+            "email": "owner@example.com", "password": "password123", "first_name": "Owner",
+            "last_name": "Replica", "user_type": "owner"
+        }).get_json()['access_token']
+        self.owner_headers = {'Authorization': f'Bearer {token}'}
+        self.replicate()
+        replica_router.sticky.clear()
+
+    def make_app(self):
+        return create_app(self.config_name, replica_url=f"sqlite:///{self.path('replica.db')}")
+
+    def client_at(self, address):
+        client = self.app.test_client()
+        client.environ_base['REMOTE_ADDR'] = address
+        return client
+
+    def replicate(self):
+        with self.app.app_context():
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+        shutil.copyfile(self.path('novella.db'), self.path('replica.db'))
+
+    def post_property(self):
+        response = self.owner.post('/api/rentals/properties', json=PROPERTY,
+                                   headers=self.owner_headers)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.headers['X-DB-Route'], 'primary')
+        return response.get_json()['property']['id']
+
+    def test_reads_go_to_replica(self):
+        property_id = self.post_property()
+        # Another client reads from the replica, which hasn't caught up yet
+        response = self.visitor.get(f'/api/rentals/properties/{property_id}')
+        self.assertEqual(response.headers['X-DB-Route'], 'replica')
+        self.assertEqual(response.status_code, 404)
+
+        self.replicate()
+        response = self.visitor.get(f'/api/rentals/properties/{property_id}')
+        self.assertEqual(response.headers['X-DB-Route'], 'replica')
+        self.assertEqual(response.status_code, 200)
+
+    def test_writer_reads_own_writes(self):
+        property_id = self.post_property()
+        response = self.owner.get('/api/rentals/my-properties', headers=self.owner_headers)
+        self.assertEqual(response.headers['X-DB-Route'], 'primary')
+        self.assertEqual([prop['id'] for prop in response.get_json()['properties']], [property_id])
+
+        # Stickiness follows the user to another address too
+        response = self.visitor.get('/api/rentals/my-properties', headers=self.owner_headers)
+        self.assertEqual(response.headers['X-DB-Route'], 'primary')
+
+        time.sleep(0.6)
+        response = self.owner.get('/api/rentals/my-properties', headers=self.owner_headers)
+        self.assertEqual(response.headers['X-DB-Route'], 'replica')
+        self.assertEqual(response.get_json()['properties'], [])
+
+    def test_stickiness_is_per_user_not_per_address(self):
+        self.post_property()
+        # Another client behind the same proxy or NAT address
+        neighbour = self.client_at('10.0.0.1')
+        response = neighbour.get('/api/rentals/properties')
+        self.assertEqual(response.headers['X-DB-Route'], 'replica')
+
+    def test_new_user_reads_own_signup(self):
+        response = self.visitor.post('/api/auth/signup', json={
+            "email": "renter@example.com", "password": "password123", "first_name": "Renter",
+            "last_name": "Replica", "user_type": "renter"
+        })
+        self.assertEqual(response.status_code, 201)
+        headers = {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+        # The replica doesn't have the account yet
+        response = self.visitor.get('/api/auth/me', headers=headers)
+        self.assertEqual(response.headers['X-DB-Route'], 'primary')
+        self.assertEqual(response.status_code, 200)
+
+    def test_failed_write_is_not_sticky(self):
+        response = self.owner.post('/api/rentals/properties', json={"title": "Incomplete"},
+                                   headers=self.owner_headers)
+        self.assertEqual(response.status_code, 400)
+        response = self.owner.get('/api/rentals/my-properties', headers=self.owner_headers)
+        self.assertEqual(response.headers['X-DB-Route'], 'replica')
+
+    def test_batch_routed_by_its_sub_requests(self):
+        reads = {'requests': [{'path': '/api/auth/me'}, {'path': '/api/rentals/my-properties'}]}
+        response = self.owner.post('/api/batch', json=reads, headers=self.owner_headers)
+        self.assertEqual(response.headers['X-DB-Route'], 'replica')
+        self.assertEqual([item['status'] for item in response.get_json()['responses']], [200, 200])
+        # A batch of reads doesn't make the client sticky
+        response = self.owner.get('/api/rentals/my-properties', headers=self.owner_headers)
+        self.assertEqual(response.headers['X-DB-Route'], 'replica')
+
+        writes = {'requests': [{'method': 'POST', 'path': '/api/rentals/properties', 'body': PROPERTY},
+                               {'path': '/api/rentals/my-properties'}]}
+        response = self.owner.post('/api/batch', json=writes, headers=self.owner_headers)
+        self.assertEqual(response.headers['X-DB-Route'], 'primary')
+        created, listed = response.get_json()['responses']
+        self.assertEqual(created['status'], 201)
+        self.assertEqual([prop['id'] for prop in listed['body']['properties']],
+                         [created['body']['property']['id']])
+        response = self.owner.get('/api/rentals/my-properties', headers=self.owner_headers)
+        self.assertEqual(response.headers['X-DB-Route'], 'primary')
+
+
+if __name__ == '__main__':
+    unittest.main()
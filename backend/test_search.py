@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Full-text search tests for the Novella API
+Run with: python -m unittest test_search
+"""
+
+import unittest
+from sqlalchemy import text
+from models import db
+from testing import AppTestCase
+
+
+class FullTextSearchTest(AppTestCase):
+    """q and city listings through the properties_fts index"""
+
+    def setUp(self):
+        super().setUp()
+        self.owner_id, self.headers = self.create_user('owner@test.com', 'owner')
+
+    def search(self, **query):
+        response = self.client.get('/api/rentals/properties', query_string=query)
+        self.assertEqual(response.status_code, 200, response.get_json())
+        return [prop['title'] for prop in response.get_json()['properties']]
+
+    def assert_index_in_sync(self):
+        with self.app.app_context():
+            # Compares the index against the properties table; raises on a mismatch
+            db.session.execute(text(
+                "INSERT INTO properties_fts(properties_fts, rank) VALUES ('integrity-check', 1)"))
+            db.session.rollback()
+
+    def test_triggers_follow_updates_and_deletes(self):
+        cottage_id = self.create_property(self.owner_id, title='Garden cottage')
+        self.create_property(self.owner_id, title='Loft')
+        self.assertEqual(self.search(q='garden'), ['Garden cottage'])
+
+        response = self.client.put(f'/api/rentals/properties/{cottage_id}',
+                                   json={'title': 'Riverside bungalow', 'city': 'Kisumu'},
+                                   headers=self.headers)
+        self.assertEqual(response.status_code, 200, response.get_json())
+        self.assert_index_in_sync()
+        self.assertEqual(self.search(q='garden'), [])
+        self.assertEqual(self.search(q='riverside'), ['Riverside bungalow'])
+        self.assertEqual(self.search(city='kisumu'), ['Riverside bungalow'])
+        self.assertEqual(self.search(city='nairobi'), ['Loft'])
+
+        response = self.client.delete(f'/api/rentals/properties/{cottage_id}', headers=self.headers)
+        self.assertEqual(response.status_code, 200, response.get_json())
+        self.assert_index_in_sync()
+        self.assertEqual(self.search(q='riverside'), [])
+        self.assertEqual(self.search(city='kisumu'), [])
+
+    def test_relevance_ranks_better_matches_first(self):
+        self.create_property(self.owner_id, title='Garden cottage',
+                             description='Garden views from a garden terrace')
+        self.create_property(self.owner_id, title='Flat', description=(
+            'A flat in a quiet block with parking, a gym, a lift and a small garden '
+            'shared with the neighbours, close to shops and schools'))
+        self.create_property(self.owner_id, title='Loft', description='No outdoor space')
+        expected = ['Garden cottage', 'Flat']
+        self.assertEqual(self.search(q='garden', sort='relevance'), expected)
+        # Relevance is the default order for keyword searches
+        self.assertEqual(self.search(q='garden'), expected)
+        self.assertEqual(self.search(q='garden', sort='newest'), list(reversed(expected)))
+
+    def test_city_is_a_prefix_match_on_the_city_only(self):
+        self.create_property(self.owner_id, title='Nairobi flat', city='Nairobi')
+        self.create_property(self.owner_id, title='Near Nairobi', city='Mombasa',
+                             description='A long way from Nairobi')
+        self.create_property(self.owner_id, title='Nakuru flat', city='Nakuru')
+        self.assertEqual(self.search(city='nair'), ['Nairobi flat'])
+        self.assertEqual(sorted(self.search(city='Na')), ['Nairobi flat', 'Nakuru flat'])
+        self.assertEqual(self.search(city='Nairobi', q='flat'), ['Nairobi flat'])
+        self.assertEqual(sorted(self.search(q='nairobi')), ['Nairobi flat', 'Near Nairobi'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+"""
+Shared setup for the Novella API tests: test configs, a base test case and fixtures
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import contextmanager
+from datetime import date, timedelta
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+from app import create_app
+from config import config, TestingConfig
+from models import db, User, Property, Booking
+
+
+def testing_config(name, path=None, **settings):
+    """Register TestingConfig with settings as config[name], on the SQLite file at path if given"""
+    if path is not None:
+        settings['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    class_name = ''.join(part.title() for part in name.split('-')) + 'Config'
+    config[name] = type(class_name, (TestingConfig,), settings)
+    return name
+
+
+class AppTestCase(unittest.TestCase):
+    """Base test case with an in-process app on an empty database
+
+    By default each test empties the shared testing database. Set
+    database_file to give each test its own SQLite file in a temporary
+    directory instead, for WAL mode, other processes or a replica; settings
+    overrides config values either way.
+    """
+
+    database_file = False
+    settings = {}
+
+    def setUp(self):
+        self.config_name = f'{type(self).__name__.lower()}-testing'
+        path = None
+        if self.database_file:
+            self.directory = tempfile.mkdtemp(prefix='novella-test-')
+            path = self.path('novella.db')
+        testing_config(self.config_name, path, **self.settings)
+        self.app = self.make_app()
+        self.client = self.app.test_client()
+        if not self.database_file:
+            with self.app.app_context():
+                db.drop_all()
+                db.create_all()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            if self.database_file:
+                for engine in db.engines.values():
+                    engine.dispose()
+            else:
+                db.drop_all()
+        config.pop(self.config_name, None)
+        if self.database_file:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_app(self):
+        return create_app(self.config_name)
+
+    def path(self, name):
+        """A file in this test's temporary directory"""
+        return os.path.join(self.directory, name)
+
+    @contextmanager
+    def count_queries(self):
+        """Count SQL statements executed inside the block"""
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        with self.app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+    @staticmethod
+    def user_lookups(statements):
+        return sum('FROM users \nWHERE users.id = ?' in statement for statement in statements)
+
+    def create_user(self, email, user_type, **values):
+        """Add a user; returns its id and Authorization headers for it"""
+        with self.app.app_context():
+            user = User(**dict({'email': email, 'password_hash': 'x', 'first_name': 'Test',
+                                'last_name': 'User', 'user_type': user_type}, **values))
+            db.session.add(user)
+            db.session.commit()
+            return user.id, {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+    def create_property(self, owner_id, **values):
+        """Add a Nairobi flat, or whatever values say instead; returns its id"""
+        with self.app.app_context():
+            prop = Property(**dict({
+                'owner_id': owner_id, 'title': 'Flat', 'description': 'A flat',
+                'address': '1 Main St', 'city': 'Nairobi', 'state': 'Nairobi',
+                'zip_code': '00100', 'property_type': 'apartment', 'bedrooms': 2,
+                'bathrooms': 1, 'price_per_month': 1000}, **values))
+            db.session.add(prop)
+            db.session.commit()
+            return prop.id
+
+    def create_booking(self, property_id, renter_id, start_date, end_date, status='pending'):
+        with self.app.app_context():
+            booking = Booking(property_id=property_id, renter_id=renter_id, start_date=start_date,
+                              end_date=end_date, total_price=1000, status=status)
+            db.session.add(booking)
+            db.session.commit()
+            return booking.id
+
+    def create_bookings(self, property_ids, renter_ids, count):
+        """count 29-night bookings a month apart, spread over the properties and renters"""
+        with self.app.app_context():
+            start = date(2025, 1, 1)
+            for i in range(count):
+                db.session.add(Booking(
+                    property_id=property_ids[i % len(property_ids)],
+                    renter_id=renter_ids[i % len(renter_ids)],
+                    start_date=start + timedelta(days=30 * i),
+                    end_date=start + timedelta(days=30 * i + 29),
+                    total_price=1000
+                ))
+            db.session.commit()
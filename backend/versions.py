@@ -0,0 +1,121 @@
+import hashlib
+from datetime import datetime
+from flask import current_app, request
+from sqlalchemy import event, inspect, insert, select, update
+from sqlalchemy.orm import Session
+from models import db, Booking, Property, TableVersion
+
+# Models whose writes bump a table version, by table name
+VERSIONED_MODELS = {
+    Property: Property.__tablename__,
+    Booking: Booking.__tablename__,
+}
+
+
+def _touched_tables(session):
+    tables = set()
+    for obj in list(session.new) + list(session.deleted):
+        if type(obj) in VERSIONED_MODELS:
+            tables.add(VERSIONED_MODELS[type(obj)])
+    for obj in session.dirty:
+        if type(obj) in VERSIONED_MODELS and session.is_modified(obj):
+            tables.add(VERSIONED_MODELS[type(obj)])
+            # A change limited to relationships (e.g. amenities) doesn't
+            # trigger updated_at's onupdate, so touch it explicitly
+            if isinstance(obj, Property):
+                obj.updated_at = datetime.utcnow()
+    return tables
+
+
+@event.listens_for(Session, 'before_flush')
+def bump_table_versions(session, flush_context, instances):
+    """Bump the version of every table the pending flush writes to"""
+    for name in sorted(_touched_tables(session)):
+        bump_version(session.connection(), name)
+
+
+def committed_values(session, obj, fields):
+    """Values of fields on a pending object as they stand in the database, before this flush"""
+    attrs = inspect(obj).attrs
+    values = {}
+    for name in fields:
+        history = attrs[name].history
+        if history.deleted:
+            values[name] = history.deleted[0]
+        elif history.unchanged:
+            values[name] = history.unchanged[0]
+        elif not history.added:
+            values[name] = getattr(obj, name)
+        else:
+            # Set without having been loaded, so the old value is only in the row
+            model = type(obj)
+            row = session.connection().execute(
+                select(*(getattr(model, field) for field in fields))
+                .where(model.id == obj.id)).one()
+            return dict(row._mapping)
+    return values
+
+
+def bump_version(connection, name):
+    """Increment a table version on connection, creating its row if needed"""
+    result = connection.execute(update(TableVersion)
+                                .where(TableVersion.name == name)
+                                .values(version=TableVersion.version + 1))
+    if result.rowcount == 0:
+        connection.execute(insert(TableVersion).values(name=name, version=1))
+
+
+def ensure_version_rows():
+    """Create a version row for each versioned table that doesn't have one"""
+    existing = set(db.session.scalars(select(TableVersion.name)))
+    for name in VERSIONED_MODELS.values():
+        if name not in existing:
+            db.session.add(TableVersion(name=name, version=0))
+    db.session.commit()
+
+
+def table_versions(*names):
+    """Current versions of the given tables, in order"""
+    rows = dict(db.session.execute(
+        select(TableVersion.name, TableVersion.version).where(TableVersion.name.in_(names))
+    ).all())
+    return tuple(rows.get(name, 0) for name in names)
+
+
+def make_etag(*parts):
+    """Build a strong ETag from the values a representation was derived from"""
+    args = tuple(sorted(request.args.items(multi=True)))
+    digest = hashlib.sha1(repr(parts + (args,)).encode('utf-8')).hexdigest()
+    return digest[:32]
+
+
+def row_etag(version, *parts):
+    """ETag for a representation of a versioned row: "<version>-<digest of parts>"
+
+    parts are whatever else the representation was derived from. If-Match
+    only compares the version, so a client can send back the ETag it read.
+    """
+    return f'{version}-{make_etag(*parts)}'
+
+
+def not_modified(etag):
+    """Return a 304 response if the client already holds etag, else None"""
+    if etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+
+def expected_version():
+    """The row version a write is conditional on, or None
+
+    If-Match holds either a row_etag() of the row or its bare version, "<version>".
+    """
+    if not request.if_match or request.if_match.star_tag:
+        return None
+    for tag in request.if_match.as_set(include_weak=True):
+        version = tag.split('-', 1)[0]
+        if version.isdigit():
+            return int(version)
+    raise ValueError('If-Match must be the ETag or version of the row being changed, e.g. "3"')
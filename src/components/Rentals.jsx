@@ -10,6 +10,8 @@ const Rentals = () => {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [searchCity, setSearchCity] = useState('');
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   
   const categories = ["All", "apartment", "house", "condo", "villa", "studio"];
 
@@ -18,30 +20,51 @@ const Rentals = () => {
     fetchProperties();
   }, [selectedCategory, searchCity]);
 
+  const currentFilters = () => {
+    const filters = {};
+    if (selectedCategory !== 'All') {
+      filters.property_type = selectedCategory;
+    }
+    if (searchCity) {
+      filters.city = searchCity;
+    }
+    return filters;
+  };
+
   const fetchProperties = async () => {
     try {
       setLoading(true);
       setError(null);
       
-      const filters = {};
-      if (selectedCategory !== 'All') {
-        filters.property_type = selectedCategory;
-      }
-      if (searchCity) {
-        filters.city = searchCity;
-      }
-      
-      const data = await propertyAPI.getProperties(filters);
+      const data = await propertyAPI.getProperties(currentFilters());
       setProperties(data.properties || []);
+      setNextCursor(data.next_cursor || null);
     } catch (err) {
       console.error('Error fetching properties:', err);
       setError(err.message || 'Failed to load properties');
       setProperties([]);
+      setNextCursor(null);
     } finally {
       setLoading(false);
     }
   };
 
+  // Listings come a page at a time; next_cursor is null on the last page
+  const loadMoreProperties = async () => {
+    try {
+      setLoadingMore(true);
+      
+      const data = await propertyAPI.getProperties({ ...currentFilters(), cursor: nextCursor });
+      setProperties((loaded) => [...loaded, ...(data.properties || [])]);
+      setNextCursor(data.next_cursor || null);
+    } catch (err) {
+      console.error('Error loading more properties:', err);
+      setError(err.message || 'Failed to load properties');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleSearch = (e) => {
     e.preventDefault();
     fetchProperties();
@@ -56,6 +79,10 @@ const Rentals = () => {
   };
 
   const getPropertyImage = (property) => {
+    // List responses carry only the first image, as `image`
+    if (property.image) {
+      return property.image;
+    }
     if (property.images && property.images.length > 0) {
       return property.images[0];
     }
@@ -176,7 +203,7 @@ const Rentals = () => {
                 key={property.id}
                 initial={{ opacity: 0, y: 20 }}
                 animate={{ opacity: 1, y: 0 }}
-                transition={{ delay: index * 0.1 }}
+                transition={{ delay: (index % 20) * 0.1 }}
                 className="bg-white rounded-2xl overflow-hidden shadow-lg hover:shadow-2xl transition-shadow duration-300"
               >
                 <div className="relative h-64 overflow-hidden">
@@ -228,6 +255,19 @@ const Rentals = () => {
             ))}
           </div>
         )}
+
+        {/* Load More */}
+        {!loading && !error && nextCursor && (
+          <div className="text-center mt-12">
+            <button
+              onClick={loadMoreProperties}
+              disabled={loadingMore}
+              className="bg-blue-600 text-white px-8 py-3 rounded-xl font-semibold hover:bg-blue-700 transition-colors disabled:opacity-50"
+            >
+              {loadingMore ? 'Loading...' : 'Load More'}
+            </button>
+          </div>
+        )}
       </section>
     </div>
   );
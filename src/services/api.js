@@ -120,7 +120,14 @@ export const authAPI = {
         body: JSON.stringify(passwordData),
       });
       
-      return await handleResponse(response);
+      const data = await handleResponse(response);
+      
+      // Earlier tokens are revoked; keep the new one
+      if (data.access_token) {
+        localStorage.setItem('token', data.access_token);
+      }
+      
+      return data;
     } catch (error) {
       console.error('Change password error:', error);
       throw error;
@@ -159,6 +166,9 @@ export const propertyAPI = {
       if (filters.min_price) queryParams.append('min_price', filters.min_price);
       if (filters.max_price) queryParams.append('max_price', filters.max_price);
       if (filters.bedrooms) queryParams.append('bedrooms', filters.bedrooms);
+      if (filters.sort) queryParams.append('sort', filters.sort);
+      if (filters.limit) queryParams.append('limit', filters.limit);
+      if (filters.cursor) queryParams.append('cursor', filters.cursor);
       
       const url = `${API_BASE_URL}/rentals/properties${queryParams.toString() ? '?' + queryParams.toString() : ''}`;
       
@@ -204,11 +214,16 @@ export const propertyAPI = {
   },
 
   // Update property (owner only)
-  updateProperty: async (propertyId, propertyData) => {
+  // Pass the property's version to get a 409 instead of overwriting a newer edit
+  updateProperty: async (propertyId, propertyData, version) => {
     try {
+      const headers = getAuthHeaders();
+      if (version !== undefined) {
+        headers['If-Match'] = `"${version}"`;
+      }
       const response = await fetch(`${API_BASE_URL}/rentals/properties/${propertyId}`, {
         method: 'PUT',
-        headers: getAuthHeaders(),
+        headers,
         body: JSON.stringify(propertyData),
       });
       
@@ -296,12 +311,36 @@ export const bookingAPI = {
     }
   },
 
+  // Get booking counts, revenue and monthly occupancy (owner)
+  getOwnerAnalytics: async (from, to) => {
+    try {
+      const queryParams = new URLSearchParams();
+      if (from) queryParams.append('from', from);
+      if (to) queryParams.append('to', to);
+      
+      const url = `${API_BASE_URL}/rentals/owner-analytics${queryParams.toString() ? '?' + queryParams.toString() : ''}`;
+      const response = await fetch(url, {
+        headers: getAuthHeaders(),
+      });
+      
+      return await handleResponse(response);
+    } catch (error) {
+      console.error('Get owner analytics error:', error);
+      throw error;
+    }
+  },
+
   // Update booking status (owner only)
-  updateBookingStatus: async (bookingId, status) => {
+  // Pass the booking's version to get a 409 instead of overwriting a newer change
+  updateBookingStatus: async (bookingId, status, version) => {
     try {
+      const headers = getAuthHeaders();
+      if (version !== undefined) {
+        headers['If-Match'] = `"${version}"`;
+      }
       const response = await fetch(`${API_BASE_URL}/rentals/bookings/${bookingId}/status`, {
         method: 'PUT',
-        headers: getAuthHeaders(),
+        headers,
         body: JSON.stringify({ status }),
       });
       
@@ -311,6 +350,46 @@ export const bookingAPI = {
       throw error;
     }
   },
+
+  // Update the status of many bookings at once (owner only)
+  // updates: [{ booking_id, status }]; each item reports its own success
+  updateBookingStatuses: async (updates) => {
+    try {
+      const response = await fetch(`${API_BASE_URL}/rentals/bookings/status`, {
+        method: 'PUT',
+        headers: getAuthHeaders(),
+        body: JSON.stringify({ updates }),
+      });
+      
+      return await handleResponse(response);
+    } catch (error) {
+      console.error('Update booking statuses error:', error);
+      throw error;
+    }
+  },
+};
+
+// ==================== Batch API ====================
+
+export const batchAPI = {
+  // Run several API calls in one round trip, e.g. everything a dashboard loads.
+  // requests: [{ id, method, path: '/api/...', body }]; resolves to
+  // { [id]: { status, headers, body } } (ids default to the request's index)
+  run: async (requests) => {
+    try {
+      const response = await fetch(`${API_BASE_URL}/batch`, {
+        method: 'POST',
+        headers: getAuthHeaders(),
+        body: JSON.stringify({ requests }),
+      });
+      
+      const data = await handleResponse(response);
+      return Object.fromEntries(data.responses.map((result) => [result.id, result]));
+    } catch (error) {
+      console.error('Batch request error:', error);
+      throw error;
+    }
+  },
 };
 
 // Export default object with all APIs
@@ -318,4 +397,5 @@ export default {
   auth: authAPI,
   property: propertyAPI,
   booking: bookingAPI,
+  batch: batchAPI,
 };